@@ -2,24 +2,31 @@
 聊天 API 端点
 演示如何使用模型服务进行聊天对话
 """
-from typing import Annotated, List, Optional, Generic, TypeVar
-from fastapi import APIRouter, Depends, Query, Body
+from typing import Annotated, AsyncGenerator, Dict, List, Optional, Generic, Tuple, TypeVar
+from fastapi import APIRouter, Depends, Query, Body, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.crud.crud_history_chat import crud_history_chat
 from src.model_server.deps import get_model_service
-from src.model_server import BaseModelService, ChatRequest, ChatMessage, ChatResponse
+from src.model_server import BaseModelService, ChatRequest, ChatMessage, ChatResponse, StreamResponse
+from src.model_server.base import StreamChoice
 from src.crud.crud_history_session import HistorySessionCreate, crud_history_session
 from src.api.deps import get_db
+from src.config import settings
 from src.crud.crud_history_chat import HistoryChatCreate
+from src.crud.turn_writer import turn_writer
 from src.model.history_chat import ChatRole
+from src.model.base import get_current_time
 from src.model_server import tts_service
-from src.model_server.tts_service import TTSRequest
+from src.model_server.tts_service import TTSRequest, TTSError
+from src.model_server.greeting_cache import greeting_cache
 
 import json
 import time
+import uuid
+import asyncio
 from typing import Generic, TypeVar, Any
 from enum import Enum
 
@@ -39,6 +46,12 @@ class TTSRequestModel(BaseModel):
     voice_type: str = Field(default="qiniu_zh_female_wwxkjx", description="音色类型")
     encoding: str = Field(default="mp3", description="音频编码格式")
     speed_ratio: float = Field(default=1.0, description="语速比例")
+    long_text: Optional[bool] = Field(default=None, description="是否启用长文本分段并发合成，默认按服务配置自动判断")
+
+class TTSBatchRequestModel(BaseModel):
+    """批量TTS请求模型"""
+    items: List[TTSRequestModel] = Field(..., min_length=1, description="要转换的TTS请求列表")
+    max_concurrency: Optional[int] = Field(default=None, ge=1, description="最大并发数，默认且最大为服务配置值")
 
 # 添加响应状态码枚举
 class ResponseCode(int, Enum):
@@ -58,6 +71,7 @@ class ApiResponse(BaseModel, Generic[T]):
     code: int = Field(description="响应状态码")
     message: str = Field(description="响应消息")
     data: Optional[T] = Field(None, description="响应数据")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
 
 # 聊天响应模型
 class ChatResponseData(BaseModel):
@@ -66,6 +80,11 @@ class ChatResponseData(BaseModel):
     response: str
     audio_data: Optional[str] = Field(None, description="TTS生成的音频数据（base64编码）")
     voice_type: Optional[str] = Field(None, description="使用的音色类型")
+    tts_chars_saved: Optional[int] = Field(None, description="TTS前文本规范化节省的字符数")
+    audio_omitted_reason: Optional[str] = Field(
+        None,
+        description="未返回音频的原因（timeout、connect_error、rate_limited、provider_error、invalid_request、circuit_open、no_speakable_text 等）"
+    )
 
 # 流式聊天响应
 class StreamChatResponseData(BaseModel):
@@ -75,6 +94,39 @@ class StreamChatResponseData(BaseModel):
     message_id: str
 
 
+def _history_messages(history: List[Tuple[str, str]]) -> List[ChatMessage]:
+    """
+    将 (role, content) 形式的历史消息转换为大模型请求消息
+    
+    历史消息来自数据库或会话历史缓存，字段已是合法的字符串，跳过逐条校验（长会话每轮可达上万条）
+    
+    Args:
+        history: 按时间顺序排列的历史消息
+        
+    Returns:
+        List[ChatMessage]: 请求消息
+    """
+    return [ChatMessage.model_construct(role=role, content=content) for role, content in history]
+
+
+async def _greeting_stream(reply: str) -> AsyncGenerator[StreamResponse, None]:
+    """
+    将预生成的开场白包装为单个流式数据块
+    
+    Args:
+        reply: 开场白文本
+        
+    Yields:
+        StreamResponse: 流式响应
+    """
+    yield StreamResponse(
+        id=str(uuid.uuid4()),
+        created=int(time.time()),
+        model="greeting-cache",
+        choices=[StreamChoice(index=0, delta={"content": reply}, finish_reason="stop")]
+    )
+
+
 @router.post("/text_chat", response_model=ApiResponse[ChatResponseData])
 async def chat_completions(
     request: ChatRequestModel,
@@ -92,19 +144,26 @@ async def chat_completions(
     Returns:
         ApiResponse[ChatResponseData]: 统一格式的聊天响应
     """
+    user_write = None
+    reply_submitted = False
     try:
         # 1. 处理会话
         session_id = request.session_id
         system_prompt = ""
         voice_type = ""
+        is_new_session = False
+        conversation = None
+        new_session = None
         if session_id:
-            # 检查会话是否存在
-            session = await crud_history_session.get_by_id(db, id=session_id)
-            if not session:
+            # 等待该会话上一轮仍在后台进行的写入，再检查会话是否存在（优先读取会话历史缓存）
+            await turn_writer.wait(session_id)
+            conversation = await crud_history_session.get_conversation(db, session_id=session_id)
+            if not conversation:
                 # 会话不存在，创建新会话
                 session_id = None
-            system_prompt = session.system_prompt if session.system_prompt else ""
-            voice_type = session.voice_type if session.voice_type else ""
+            else:
+                system_prompt = conversation.system_prompt
+                voice_type = conversation.voice_type
         
         if not session_id:
             # 创建新会话
@@ -116,16 +175,16 @@ async def chat_completions(
                 session_create.system_prompt = request.system_prompt
             if request.voice_type:
                 session_create.voice_type = request.voice_type
-            session = await crud_history_session.create(db, obj_in=session_create)
-            session_id = session.id
-            system_prompt = session.system_prompt
-            voice_type = session.voice_type
+            # 新会话与本轮消息在同一事务中写入
+            new_session = crud_history_session.build(session_create)
+            session_id = new_session.id
+            system_prompt = new_session.system_prompt
+            voice_type = new_session.voice_type
+            is_new_session = True
         
-        # 2. 获取历史聊天记录        
-        history_chats = await crud_history_chat.get_by_session_id(
-            db, 
-            session_id=session_id, 
-        )
+        # 2. 获取历史聊天记录
+        history_messages = conversation.messages if conversation else []
+        has_history = bool(history_messages)
         
         # 3. 构建消息列表
         messages = []
@@ -135,63 +194,95 @@ async def chat_completions(
         messages.append(ChatMessage(role=ChatRole.SYSTEM.value, content=system_prompt))
         
         # 添加历史记录（按时间顺序）
-        for chat in history_chats:
-            messages.append(ChatMessage(role=chat.role.value, content=chat.content))
+        messages.extend(_history_messages(history_messages))
 
         # 添加当前用户消息
         messages.append(ChatMessage(role=ChatRole.USER.value, content=request.message))
         
-        # 4. 保存用户消息到数据库
+        # 4. 在后台保存用户消息（及新会话），与大模型请求并行
         user_chat_create = HistoryChatCreate(
             session_id=session_id,
             role=ChatRole.USER,
-            content=request.message
+            content=request.message,
+            created_at=get_current_time()
         )
-        await crud_history_chat.create(db, obj_in=user_chat_create)
+        user_write = turn_writer.submit_user_message(user_chat_create, session=new_session)
         
-        # 5. 创建聊天请求
-        chat_request = ChatRequest(
-            messages=messages,
-            temperature=0.7,
-            max_tokens=4096
-        )
+        # 5. 首轮问候语直接使用预生成的开场白
+        is_greeting_turn = not has_history and greeting_cache.is_greeting(request.message)
+        greeting = greeting_cache.get(system_prompt, voice_type, request.message) if is_greeting_turn else None
+        if is_new_session and not is_greeting_turn:
+            # 新角色会话首轮不是问候语时，在后台为该角色预生成开场白
+            greeting_cache.schedule_warm(system_prompt, voice_type)
         
-        # 6. 发送请求到模型服务
-        response = await model_service.chat_completion(chat_request)
+        usage = None
+        if greeting:
+            assistant_content = greeting.reply
+        else:
+            # 6. 创建聊天请求并发送到模型服务
+            chat_request = ChatRequest(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=4096
+            )
+            response = await model_service.chat_completion(chat_request)
+            assistant_content = response.choices[0]['message']['content']
+            usage = response.usage
         
-        # 7. 保存助手回复到数据库
-        assistant_content = response.choices[0]['message']['content']
+        # 7. 在后台保存助手回复（用户消息写入失败时一并补写），不阻塞返回
         assistant_chat_create = HistoryChatCreate(
             session_id=session_id,
             role=ChatRole.SYSTEM,
             content=assistant_content
         )
-        await crud_history_chat.create(db, obj_in=assistant_chat_create)
+        turn_writer.submit_reply(
+            user_write, user_chat_create, assistant_chat_create, session=new_session, usage=usage
+        )
+        reply_submitted = True
         
         # 8. 调用TTS服务生成语音（如果提供了voice_type）
         audio_data = None
         used_voice_type = None
+        tts_chars_saved = None
+        audio_omitted_reason = None
         
-        try:
-            tts_request = TTSRequest.create_simple(
-                    text=assistant_content,
-                    voice_type=voice_type,
-                    encoding="mp3",
-                    speed_ratio=1.0
-            )
-            tts_response = await tts_service.text_to_speech(tts_request)
-            audio_data = tts_response.data  # 这里应该是base64编码的音频数据
+        if greeting and greeting.audio_data:
+            audio_data = greeting.audio_data
             used_voice_type = voice_type
-        except Exception as tts_error:
-            # TTS失败不影响聊天功能，只记录错误
-            print(f"TTS转换失败: {str(tts_error)}")
+        else:
+            # 去除思考过程、Markdown、舞台指示等不可朗读的内容
+            speakable = tts_service.normalize_text(assistant_content)
+            tts_chars_saved = speakable.saved_chars
+            if speakable.text:
+                try:
+                    tts_request = TTSRequest.create_simple(
+                            text=speakable.text,
+                            voice_type=voice_type,
+                            encoding="mp3",
+                            speed_ratio=1.0
+                    )
+                    tts_response = await tts_service.text_to_speech(tts_request)
+                    audio_data = tts_response.data  # 这里应该是base64编码的音频数据
+                    used_voice_type = (tts_response.addition or {}).get("fallback_voice_type", voice_type)
+                except Exception as tts_error:
+                    # TTS失败不影响聊天功能，只记录错误并返回缺少音频的原因
+                    audio_omitted_reason = tts_error.reason if isinstance(tts_error, TTSError) else "error"
+                    print(f"TTS转换失败: {str(tts_error)}")
+            else:
+                audio_omitted_reason = "no_speakable_text"
+        
+        # 首轮问候未命中缓存（或缓存条目来自流式接口、没有语音）时，将本轮的开场白写入缓存供后续会话使用
+        if is_greeting_turn and (not greeting or (audio_data and not greeting.audio_data)):
+            greeting_cache.put(system_prompt, voice_type, assistant_content, audio_data, request.message)
         
         # 9. 返回统一格式的结果  
         response_data = ChatResponseData(
             session_id=session_id,
             response=assistant_content,
             audio_data=audio_data,
-            voice_type=used_voice_type
+            voice_type=used_voice_type,
+            tts_chars_saved=tts_chars_saved,
+            audio_omitted_reason=audio_omitted_reason
         )
         
         return ApiResponse(
@@ -206,6 +297,10 @@ async def chat_completions(
             message=f"聊天请求失败: {str(e)}",
             data=None
         )
+    finally:
+        if user_write is not None and not reply_submitted:
+            # 大模型调用失败，撤销本轮已写入的用户消息（及新会话）
+            turn_writer.discard(user_write, session_id, session=new_session)
 
 
 @router.post("/text_chat_stream")
@@ -226,13 +321,18 @@ async def chat_completions_stream(
         StreamingResponse: 流式响应
     """
     async def generate_response():
+        user_write = None
+        reply_submitted = False
         try:
             # 1. 处理会话
             session_id = request.session_id
+            conversation = None
+            new_session = None
             if session_id:
-                # 检查会话是否存在
-                session = await crud_history_session.get_by_id(db, id=session_id)
-                if not session:
+                # 等待该会话上一轮仍在后台进行的写入，再检查会话是否存在（优先读取会话历史缓存）
+                await turn_writer.wait(session_id)
+                conversation = await crud_history_session.get_conversation(db, session_id=session_id)
+                if not conversation:
                     # 会话不存在，创建新会话
                     session_id = None
             
@@ -242,14 +342,13 @@ async def chat_completions_stream(
                 session_create = HistorySessionCreate(
                     session_name=session_name
                 )
-                session = await crud_history_session.create(db, obj_in=session_create)
-                session_id = session.id
+                # 新会话与本轮消息在同一事务中写入
+                new_session = crud_history_session.build(session_create)
+                session_id = new_session.id
             
-            # 2. 获取历史聊天记录        
-            history_chats = await crud_history_chat.get_by_session_id(
-                db, 
-                session_id=session_id, 
-            )
+            # 2. 获取历史聊天记录
+            history_messages = conversation.messages if conversation else []
+            has_history = bool(history_messages)
             
             # 3. 构建消息列表
             messages = []
@@ -259,21 +358,32 @@ async def chat_completions_stream(
                 messages.append(ChatMessage(role=ChatRole.SYSTEM.value, content=request.system_prompt))
             
             # 添加历史记录（按时间顺序）
-            for chat in history_chats:
-                messages.append(ChatMessage(role=chat.role.value, content=chat.content))
+            messages.extend(_history_messages(history_messages))
             
             # 添加当前用户消息
             messages.append(ChatMessage(role=ChatRole.USER.value, content=request.message))
             
-            # 4. 保存用户消息到数据库
+            # 4. 在后台保存用户消息（及新会话），与大模型请求并行
             user_chat_create = HistoryChatCreate(
                 session_id=session_id,
                 role=ChatRole.USER,
-                content=request.message
+                content=request.message,
+                created_at=get_current_time()
+            )
+            user_write = turn_writer.submit_user_message(user_chat_create, session=new_session)
+            
+            # 5. 首轮问候语直接使用预生成的开场白（缓存键与非流式接口相同：角色提示词 + 会话音色 + 问候语）
+            voice_type = conversation.voice_type if conversation else (request.voice_type or new_session.voice_type)
+            is_greeting_turn = (
+                bool(request.system_prompt)
+                and not has_history
+                and greeting_cache.is_greeting(request.message)
+            )
+            greeting = (
+                greeting_cache.get(request.system_prompt, voice_type, request.message) if is_greeting_turn else None
             )
-            await crud_history_chat.create(db, obj_in=user_chat_create)
             
-            # 5. 创建聊天请求
+            # 6. 创建聊天请求
             chat_request = ChatRequest(
                 messages=messages,
                 temperature=0.7,
@@ -281,12 +391,17 @@ async def chat_completions_stream(
                 stream=True
             )
             
-            # 6. 发送流式请求到模型服务
+            # 7. 发送流式请求到模型服务（命中开场白缓存时以单个数据块返回）
             assistant_content = ""
             message_id = ""
             model_name = ""
             
-            async for chunk in model_service.chat_completion_stream(chat_request):
+            if greeting:
+                chunks = _greeting_stream(greeting.reply)
+            else:
+                chunks = model_service.chat_completion_stream(chat_request)
+            
+            async for chunk in chunks:
                 if chunk.choices and chunk.choices[0].delta:
                     delta = chunk.choices[0].delta
                     content = delta.get('content', '')
@@ -313,32 +428,43 @@ async def chat_completions_stream(
                     )
                     
                     yield f"data: {json.dumps(api_response.model_dump(), ensure_ascii=False)}\n\n"
-                    
-                    # 如果对话结束，保存完整的助手回复到数据库
-                    if chunk.choices[0].finish_reason:
-                        assistant_chat_create = HistoryChatCreate(
-                            session_id=session_id,
-                            role=ChatRole.SYSTEM,
-                            content=assistant_content
-                        )
-                        await crud_history_chat.create(db, obj_in=assistant_chat_create)
-                        
-                        # 发送结束信号
-                        final_data = StreamChatResponseData(
-                            session_id=session_id,
-                            content="",
-                            message_id=message_id
-                        )
-                        
-                        final_response = ApiResponse(
-                            code=ResponseCode.SUCCESS,
-                            message="对话完成",
-                            data=final_data
-                        )
-                        
-                        yield f"data: {json.dumps(final_response.model_dump(), ensure_ascii=False)}\n\n"
-                        yield "data: [DONE]\n\n"
-                        break
+                
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    break
+            
+            # 部分模型服务的最后一个数据块不带 finish_reason（或 finish_reason 在空的 delta 上），
+            # 流正常结束即视为对话完成；没有任何内容时按失败处理
+            if not assistant_content:
+                raise Exception("模型服务未返回任何内容")
+            
+            # 8. 对话结束，在后台保存完整的助手回复，不阻塞结束信号
+            assistant_chat_create = HistoryChatCreate(
+                session_id=session_id,
+                role=ChatRole.SYSTEM,
+                content=assistant_content
+            )
+            turn_writer.submit_reply(
+                user_write, user_chat_create, assistant_chat_create, session=new_session
+            )
+            reply_submitted = True
+            if is_greeting_turn and not greeting:
+                greeting_cache.put(request.system_prompt, voice_type, assistant_content, None, request.message)
+            
+            # 发送结束信号
+            final_data = StreamChatResponseData(
+                session_id=session_id,
+                content="",
+                message_id=message_id
+            )
+            
+            final_response = ApiResponse(
+                code=ResponseCode.SUCCESS,
+                message="对话完成",
+                data=final_data
+            )
+            
+            yield f"data: {json.dumps(final_response.model_dump(), ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
                         
         except Exception as e:
             error_response = ApiResponse(
@@ -348,6 +474,10 @@ async def chat_completions_stream(
             )
             yield f"data: {json.dumps(error_response.model_dump(), ensure_ascii=False)}\n\n"
             yield "data: [DONE]\n\n"
+        finally:
+            if user_write is not None and not reply_submitted:
+                # 大模型调用失败、没有返回内容或客户端中途断开，撤销本轮已写入的用户消息（及新会话）
+                turn_writer.discard(user_write, session_id, session=new_session)
     
     return StreamingResponse(
         generate_response(),
@@ -377,10 +507,9 @@ async def get_voice_list():
     )
 
 
-@router.post("/text_to_speech", response_model=ApiResponse[dict])
-async def text_to_speech(request: TTSRequestModel):
+async def _synthesize_tts_item(request: TTSRequestModel) -> ApiResponse[dict]:
     """
-    文字转语音接口
+    执行单条文字转语音请求，失败时返回错误响应而不抛出异常
     
     Args:
         request: TTS请求数据
@@ -389,13 +518,21 @@ async def text_to_speech(request: TTSRequestModel):
         ApiResponse[dict]: TTS响应数据
     """
     try:
+        speakable = tts_service.normalize_text(request.text)
+        if not speakable.text:
+            return ApiResponse(
+                code=ResponseCode.BAD_REQUEST,
+                message="文本中没有可朗读的内容",
+                data=None
+            )
+        
         tts_request = TTSRequest.create_simple(
-            text=request.text,
+            text=speakable.text,
             voice_type=request.voice_type,
             encoding=request.encoding,
             speed_ratio=request.speed_ratio
         )
-        tts_response = await tts_service.text_to_speech(tts_request)
+        tts_response = await tts_service.text_to_speech(tts_request, long_text=request.long_text)
         
         return ApiResponse(
             code=ResponseCode.SUCCESS,
@@ -406,9 +543,16 @@ async def text_to_speech(request: TTSRequestModel):
                 "sequence": tts_response.sequence,
                 "audio_data": tts_response.data,
                 "addition": tts_response.addition,
-                "voice_type": request.voice_type
+                "voice_type": (tts_response.addition or {}).get("fallback_voice_type", request.voice_type),
+                "normalized_chars_saved": speakable.saved_chars
             }
         )
+    except TTSError as e:
+        return ApiResponse(
+            code=ResponseCode.SERVICE_ERROR,
+            message=f"文字转语音失败: {str(e)}",
+            data={"reason": e.reason}
+        )
     except Exception as e:
         return ApiResponse(
             code=ResponseCode.SERVICE_ERROR,
@@ -416,6 +560,75 @@ async def text_to_speech(request: TTSRequestModel):
             data=None
         )
 
+
+@router.post("/text_to_speech", response_model=ApiResponse[dict])
+async def text_to_speech(request: TTSRequestModel):
+    """
+    文字转语音接口
+    
+    Args:
+        request: TTS请求数据
+        
+    Returns:
+        ApiResponse[dict]: TTS响应数据
+    """
+    return await _synthesize_tts_item(request)
+
+
+@router.post("/text_to_speech/batch")
+async def text_to_speech_batch(request: TTSBatchRequestModel):
+    """
+    批量文字转语音接口
+    相同的请求只合成一次，在并发上限内并发合成，按完成顺序以 NDJSON 流式返回，
+    每行为一个带 index（对应请求中的位置）的统一格式响应
+    
+    Args:
+        request: 批量TTS请求数据
+        
+    Returns:
+        StreamingResponse: NDJSON 流式响应
+        
+    Raises:
+        HTTPException: 条目数超过上限时返回 400（在开始流式响应之前）
+    """
+    if len(request.items) > settings.TTS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=ResponseCode.BAD_REQUEST,
+            detail=f"批量TTS条目数超过上限 {settings.TTS_BATCH_MAX_ITEMS}"
+        )
+    
+    # 按请求内容去重，记录每个唯一请求对应的所有位置
+    groups: Dict[tuple, List[int]] = {}
+    for index, item in enumerate(request.items):
+        key = (item.text, item.voice_type, item.encoding, item.speed_ratio, item.long_text)
+        groups.setdefault(key, []).append(index)
+    
+    concurrency = min(request.max_concurrency or settings.TTS_BATCH_CONCURRENCY, settings.TTS_BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def synthesize(indexes: List[int]) -> Tuple[List[int], ApiResponse[dict]]:
+        async with semaphore:
+            return indexes, await _synthesize_tts_item(request.items[indexes[0]])
+    
+    async def generate_results():
+        tasks = [asyncio.create_task(synthesize(indexes)) for indexes in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indexes, result = await next_done
+                for index in indexes:
+                    line = {"index": index, **result.model_dump()}
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的合成任务
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        generate_results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 # 修改其他端点使用统一响应格式
 @router.get("/models", response_model=ApiResponse[List[dict]])
 async def list_models(model_service: Annotated[BaseModelService, Depends(get_model_service)]):
@@ -1,19 +1,32 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel, Field
 
 from src.api.api_v1.chat import ApiResponse, ResponseCode
 from src.crud.crud_history_chat import crud_history_chat
+from src.crud.history_cache import history_cache
+from src.crud.turn_writer import turn_writer
+from src.crud.archive import session_archiver
+from src.crud.pagination import next_cursor
 from src.model.history_chat import HistoryChat, ChatRole
-from src.api.deps import get_db
+from src.api.deps import AsyncSessionLocal, get_db
 from src.crud.crud_history_session import (
     crud_history_session,
     HistorySessionCreate,
     HistorySessionUpdate,
-    HistorySessionResponse
+    HistorySessionResponse,
+    HistorySessionSummary,
+    SESSION_SORT_FIELDS,
+    parse_summary_fields
 )
 from src.model.history_session import HistorySession
+from src.model_server.greeting_cache import greeting_cache
+from src.jobs.purge import PurgeStats, session_purge_job
+from src.jobs.archive import ArchiveStats, session_archive_job
+from src.crud.search import SearchHit, chat_search_service
 
 router = APIRouter()
 
@@ -35,6 +48,113 @@ class ChatHistoryResponseData(BaseModel):
     chat_records: List[ChatRecordResponse] = Field(description="聊天记录列表")
 
 
+# 导出时每次写出的最大字节数（攒够后再发送，避免逐行发送过多小数据块）
+EXPORT_CHUNK_BYTES = 64 * 1024
+# 导出用户全部会话时每次读取的会话数
+EXPORT_SESSION_PAGE_SIZE = 100
+
+
+def _chat_record(chat: HistoryChat) -> ChatRecordResponse:
+    """将聊天记录对象转换为响应数据模型"""
+    return ChatRecordResponse(
+        id=chat.id,
+        session_id=chat.session_id,
+        role=chat.role,
+        content=chat.content,
+        created_at=chat.created_at.isoformat() if chat.created_at else "",
+        updated_at=chat.updated_at.isoformat() if chat.updated_at else ""
+    )
+
+
+async def _buffered(parts: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """将逐行生成的文本攒成较大的数据块再发送"""
+    buffer = []
+    size = 0
+    async for part in parts:
+        data = part.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def _export_session_chats(session_id: str, fmt: str) -> AsyncIterator[str]:
+    """使用服务端游标逐行导出单个会话的聊天记录"""
+    async with AsyncSessionLocal() as db:
+        if fmt == "json":
+            yield f'{{"session_id":{json.dumps(session_id)},"chat_records":['
+        first = True
+        async for chat in crud_history_chat.stream_by_session_id(db, session_id=session_id):
+            record = _chat_record(chat).model_dump_json()
+            if fmt == "json":
+                yield record if first else "," + record
+            else:
+                yield record + "\n"
+            first = False
+        if fmt == "json":
+            yield "]}"
+
+
+async def _session_chats(db: AsyncSession, session: HistorySession) -> AsyncIterator[HistoryChat]:
+    """依次返回会话已归档与仍在数据库中的聊天记录（批量导出直接读取归档文件，不恢复到数据库）"""
+    for chat in await session_archiver.read(session):
+        yield chat
+    async for chat in crud_history_chat.stream_by_session_id(db, session_id=session.id):
+        yield chat
+
+
+async def _export_user_history(username: str, fmt: str) -> AsyncIterator[str]:
+    """按页读取用户的会话，逐个会话使用服务端游标导出聊天记录"""
+    async with AsyncSessionLocal() as db:
+        if fmt == "json":
+            yield f'{{"username":{json.dumps(username)},"sessions":['
+        cursor = None
+        first_session = True
+        while True:
+            sessions = await crud_history_session.get_multi(
+                db, username=username, page_size=EXPORT_SESSION_PAGE_SIZE, cursor=cursor
+            )
+            await crud_history_session.attach_personas(db, sessions)
+            for session in sessions:
+                session_json = HistorySessionResponse.model_validate(session, from_attributes=True).model_dump_json()
+                if fmt == "json":
+                    yield ("" if first_session else ",") + f'{{"session":{session_json},"chat_records":['
+                else:
+                    yield f'{{"type":"session","data":{session_json}}}\n'
+                first_session = False
+                
+                first_chat = True
+                async for chat in _session_chats(db, session):
+                    record = _chat_record(chat).model_dump_json()
+                    if fmt == "json":
+                        yield record if first_chat else "," + record
+                    else:
+                        yield f'{{"type":"chat","data":{record}}}\n'
+                    first_chat = False
+                if fmt == "json":
+                    yield "]}"
+            cursor = next_cursor(sessions, EXPORT_SESSION_PAGE_SIZE)
+            if not cursor:
+                break
+        if fmt == "json":
+            yield "]}"
+
+
+def _export_response(parts: AsyncIterator[str], fmt: str, filename: str) -> StreamingResponse:
+    """构建导出的流式响应"""
+    media_type = "application/json" if fmt == "json" else "application/x-ndjson"
+    extension = "json" if fmt == "json" else "ndjson"
+    return StreamingResponse(
+        _buffered(parts),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+
 @router.post("/", response_model=HistorySessionResponse, deprecated=True)
 async def create_history_session(
     *,
@@ -52,34 +172,61 @@ async def create_history_session(
         HistorySession: 创建的历史会话
     """
     session = await crud_history_session.create(db=db, obj_in=session_in)
+    # 会话首轮通常是问候，提前为该角色预生成开场白
+    greeting_cache.schedule_warm(session.system_prompt, session.voice_type)
     return session
 
 
-@router.get("/history_session", response_model=ApiResponse[List[HistorySession]])
+# fields 参数说明（列表与搜索接口共用）
+FIELDS_DESCRIPTION = "逗号分隔的返回字段（如 id,session_name,last_message_at），不提供时返回全部字段；id 总是返回"
+
+
+@router.get(
+    "/history_session",
+    response_model=ApiResponse[List[HistorySessionSummary]],
+    response_model_exclude_unset=True
+)
 async def get_history_session(
     *,
     db: AsyncSession = Depends(get_db),
     page: int = Query(0, ge=0, description="跳过的记录数"),
     page_size: int = Query(20, ge=1, le=1000, description="限制返回的记录数"),
-) -> ApiResponse[List[HistorySession]]:
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，提供时忽略 page"),
+    sort: str = Query("created", pattern="^(created|active)$", description="排序方式：created 按创建时间，active 按最近活跃时间"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+) -> ApiResponse[List[HistorySessionSummary]]:
     """
-    根据用户名获取历史会话列表
+    根据用户名获取历史会话列表（包含消息数与最后一条消息预览，角色只返回ID与名称）。
+    只查询返回字段所需的列，不读取提示词等大字段
     
     Args:
         db: 数据库会话
         username: 用户名
         page: 页码
         page_size: 每页记录数
+        cursor: 分页游标（与 sort 对应，切换排序方式时需从第一页开始）
+        sort: 排序方式
+        fields: 返回字段（稀疏字段集）
         
     Returns:
-        List[HistorySession]: 历史会话列表
+        List[HistorySessionSummary]: 历史会话列表
     """
     username: str = "admin"
-    sessions = await crud_history_session.get_multi(db=db, username=username, page=page, page_size=page_size)
+    # 等待进行中的对话写入，列表中的消息数与预览包含刚完成的对话
+    await turn_writer.wait_all()
+    try:
+        summary_fields = parse_summary_fields(fields)
+        sessions = await crud_history_session.get_multi(
+            db=db, username=username, page=page, page_size=page_size, cursor=cursor, sort=sort,
+            fields=summary_fields
+        )
+    except ValueError as e:
+        return ApiResponse(code=ResponseCode.BAD_REQUEST, message=str(e), data=None, next_cursor=None)
     return ApiResponse(
         code=ResponseCode.SUCCESS,
         message=f"成功获取用户 {username} 的历史会话列表，共 {len(sessions)} 条",
-        data=sessions
+        data=await crud_history_session.summarize(db, sessions, summary_fields),
+        next_cursor=next_cursor(sessions, page_size, SESSION_SORT_FIELDS[sort])
     )
 
 @router.get("/{session_id}/chats", response_model=ApiResponse[ChatHistoryResponseData])
@@ -87,6 +234,9 @@ async def get_history_chat_by_session_id(
     *,
     db: AsyncSession = Depends(get_db),
     session_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页记录数，不提供时返回全部记录"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    latest: bool = Query(False, description="为 true 时先返回最新的 limit 条，再用游标向前翻页"),
 ) -> ApiResponse[ChatHistoryResponseData]:
     """
     根据会话ID获取历史聊天记录
@@ -94,6 +244,9 @@ async def get_history_chat_by_session_id(
     Args:
         db: 数据库会话
         session_id: 会话ID
+        limit: 每页记录数
+        cursor: 分页游标
+        latest: 是否从最新消息开始向前翻页（每页内仍按时间正序返回）
         
     Returns:
         ApiResponse[ChatHistoryResponseData]: 包含聊天记录的响应数据
@@ -102,41 +255,59 @@ async def get_history_chat_by_session_id(
         HTTPException: 会话不存在时抛出404错误
     """
     try:
-        # 验证会话是否存在
+        # 等待该会话仍在后台进行的写入，再验证会话是否存在
+        await turn_writer.wait(session_id)
         session = await crud_history_session.get(db=db, id=session_id)
         if not session:
             return ApiResponse(
                 code=ResponseCode.NOT_FOUND, 
                 message=f"会话 {session_id} 不存在"
             )
+        # 已归档的会话在访问时恢复聊天记录
+        await crud_history_session.rehydrate(db, session=session)
         
-        # 获取聊天记录
-        chats = await crud_history_chat.get_by_session_id(db=db, session_id=session_id)
+        if limit:
+            # 分页获取聊天记录
+            try:
+                chats = await crud_history_chat.get_page_by_session_id(
+                    db=db, session_id=session_id, limit=limit, cursor=cursor, latest=latest
+                )
+            except ValueError as e:
+                return ApiResponse(code=ResponseCode.BAD_REQUEST, message=str(e))
+            page_cursor = next_cursor(chats, limit)
+            if latest:
+                chats.reverse()
+            total_count = await crud_history_chat.count_by_session_id(db=db, session_id=session_id)
+        else:
+            # 获取全部聊天记录
+            chats = await crud_history_chat.get_by_session_id(db=db, session_id=session_id)
+            page_cursor = None
+            total_count = len(chats)
         
-        # 转换为响应数据模型
-        chat_records = []
-        for chat in chats:
-            chat_record = ChatRecordResponse(
-                id=chat.id,
-                session_id=chat.session_id,
-                role=chat.role,
-                content=chat.content,
-                created_at=chat.created_at.isoformat() if chat.created_at else "",
-                updated_at=chat.updated_at.isoformat() if chat.updated_at else ""
+        # 预热会话历史缓存，用户打开会话后的下一轮对话无需再查询数据库
+        if not limit and not session.is_deleted:
+            history_cache.put(
+                session_id,
+                session.system_prompt,
+                session.voice_type,
+                [(chat.role.value, chat.content) for chat in chats]
             )
-            chat_records.append(chat_record)
+        
+        # 转换为响应数据模型
+        chat_records = [_chat_record(chat) for chat in chats]
         
         # 构建响应数据
         response_data = ChatHistoryResponseData(
             session_id=session_id,
-            total_count=len(chat_records),
+            total_count=total_count,
             chat_records=chat_records
         )
         
         return ApiResponse(
             code=ResponseCode.SUCCESS,
             message=f"成功获取会话 {session_id} 的聊天记录，共 {len(chat_records)} 条",
-            data=response_data
+            data=response_data,
+            next_cursor=page_cursor
         )
         
     except Exception as e:
@@ -146,6 +317,58 @@ async def get_history_chat_by_session_id(
         )
 
 
+@router.get("/{session_id}/chats/export")
+async def export_history_chat_by_session_id(
+    *,
+    db: AsyncSession = Depends(get_db),
+    session_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|json)$", description="导出格式：ndjson（每行一条记录）或 json"),
+) -> StreamingResponse:
+    """
+    流式导出会话的全部聊天记录，逐行读取逐行写出，内存占用与记录数无关
+    
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        format: 导出格式
+        
+    Returns:
+        StreamingResponse: 聊天记录文件
+        
+    Raises:
+        HTTPException: 会话不存在时抛出404错误
+    """
+    await turn_writer.wait(session_id)
+    session = await crud_history_session.get(db=db, id=session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="历史会话不存在")
+    await crud_history_session.rehydrate(db, session=session)
+    return _export_response(_export_session_chats(session_id, format), format, f"session_{session_id}")
+
+
+@router.get("/export")
+async def export_user_history(
+    *,
+    format: str = Query("ndjson", pattern="^(ndjson|json)$", description="导出格式：ndjson（每行一条记录）或 json"),
+) -> StreamingResponse:
+    """
+    流式导出用户全部未删除会话及其聊天记录
+    
+    ndjson 格式中每行为 {"type": "session", "data": 会话} 或 {"type": "chat", "data": 聊天记录}，
+    聊天记录紧跟在所属会话之后；json 格式为 {"username": 用户名, "sessions": [{"session": 会话, "chat_records": [...]}]}
+    
+    Args:
+        format: 导出格式
+        
+    Returns:
+        StreamingResponse: 导出文件
+    """
+    username: str = "admin"
+    # 等待进行中的对话写入，导出内容包含刚完成的对话
+    await turn_writer.wait_all()
+    return _export_response(_export_user_history(username, format), format, f"history_{username}")
+
+
 @router.delete("/{session_id}", response_model=HistorySessionResponse)
 async def delete_history_session(
     *,
@@ -173,13 +396,121 @@ async def delete_history_session(
     return session
 
 
-@router.get("/search", response_model=List[HistorySessionResponse])
+@router.post("/purge", response_model=ApiResponse[PurgeStats])
+async def purge_deleted_sessions(
+    retention_days: Optional[int] = Query(
+        None, ge=session_purge_job.min_retention_days, description="软删除后保留的天数，默认使用配置值"
+    ),
+) -> ApiResponse[PurgeStats]:
+    """
+    立即清理软删除时间超过保留期的会话及其聊天记录
+    
+    Args:
+        retention_days: 保留天数
+        
+    Returns:
+        ApiResponse[PurgeStats]: 删除的会话数、聊天记录数及耗时
+    """
+    try:
+        stats = await session_purge_job.run_once(AsyncSessionLocal, retention_days=retention_days)
+        return ApiResponse(
+            code=ResponseCode.SUCCESS,
+            message=f"清理完成，删除会话 {stats.sessions_purged} 个、聊天记录 {stats.chats_purged} 条",
+            data=stats
+        )
+    except Exception as e:
+        return ApiResponse(
+            code=ResponseCode.INTERNAL_ERROR,
+            message=f"清理失败: {str(e)}"
+        )
+
+
+@router.post("/archive", response_model=ApiResponse[ArchiveStats])
+async def archive_idle_sessions(
+    idle_days: Optional[int] = Query(None, ge=0, description="未活跃天数，默认使用配置值"),
+) -> ApiResponse[ArchiveStats]:
+    """
+    立即归档超过指定天数没有新消息的会话的聊天记录
+    
+    Args:
+        idle_days: 未活跃天数
+        
+    Returns:
+        ApiResponse[ArchiveStats]: 归档的会话数、聊天记录数及耗时
+    """
+    try:
+        stats = await session_archive_job.run_once(AsyncSessionLocal, idle_days=idle_days)
+        return ApiResponse(
+            code=ResponseCode.SUCCESS,
+            message=f"归档完成，归档会话 {stats.sessions_archived} 个、聊天记录 {stats.chats_archived} 条",
+            data=stats
+        )
+    except Exception as e:
+        return ApiResponse(
+            code=ResponseCode.INTERNAL_ERROR,
+            message=f"归档失败: {str(e)}"
+        )
+
+
+@router.get("/full_text_search", response_model=ApiResponse[List[SearchHit]])
+async def full_text_search(
+    *,
+    db: AsyncSession = Depends(get_db),
+    keyword: str = Query(..., min_length=1, description="搜索关键词"),
+    page: int = Query(0, ge=0, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页结果数"),
+) -> ApiResponse[List[SearchHit]]:
+    """
+    全文检索会话名称与聊天内容，按相关度排序，返回命中片段及所属会话
+    
+    Args:
+        db: 数据库会话
+        keyword: 搜索关键词
+        page: 页码
+        page_size: 每页结果数
+        
+    Returns:
+        ApiResponse[List[SearchHit]]: 检索结果
+    """
+    username: str = "admin"
+    await turn_writer.wait_all()
+    try:
+        hits = await chat_search_service.search(
+            db, keyword=keyword, username=username, page=page, page_size=page_size
+        )
+        return ApiResponse(
+            code=ResponseCode.SUCCESS,
+            message=f"检索完成，本页共 {len(hits)} 条结果",
+            data=hits
+        )
+    except Exception as e:
+        return ApiResponse(
+            code=ResponseCode.INTERNAL_ERROR,
+            message=f"检索失败: {str(e)}"
+        )
+
+
+@router.get("/search", response_model=List[HistorySessionSummary], response_model_exclude_unset=True)
 async def search_history_session(
     *,
     db: AsyncSession = Depends(get_db),
     keyword: Optional[str] = Query(None, description="搜索关键词"),
     page: int = Query(0, ge=0, description="跳过的记录数"),
     page_size: int = Query(20, ge=1, le=1000, description="限制返回的记录数"),
-) -> List[HistorySession]:
-    sessions = await crud_history_session.search_sessions(db=db, keyword=keyword, page=page, page_size=page_size)
-    return sessions
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 中的游标，提供时忽略 page"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    response: Response,
+) -> List[HistorySessionSummary]:
+    await turn_writer.wait_all()
+    try:
+        summary_fields = parse_summary_fields(fields)
+        sessions = await crud_history_session.search_sessions(
+            db=db, keyword=keyword, page=page, page_size=page_size, cursor=cursor, fields=summary_fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 该接口直接返回列表，下一页游标通过响应头返回
+    page_cursor = next_cursor(sessions, page_size)
+    if page_cursor:
+        response.headers["X-Next-Cursor"] = page_cursor
+    return await crud_history_session.summarize(db, sessions, summary_fields)
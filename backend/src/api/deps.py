@@ -1,41 +1,106 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlmodel import SQLModel
 from ..config import settings
+from ..migrations import MIGRATIONS, run_migrations, check_indexes, ensure_id_storage
+from ..crud.routing import REPLICA_OPTION, ReplicaRouter
+from ..crud.pool import InstrumentedPool, PoolMonitor
+from ..crud.sqlite import (
+    SerializedWriteSession,
+    create_sqlite_engine,
+    is_memory_url,
+    is_sqlite_url,
+    sqlite_write_queue
+)
 import logging
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+DATABASE_URL = settings.get_database_url()
+# 嵌入式 SQLite：写入在进程内排队，只读查询使用只读连接池（作为副本接入读写分离路由）
+IS_SQLITE = is_sqlite_url(DATABASE_URL)
+
+
+def _create_server_engine(url: str) -> AsyncEngine:
+    """创建 MySQL 等数据库服务器的异步引擎（空闲连接由 PoolMonitor 在后台检查，取用连接时不再 pre-ping）"""
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        echo=settings.DB_ECHO,
+    )
+
+
+def _create_replica_engines() -> List[AsyncEngine]:
+    """创建只读副本引擎（SQLite 为同一数据库文件上的只读连接池）"""
+    if IS_SQLITE:
+        if settings.SQLITE_READ_POOL_SIZE <= 0 or is_memory_url(DATABASE_URL):
+            return []
+        return [create_sqlite_engine(
+            DATABASE_URL, read_only=True, pool_size=settings.SQLITE_READ_POOL_SIZE, echo=settings.DB_ECHO
+        )]
+    return [_create_server_engine(url) for url in settings.get_replica_urls()]
+
+
 # 创建异步数据库引擎
-engine: AsyncEngine = create_async_engine(
-    settings.get_database_url(),
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_MAX_OVERFLOW,
-    pool_timeout=settings.DB_POOL_TIMEOUT,
-    pool_recycle=settings.DB_POOL_RECYCLE,
-    echo=settings.DB_ECHO,
-    pool_pre_ping=True,  # 连接前测试连接是否有效
+if IS_SQLITE:
+    engine: AsyncEngine = create_sqlite_engine(DATABASE_URL, pool_size=settings.DB_POOL_SIZE, echo=settings.DB_ECHO)
+else:
+    engine: AsyncEngine = _create_server_engine(DATABASE_URL)
+
+# 只读副本引擎与路由
+replica_router = ReplicaRouter(
+    _create_replica_engines(),
+    max_lag=settings.DB_REPLICA_MAX_LAG,
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL
 )
 
+# 主库与只读副本的连接池后台检查（SQLite 同样由后台检查记录数据库可用状态，健康检查不再执行查询）
+pool_monitors: List[PoolMonitor] = [
+    PoolMonitor(
+        pool_engine,
+        validate_idle=settings.DB_POOL_VALIDATE_IDLE,
+        check_interval=settings.DB_POOL_CHECK_INTERVAL
+    )
+    for pool_engine in [engine, *replica_router.engines]
+]
+
+
+class RoutingSession(Session):
+    """读写分离会话：标记了 on_replica 的查询走可用副本，其余查询与写入走主库"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or self.info.get("wrote"):
+            # 本会话已有写入，后续查询都走主库
+            self.info["wrote"] = True
+        elif clause is not None and clause.get_execution_options().get(REPLICA_OPTION):
+            replica = replica_router.choose()
+            if replica is not None:
+                return replica.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
 # 创建异步会话工厂
 AsyncSessionLocal = async_sessionmaker(
     engine,
-    class_=AsyncSession,
+    class_=SerializedWriteSession if IS_SQLITE else AsyncSession,
+    sync_session_class=RoutingSession,
     expire_on_commit=False
 )
 
 
 async def create_tables():
-    """创建数据库表（如果不存在）"""
+    """创建数据库表（如果不存在）并执行未应用的数据库迁移"""
     try:
         async with engine.begin() as conn:
-            # 使用异步方式检查表是否存在
-            from sqlalchemy import text, inspect
-            
-            # 获取数据库中现有的表名
-            result = await conn.execute(text("SHOW TABLES"))
-            existing_tables = [row[0] for row in result.fetchall()]
+            # 获取数据库中现有的表名（通过 SQLAlchemy 检查，与数据库类型无关）
+            existing_tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
             
             # 获取需要创建的表名
             required_tables = list(SQLModel.metadata.tables.keys())
@@ -47,6 +112,14 @@ async def create_tables():
                 logger.info("数据库表创建成功")
             else:
                 logger.info("所有数据库表已存在，无需创建")
+
+        if settings.DB_MIGRATIONS_ENABLED:
+            # 迁移逐个提交，使用独立连接而不是上面的事务块
+            async with engine.connect() as conn:
+                # 先统一ID列的存储格式，迁移中新增的ID列与之保持一致
+                await ensure_id_storage(conn, settings.DB_ID_BINARY, settings.DB_MIGRATION_LOCK_TIMEOUT)
+                await run_migrations(conn, MIGRATIONS, settings.DB_MIGRATION_LOCK_TIMEOUT)
+                await check_indexes(conn)
     except Exception as e:
         logger.error(f"创建数据库表失败: {e}")
         raise
@@ -80,9 +153,18 @@ def get_engine() -> AsyncEngine:
     return engine
 
 
+async def start_pool_monitors():
+    """启动连接池的后台检查"""
+    for monitor in pool_monitors:
+        await monitor.start()
+
+
 async def close_db_connections():
     """关闭所有数据库连接"""
     try:
+        for monitor in pool_monitors:
+            await monitor.close()
+        await replica_router.close()
         await engine.dispose()
         logger.info("数据库连接已关闭")
     except Exception as e:
@@ -97,7 +179,6 @@ async def check_db_connection() -> bool:
         bool: 连接是否正常
     """
     try:
-        from sqlalchemy import text
         async with engine.begin() as conn:
             await conn.execute(text("SELECT 1"))
         logger.info("数据库连接正常")
@@ -107,6 +188,18 @@ async def check_db_connection() -> bool:
         return False
 
 
+async def check_schema_indexes() -> dict:
+    """
+    检查缺失与未使用的索引
+
+    Returns:
+        dict: 索引检查结果
+    """
+    async with engine.connect() as conn:
+        report = await check_indexes(conn)
+    return report.model_dump()
+
+
 # 数据库健康检查
 async def health_check() -> dict:
     """
@@ -116,19 +209,31 @@ async def health_check() -> dict:
         dict: 健康状态信息
     """
     try:
-        is_connected = await check_db_connection()
+        monitor = pool_monitors[0] if pool_monitors else None
+        if monitor is not None and monitor.running:
+            # 使用后台检查与最近语句执行记录的状态，不额外执行查询
+            is_connected = monitor.connected
+        else:
+            is_connected = await check_db_connection()
         pool_status = {
             "pool_size": engine.pool.size(),
             "checked_in": engine.pool.checkedin(),
             "checked_out": engine.pool.checkedout(),
             "overflow": engine.pool.overflow(),
         }
+        if monitor is not None:
+            pool_status.update(monitor.status())
         
-        return {
+        status = {
             "status": "healthy" if is_connected else "unhealthy",
             "connected": is_connected,
-            "pool_status": pool_status
+            "backend": engine.dialect.name,
+            "pool_status": pool_status,
+            "replicas": replica_router.status()
         }
+        if IS_SQLITE:
+            status["write_queue"] = sqlite_write_queue.stats()
+        return status
     except Exception as e:
         logger.error(f"健康检查失败: {e}")
         return {
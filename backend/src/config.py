@@ -1,3 +1,4 @@
+from typing import List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -11,12 +12,89 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str = ""
     MYSQL_DATABASE: str = ""
     
+    # 嵌入式SQLite配置（单机部署，未设置 DATABASE_URL 且设置了 SQLITE_PATH 时使用）
+    SQLITE_PATH: str = ""  # 数据库文件路径
+    SQLITE_JOURNAL_MODE: str = "WAL"  # 日志模式，WAL 下读取不阻塞写入
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL 下 NORMAL 提交时无需等待 fsync，断电最多丢失最近的事务
+    SQLITE_BUSY_TIMEOUT: int = 5000  # 其他进程持有锁时的等待时间（毫秒）
+    SQLITE_CACHE_SIZE_KB: int = 65536  # 每个连接的页缓存大小（KiB）
+    SQLITE_MMAP_SIZE: int = 268435456  # 内存映射读取的大小（字节），0 为关闭
+    SQLITE_READ_POOL_SIZE: int = 4  # 只读连接池大小（列表与历史查询），0 为不使用只读连接池
+    SQLITE_WRITE_TIMEOUT: float = 30.0  # 写入排队等待写锁的最长时间（秒）
+    
     # 异步数据库连接池配置
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
     DB_POOL_TIMEOUT: int = 30
     DB_POOL_RECYCLE: int = 3600
     DB_ECHO: bool = False  # 是否打印SQL语句
+    DB_POOL_VALIDATE_IDLE: float = 60.0  # 空闲超过该时间（秒）的连接由后台任务检查有效性（取代每次取用连接时的 pre-ping）
+    DB_POOL_CHECK_INTERVAL: float = 15.0  # 连接池后台检查间隔（秒）
+
+    # 只读副本配置
+    DATABASE_REPLICA_URLS: str = ""  # 只读副本连接URL，多个用英文逗号分隔；为空时所有查询都走主库
+    DB_REPLICA_MAX_LAG: float = 2.0  # 副本允许的最大复制延迟（秒），超过后查询回退到主库
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0  # 副本复制延迟的检查间隔（秒）
+    DB_REPLICA_STICKY_SECONDS: float = 10.0  # 会话或用户写入后，其读取继续走主库的时间（秒），保证读到自己的写入
+
+    # 数据库迁移配置
+    DB_MIGRATIONS_ENABLED: bool = True  # 启动时是否执行未应用的数据库迁移
+    DB_MIGRATION_LOCK_TIMEOUT: int = 60  # 多实例同时启动时等待迁移锁的时间（秒，仅MySQL）
+
+    # 角色目录配置
+    PERSONA_CACHE_SIZE: int = 1024  # 进程内缓存的角色数（角色内容不可修改，缓存无需失效）
+
+    # 主键配置
+    DB_ID_FORMAT: str = "uuid7"  # 新主键的格式：uuid7 按时间递增（推荐），uuid4 为随机
+    DB_ID_BINARY: bool = False  # 是否以 BINARY(16) 存储主键（仅MySQL），启动时自动转换已有表的ID列，需要启用数据库迁移
+
+    # 会话历史热缓存配置
+    HISTORY_CACHE_ENABLED: bool = True  # 是否启用进程内会话历史缓存
+    HISTORY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 会话历史缓存的内存上限（字节），超出后按LRU淘汰
+
+    # 聊天记录异步落库（write-behind）配置
+    HISTORY_WRITE_BEHIND_ENABLED: bool = False  # 是否启用聊天记录异步批量落库
+    HISTORY_WRITE_BEHIND_JOURNAL: str = "data/history_journal.jsonl"  # 未落库消息的本地日志文件，崩溃后启动时重放
+    HISTORY_WRITE_BEHIND_BATCH_SIZE: int = 100  # 单次批量INSERT的最大行数
+    HISTORY_WRITE_BEHIND_FLUSH_INTERVAL: float = 0.2  # 凑批等待时间（秒）
+    HISTORY_WRITE_BEHIND_RETRY_DELAY: float = 1.0  # 写库失败后的初始重试间隔（秒），按指数退避
+    HISTORY_WRITE_BEHIND_MAX_RETRIES: int = 5  # 批次写库失败后的最大重试次数，超过后逐行写入，无法写入的消息移入死信文件
+    HISTORY_WRITE_BEHIND_DEAD_LETTER: str = "data/history_dead_letter.jsonl"  # 无法落库的消息的死信文件
+
+    # 聊天内容压缩存储配置
+    HISTORY_CONTENT_COMPRESS_THRESHOLD: int = 4096  # 超过该字节数的聊天内容压缩后存入 content_blob（不再截断），最大不超过 65000
+    HISTORY_CONTENT_CODEC: str = "zlib"  # 压缩算法：zlib 或 zstd（zstd 需安装 zstandard，未安装时使用 zlib）
+    HISTORY_CONTENT_COMPRESS_LEVEL: int = 6  # 压缩级别
+    HISTORY_CONTENT_SEARCH_PREFIX: int = 4096  # 压缩存储的聊天内容在 content 列保留的明文前缀字节数，供全文检索命中，0 为不保留
+    HISTORY_CONTENT_BACKFILL_ENABLED: bool = True  # 启动时是否在后台压缩存量的超长聊天内容
+    HISTORY_CONTENT_BACKFILL_BATCH_SIZE: int = 500  # 存量压缩每批处理的行数
+    HISTORY_CONTENT_BACKFILL_BATCH_PAUSE: float = 0.1  # 存量压缩每批之间的停顿（秒）
+
+    # 已删除会话的后台清理配置
+    HISTORY_PURGE_ENABLED: bool = True  # 是否启用后台清理已软删除的会话及其聊天记录
+    HISTORY_PURGE_RETENTION_DAYS: int = 30  # 软删除后保留的天数，超过后物理删除
+    HISTORY_PURGE_MIN_RETENTION_DAYS: int = 1  # 手动清理接口可指定的最短保留天数，防止误删刚删除的会话
+    HISTORY_PURGE_INTERVAL: int = 3600  # 清理任务的执行间隔（秒）
+    HISTORY_PURGE_BATCH_SIZE: int = 1000  # 每批按主键范围删除的聊天记录行数
+    HISTORY_PURGE_BATCH_PAUSE: float = 0.1  # 每批删除之间的停顿（秒），避免长时间占用 history_chat 表
+
+    # 冷数据归档配置
+    HISTORY_ARCHIVE_ENABLED: bool = False  # 是否定期归档长期未活跃会话的聊天记录（已归档的会话始终会在访问时恢复）
+    HISTORY_ARCHIVE_DIR: str = "data/archive"  # 归档文件目录（本地文件存储，需挂载持久化存储）
+    HISTORY_ARCHIVE_IDLE_DAYS: int = 7  # 会话超过该天数没有新消息后归档
+    HISTORY_ARCHIVE_INTERVAL: int = 3600  # 归档任务的执行间隔（秒）
+    HISTORY_ARCHIVE_PAUSE: float = 0.05  # 每归档一个会话后的停顿（秒）
+
+    # 会话计数字段对账配置
+    HISTORY_RECONCILE_ENABLED: bool = True  # 是否定期按聊天记录校正会话的消息数、最后消息时间与预览
+    HISTORY_RECONCILE_INTERVAL: int = 86400  # 对账任务的执行间隔（秒）
+    HISTORY_RECONCILE_BATCH_SIZE: int = 500  # 每批检查的会话数
+    HISTORY_RECONCILE_BATCH_PAUSE: float = 0.1  # 每批之间的停顿（秒）
+
+    # 全文检索配置
+    SEARCH_FALLBACK_INDEX_ENABLED: bool = True  # 非MySQL数据库是否使用进程内倒排索引作为全文检索回退
+    SEARCH_FALLBACK_INDEX_MAX_DOCS: int = 200000  # 回退索引最多保存的聊天记录数，超过后淘汰最早的记录，更早的内容检索不到
+    SEARCH_SNIPPET_CHARS: int = 80  # 检索结果中命中片段的最大字符数
 
     # 大模型相关配置
     OPENAI_API_KEY: str = ""
@@ -25,22 +103,51 @@ class Settings(BaseSettings):
 
     # TTS服务相关配置
     TTS_MODEL: str = "tts"
-    
+    TTS_LONG_TEXT_ENABLED: bool = True  # 是否启用长文本分段并发合成
+    TTS_CHUNK_MAX_CHARS: int = 300  # 单个分段的最大字符数，超过该长度的文本将按句切分
+    TTS_CHUNK_CONCURRENCY: int = 4  # 分段合成的最大并发数
+    TTS_NORMALIZE_ENABLED: bool = True  # 是否在TTS前将文本规范化为可朗读文本
+    TTS_NORMALIZE_STEPS: List[str] = ["reasoning", "stage_directions", "markdown", "emoji", "numbers", "whitespace"]  # 规范化步骤及执行顺序
+    TTS_CONNECT_TIMEOUT: float = 3  # TTS建立连接超时（秒）
+    TTS_FIRST_BYTE_TIMEOUT: float = 15  # TTS等待响应首字节超时（秒）
+    TTS_TOTAL_TIMEOUT: float = 30  # 单次文字转语音（含重试与分段）的总时限（秒）
+    TTS_MAX_RETRIES: int = 2  # 可重试失败（超时、连接错误、429、5xx）的最大重试次数
+    TTS_RETRY_BASE_DELAY: float = 0.3  # 重试基础延迟（秒），按指数退避并加入随机抖动
+    TTS_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    TTS_CIRCUIT_RESET_TIMEOUT: float = 30  # 熔断持续时间（秒），之后放行试探请求
+    TTS_FALLBACK_VOICE_TYPE: str = ""  # 指定音色合成失败时使用的备用音色，为空则不回退
+    TTS_BATCH_CONCURRENCY: int = 4  # 批量TTS接口的最大并发数（请求中指定的并发数不会超过该值）
+    TTS_BATCH_MAX_ITEMS: int = 200  # 批量TTS接口单次请求的最大条目数
+
     # 模型服务配置
     MODEL_SERVICE_TYPE: str = "qiniu"  # 默认使用七牛云
     MODEL_SERVICE_NAME: str = "default"  # 默认服务名称
     MODEL_TIMEOUT: int = 360  # 请求超时时间（秒）
     MODEL_MAX_RETRIES: int = 3  # 最大重试次数
     MODEL_RETRY_DELAY: int = 1  # 重试延迟（秒）
+
+    # 角色开场白预生成配置
+    GREETING_CACHE_ENABLED: bool = True  # 是否启用角色开场白预生成
+    GREETING_CACHE_TTL: int = 3600  # 开场白缓存的刷新间隔（秒）
+    GREETING_CACHE_MAX_ENTRIES: int = 256  # 最多缓存的角色+音色组合数
+    GREETING_MESSAGE: str = "你好"  # 预生成开场白时使用的用户问候语
+    GREETING_PATTERNS: List[str] = ["你好", "您好", "你好呀", "嗨", "哈喽", "在吗", "hi", "hello", "hey"]  # 视为问候语的首轮用户消息
     
     def get_database_url(self) -> str:
         """获取数据库连接URL"""
         if self.DATABASE_URL:
             return self.DATABASE_URL
         
+        if self.SQLITE_PATH:
+            return f"sqlite+aiosqlite:///{self.SQLITE_PATH}"
+        
         # 如果没有设置DATABASE_URL，则使用MySQL配置
         return f"mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
     
+    def get_replica_urls(self) -> List[str]:
+        """获取只读副本连接URL列表"""
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    
     def get_model_config(self) -> dict:
         """获取模型服务配置"""
         return {
@@ -0,0 +1,281 @@
+"""
+冷数据归档
+长期未活跃会话的聊天记录被序列化为 zlib 压缩的 NDJSON，按会话写入归档存储，
+并从 history_chat 中删除，history_session.archive_key 记录归档位置；
+会话再次被访问时按需恢复（rehydrate）到 history_chat 并删除归档文件
+"""
+import os
+import json
+import zlib
+import asyncio
+import logging
+import weakref
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+
+from src.config import settings
+from src.crud.crud_history_chat import crud_history_chat
+from src.crud.pagination import keyset_order
+from src.crud.routing import recent_writes, session_key
+from src.crud.search import chat_search_service
+from src.crud.write_behind import history_write_behind
+from src.model.history_chat import HistoryChat, ChatRole
+from src.model.history_session import HistorySession
+
+logger = logging.getLogger(__name__)
+
+# 单条 INSERT / DELETE 语句处理的最大行数
+_CHUNK_SIZE = 500
+
+
+class ArchiveStore(ABC):
+    """归档存储接口（可替换为对象存储实现）"""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        """写入归档，同名归档存在时覆盖"""
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """读取归档，不存在时抛出异常"""
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """删除归档，不存在时忽略"""
+        pass
+
+
+class LocalArchiveStore(ArchiveStore):
+    """本地文件归档存储"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 归档文件根目录
+        """
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise Exception(f"无效的归档键: {key}")
+        return path
+
+    def _write(self, key: str, data: bytes) -> None:
+        """先写临时文件并 fsync，再原子替换"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, key)
+
+
+def serialize_chats(chats: List[HistoryChat]) -> bytes:
+    """
+    将聊天记录序列化为 zlib 压缩的 NDJSON
+
+    Args:
+        chats: 按时间顺序排列的聊天记录
+
+    Returns:
+        bytes: 归档数据
+    """
+    lines = [
+        json.dumps({
+            "id": chat.id,
+            "role": chat.role.value,
+            "content": chat.content,
+            "created_at": chat.created_at.isoformat(),
+            "updated_at": chat.updated_at.isoformat(),
+        }, ensure_ascii=False)
+        for chat in chats
+    ]
+    return zlib.compress("\n".join(lines).encode("utf-8"), 6)
+
+
+def deserialize_chats(session_id: str, data: bytes) -> List[HistoryChat]:
+    """
+    从归档数据还原聊天记录
+
+    Args:
+        session_id: 会话ID
+        data: serialize_chats 生成的归档数据
+
+    Returns:
+        List[HistoryChat]: 按时间顺序排列的聊天记录（未关联数据库会话）
+    """
+    chats = []
+    for line in zlib.decompress(data).decode("utf-8").splitlines():
+        if not line:
+            continue
+        record = json.loads(line)
+        chats.append(HistoryChat(
+            id=record["id"],
+            session_id=session_id,
+            role=ChatRole(record["role"]),
+            content=record["content"],
+            created_at=datetime.fromisoformat(record["created_at"]),
+            updated_at=datetime.fromisoformat(record["updated_at"]),
+        ))
+    return chats
+
+
+class SessionArchiver:
+    """会话聊天记录的归档与恢复"""
+
+    def __init__(self, store: ArchiveStore):
+        """
+        Args:
+            store: 归档存储
+        """
+        self.store = store
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        """获取会话的归档锁，同一会话的归档与恢复串行执行"""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    @staticmethod
+    def archive_key_for(session_id: str) -> str:
+        """生成会话的归档键（按ID末两位分目录，UUIDv7 的前缀是时间戳，不适合分散目录）"""
+        return f"{session_id[-2:]}/{session_id}.jsonl.z"
+
+    async def read(self, session: HistorySession) -> List[HistoryChat]:
+        """
+        读取会话的归档聊天记录（不恢复到数据库）
+
+        Args:
+            session: 会话
+
+        Returns:
+            List[HistoryChat]: 按时间顺序排列的聊天记录，未归档时返回空列表
+        """
+        if not session.archive_key:
+            return []
+        return deserialize_chats(session.id, await self.store.get(session.archive_key))
+
+    async def archive_session(self, db: AsyncSession, session: HistorySession) -> int:
+        """
+        归档会话的聊天记录：写入归档存储后在一个事务中记录归档键并删除 history_chat 中的行
+
+        Args:
+            db: 数据库会话
+            session: 会话
+
+        Returns:
+            int: 归档的聊天记录数（存在未落库的消息时跳过，返回 0）
+        """
+        if history_write_behind.pending_for_session(session.id):
+            return 0
+        lock = self._lock(session.id)
+        async with lock:
+            result = await db.execute(
+                select(HistoryChat).where(
+                    HistoryChat.session_id == session.id
+                ).order_by(*keyset_order(HistoryChat, descending=False))
+            )
+            chats = list(result.scalars().all())
+            if not chats:
+                return 0
+            archived_ids = [chat.id for chat in chats]
+            # 已归档的会话在未恢复的情况下又有新消息时，与原归档合并
+            if session.archive_key:
+                stored = {chat.id for chat in chats}
+                chats = [chat for chat in await self.read(session) if chat.id not in stored] + chats
+                chats.sort(key=lambda chat: (chat.created_at, chat.id))
+
+            key = self.archive_key_for(session.id)
+            await self.store.put(key, serialize_chats(chats))
+            await db.execute(
+                update(HistorySession).where(HistorySession.id == session.id).values(archive_key=key)
+            )
+            for i in range(0, len(archived_ids), _CHUNK_SIZE):
+                await db.execute(
+                    delete(HistoryChat).where(HistoryChat.id.in_(archived_ids[i:i + _CHUNK_SIZE]))
+                )
+            await db.commit()
+            set_committed_value(session, "archive_key", key)
+            chat_search_service.fallback_index.remove_chats(session.id)
+            return len(archived_ids)
+
+    async def rehydrate(self, db: AsyncSession, session: HistorySession) -> int:
+        """
+        将已归档会话的聊天记录恢复到 history_chat，并删除归档文件
+
+        Args:
+            db: 数据库会话
+            session: 会话
+
+        Returns:
+            int: 恢复的聊天记录数，会话未归档时返回 0
+        """
+        if not session.archive_key:
+            return 0
+        lock = self._lock(session.id)
+        async with lock:
+            # 其他请求可能已经完成恢复
+            result = await db.execute(
+                select(HistorySession.archive_key).where(HistorySession.id == session.id)
+            )
+            key = result.scalar_one_or_none()
+            if not key:
+                set_committed_value(session, "archive_key", None)
+                return 0
+
+            chats = deserialize_chats(session.id, await self.store.get(key))
+            # 已在热表中的行（归档后又写入的消息）忽略
+            restored = await crud_history_chat.upsert(db, chats, chunk_size=_CHUNK_SIZE)
+            await db.execute(
+                update(HistorySession).where(HistorySession.id == session.id).values(archive_key=None)
+            )
+            await db.commit()
+            set_committed_value(session, "archive_key", None)
+            recent_writes.mark(session_key(session.id))
+            logger.info(f"已恢复归档会话 {session.id} 的聊天记录: {restored} 条")
+
+            search_index = chat_search_service.fallback_index
+            for chat in chats:
+                search_index.add_chat(chat)
+            try:
+                await self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"删除归档文件失败: {key} ({e})")
+            return restored
+
+
+# 全局会话归档实例
+session_archiver = SessionArchiver(LocalArchiveStore(settings.HISTORY_ARCHIVE_DIR))
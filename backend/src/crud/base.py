@@ -1,6 +1,9 @@
-from typing import Any, Generic, Optional, Type, TypeVar
+from typing import Any, AsyncIterator, Dict, Generic, Iterable, List, Optional, Sequence, Type, TypeVar, Union
 
 from pydantic import BaseModel
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlmodel import SQLModel, select
 
@@ -8,10 +11,206 @@ ModelType = TypeVar("ModelType", bound=SQLModel)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+# 批量操作每条语句的最大行数（控制多行 INSERT 的包大小与 IN 列表的占位符数量）
+DEFAULT_CHUNK_SIZE = 500
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """
+    CRUD 基类：单行读取与批量操作
+
+    批量写入使用 Core 语句（多行 INSERT / 按主键的批量 UPDATE），不经过 ORM 的工作单元，
+    也不会触发映射事件；子类通过重写 to_row 完成映射事件中对列值的处理（如内容压缩）。
+    批量操作均不提交事务，由调用方提交
+    """
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
     async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
         result = await db.execute(select(self.model).where(self.model.id == id))
-        return result.scalar_one_or_none()
\ No newline at end of file
+        return result.scalar_one_or_none()
+
+    def to_row(self, obj: Union[ModelType, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        将对象转换为 Core 语句的参数字典
+
+        Args:
+            obj: 模型对象或参数字典
+
+        Returns:
+            Dict[str, Any]: 列名 -> 值
+        """
+        if isinstance(obj, dict):
+            return obj
+        return {column.name: getattr(obj, column.name) for column in self.model.__table__.columns}
+
+    async def get_many(
+        self,
+        db: AsyncSession,
+        ids: Iterable[Any],
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> List[ModelType]:
+        """
+        按ID批量获取，每 chunk_size 个ID一次 IN 查询
+
+        Args:
+            db: 数据库会话
+            ids: ID列表
+            chunk_size: 每次查询的ID数
+
+        Returns:
+            List[ModelType]: 按传入ID的顺序排列的对象（不存在的ID跳过）
+        """
+        ids = list(dict.fromkeys(ids))
+        found: Dict[Any, ModelType] = {}
+        for start in range(0, len(ids), chunk_size):
+            result = await db.execute(select(self.model).where(self.model.id.in_(ids[start:start + chunk_size])))
+            found.update((obj.id, obj) for obj in result.scalars().all())
+        return [found[id] for id in ids if id in found]
+
+    async def bulk_create(
+        self,
+        db: AsyncSession,
+        objs: Sequence[Union[ModelType, Dict[str, Any]]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> int:
+        """
+        使用多行 INSERT 批量写入（每 chunk_size 行一条语句）
+
+        Args:
+            db: 数据库会话
+            objs: 模型对象（ID等默认值已在构建时生成）或参数字典
+            chunk_size: 每条语句的行数
+
+        Returns:
+            int: 写入的行数
+        """
+        rows = [self.to_row(obj) for obj in objs]
+        for start in range(0, len(rows), chunk_size):
+            await db.execute(insert(self.model).values(rows[start:start + chunk_size]))
+        return len(rows)
+
+    async def bulk_update(
+        self,
+        db: AsyncSession,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> int:
+        """
+        按主键批量更新（ORM 批量 UPDATE，同一批中列相同的行合并为一次 executemany）
+
+        Args:
+            db: 数据库会话
+            rows: 参数字典，必须包含 id 及要更新的列
+            chunk_size: 每次执行的行数
+
+        Returns:
+            int: 提交更新的行数
+        """
+        rows = list(rows)
+        for start in range(0, len(rows), chunk_size):
+            await db.execute(update(self.model), rows[start:start + chunk_size])
+        return len(rows)
+
+    async def upsert(
+        self,
+        db: AsyncSession,
+        objs: Sequence[Union[ModelType, Dict[str, Any]]],
+        update_fields: Sequence[str] = (),
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> int:
+        """
+        批量写入，主键已存在时更新指定列；未指定更新列时忽略已存在的行（INSERT IGNORE）。
+        MySQL 使用 ON DUPLICATE KEY UPDATE，SQLite 使用 ON CONFLICT，其他数据库先查询已存在的ID再分别写入与更新
+
+        Args:
+            db: 数据库会话
+            objs: 模型对象或参数字典
+            update_fields: 主键冲突时要更新的列
+            chunk_size: 每条语句的行数
+
+        Returns:
+            int: 数据库报告的影响行数（MySQL 的 ON DUPLICATE KEY UPDATE 中被更新的行计为 2）
+        """
+        rows = [self.to_row(obj) for obj in objs]
+        dialect = db.get_bind().dialect.name
+        table = self.model.__table__
+        affected = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            if dialect == "mysql":
+                statement = mysql_insert(table).values(chunk)
+                if update_fields:
+                    statement = statement.on_duplicate_key_update(
+                        {field: statement.inserted[field] for field in update_fields}
+                    )
+                else:
+                    statement = statement.prefix_with("IGNORE")
+            elif dialect == "sqlite":
+                statement = sqlite_insert(table).values(chunk)
+                if update_fields:
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[table.c.id],
+                        set_={field: statement.excluded[field] for field in update_fields}
+                    )
+                else:
+                    statement = statement.on_conflict_do_nothing(index_elements=[table.c.id])
+            else:
+                affected += await self._upsert_generic(db, chunk, update_fields)
+                continue
+            result = await db.execute(statement)
+            affected += max(result.rowcount, 0)
+        return affected
+
+    async def _upsert_generic(
+        self, db: AsyncSession, rows: List[Dict[str, Any]], update_fields: Sequence[str]
+    ) -> int:
+        """不支持冲突子句的数据库：查询已存在的ID，新行批量写入，已存在的行按主键批量更新"""
+        result = await db.execute(select(self.model.id).where(self.model.id.in_([row["id"] for row in rows])))
+        existing = set(result.scalars().all())
+        new_rows = [row for row in rows if row["id"] not in existing]
+        if new_rows:
+            await db.execute(insert(self.model).values(new_rows))
+        if update_fields and existing:
+            await db.execute(update(self.model), [
+                {"id": row["id"], **{field: row[field] for field in update_fields}}
+                for row in rows if row["id"] in existing
+            ])
+        return len(new_rows) + (len(existing) if update_fields else 0)
+
+    async def iter_chunks(
+        self,
+        db: AsyncSession,
+        *criteria: Any,
+        columns: Optional[Sequence[Any]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> AsyncIterator[List[Any]]:
+        """
+        按主键顺序分批遍历（keyset 分页，每批一次查询，深翻页的耗时与第一批相同），适合扫描全表的后台任务；
+        调用方可以在批次之间提交事务，也可以修改已返回批次中的行
+
+        Args:
+            db: 数据库会话
+            criteria: 过滤条件
+            columns: 只查询这些列（必须包含主键 id），为空时返回模型对象
+            chunk_size: 每批的行数
+
+        Yields:
+            List: 一批模型对象，或指定 columns 时为行
+        """
+        last_id = None
+        while True:
+            query = select(*columns) if columns else select(self.model)
+            query = query.where(*criteria)
+            if last_id is not None:
+                query = query.where(self.model.id > last_id)
+            result = await db.execute(query.order_by(self.model.id).limit(chunk_size))
+            batch = list(result.all() if columns else result.scalars().all())
+            if not batch:
+                return
+            # 在交给调用方之前记录游标（调用方提交后对象可能已过期）
+            last_id = batch[-1].id
+            yield batch
+            if len(batch) < chunk_size:
+                return
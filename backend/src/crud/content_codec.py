@@ -0,0 +1,170 @@
+"""
+聊天内容存储编码
+超过阈值的聊天内容压缩后写入 history_chat.content_blob，并在 content_codec 中记录压缩算法，
+content 列只保留内容的明文前缀（供 FULLTEXT 全文检索与 LIKE 查询命中）；读取时自动解压回 content 属性，调用方无需感知。
+ORM 写入与读取通过映射事件处理，Core 语句（如异步落库的批量 INSERT）使用 encode_row
+"""
+import zlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.config import settings
+from src.model.history_chat import HistoryChat
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 明文存储（content 列）
+CODEC_PLAIN = ""
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# 明文必须放得下 MySQL TEXT（65535 字节）
+_MAX_PLAIN_BYTES = 65000
+
+
+class ContentCodec:
+    """聊天内容压缩编解码器"""
+
+    def __init__(self, threshold: int = 4096, codec: str = CODEC_ZLIB, level: int = 6, search_prefix: int = 4096):
+        """
+        Args:
+            threshold: 超过该字节数的内容压缩存储
+            codec: 压缩算法（zlib 或 zstd）
+            level: 压缩级别
+            search_prefix: 压缩存储时 content 列保留的明文前缀字节数，0 为不保留
+        """
+        if codec == CODEC_ZSTD and zstandard is None:
+            logger.warning("未安装 zstandard，聊天内容压缩改用 zlib")
+            codec = CODEC_ZLIB
+        if codec not in (CODEC_ZLIB, CODEC_ZSTD):
+            raise Exception(f"不支持的聊天内容压缩算法: {codec}")
+        self.threshold = min(threshold, _MAX_PLAIN_BYTES)
+        self.codec = codec
+        self.level = level
+        self.search_prefix = min(search_prefix, _MAX_PLAIN_BYTES)
+
+    def encode(self, content: str) -> Tuple[str, Optional[bytes], str]:
+        """
+        按长度决定明文或压缩存储
+
+        Args:
+            content: 聊天内容
+
+        Returns:
+            Tuple[str, Optional[bytes], str]: content 列（压缩时为明文前缀）、content_blob 列与 content_codec 列的值
+        """
+        data = (content or "").encode("utf-8")
+        if len(data) <= self.threshold:
+            return content or "", None, CODEC_PLAIN
+        if self.codec == CODEC_ZSTD:
+            return self.prefix(data), zstandard.ZstdCompressor(level=self.level).compress(data), CODEC_ZSTD
+        return self.prefix(data), zlib.compress(data, self.level), CODEC_ZLIB
+
+    def prefix(self, data: bytes) -> str:
+        """
+        截取压缩存储时保留在 content 列中的明文前缀（不截断多字节字符）
+
+        Args:
+            data: UTF-8 编码的聊天内容
+
+        Returns:
+            str: 明文前缀
+        """
+        return data[:self.search_prefix].decode("utf-8", errors="ignore")
+
+    def decode(self, content: str, blob: Optional[bytes], codec: str) -> str:
+        """
+        还原聊天内容
+
+        Args:
+            content: content 列的值（压缩存储时为明文前缀，不参与还原）
+            blob: content_blob 列的值
+            codec: content_codec 列的值
+
+        Returns:
+            str: 聊天内容
+
+        Raises:
+            Exception: 编码未知或压缩数据缺失时抛出异常
+        """
+        if not codec:
+            return content
+        if blob is None:
+            raise Exception(f"聊天内容的压缩数据缺失（{codec}）")
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(blob).decode("utf-8")
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise Exception("读取 zstd 压缩的聊天内容需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+        raise Exception(f"未知的聊天内容编码: {codec}")
+
+    def encode_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        编码 Core INSERT 的参数字典（总是包含三个内容列，便于多行 INSERT）
+
+        Args:
+            row: 包含明文 content 的参数字典
+
+        Returns:
+            Dict[str, Any]: 编码后的参数字典
+        """
+        content, blob, codec = self.encode(row["content"])
+        return {**row, "content": content, "content_blob": blob, "content_codec": codec}
+
+
+# 全局聊天内容编解码器实例
+content_codec = ContentCodec(
+    threshold=settings.HISTORY_CONTENT_COMPRESS_THRESHOLD,
+    codec=settings.HISTORY_CONTENT_CODEC,
+    level=settings.HISTORY_CONTENT_COMPRESS_LEVEL,
+    search_prefix=settings.HISTORY_CONTENT_SEARCH_PREFIX
+)
+
+
+@event.listens_for(HistoryChat, "before_insert")
+def _encode_on_insert(mapper, connection, target: HistoryChat) -> None:
+    """写入前按长度压缩内容"""
+    if target.content_codec:
+        return
+    content, blob, codec = content_codec.encode(target.content)
+    if codec:
+        target.content, target.content_blob, target.content_codec = content, blob, codec
+
+
+@event.listens_for(HistoryChat, "after_insert")
+def _restore_after_insert(mapper, connection, target: HistoryChat) -> None:
+    """写入后恢复对象上的明文内容（缓存与检索索引使用的是对象本身）"""
+    _decode_target(target)
+
+
+@event.listens_for(HistoryChat, "load")
+def _decode_on_load(target: HistoryChat, context) -> None:
+    """读取后解压内容"""
+    _decode_target(target)
+
+
+@event.listens_for(HistoryChat, "refresh")
+def _decode_on_refresh(target: HistoryChat, context, attrs) -> None:
+    """刷新后解压内容"""
+    _decode_target(target)
+
+
+def _decode_target(target: HistoryChat) -> None:
+    """将压缩内容还原到 content 属性，并释放压缩数据（聊天记录写入后不再修改）"""
+    # 只读取已加载的属性，避免部分刷新时触发懒加载
+    values = inspect(target).dict
+    codec = values.get("content_codec")
+    # 已还原的对象压缩数据已释放
+    if not codec or values.get("content_blob") is None:
+        return
+    set_committed_value(target, "content", content_codec.decode("", values["content_blob"], codec))
+    set_committed_value(target, "content_blob", None)
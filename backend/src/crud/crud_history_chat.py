@@ -1,37 +1,21 @@
-from typing import Any, Dict, List, Optional, Union
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy import String, delete, func, type_coerce, update
 from sqlmodel import select, and_
 from pydantic import BaseModel, Field
 
 from src.model.history_chat import HistoryChat, ChatRole
+from src.model.history_session import HistorySession
 from src.crud.base import CRUDBase
-
-
-def truncate_utf8_string(s: str, max_bytes: int = 65000) -> str:
-    """
-    截取字符串以确保在 UTF-8 编码下不超过指定的字节长度
-    避免截断多字节字符（如中文）
-    
-    Args:
-        s: 要截取的字符串
-        max_bytes: 最大字节长度，默认 65000（略小于 MySQL TEXT 的 65535 限制）
-        
-    Returns:
-        str: 截取后的字符串
-    """
-    if not s:
-        return s
-        
-    encoded = s.encode('utf-8')
-    if len(encoded) <= max_bytes:
-        return s
-        
-    truncated = encoded[:max_bytes]
-    while True:
-        try:
-            return truncated.decode('utf-8')
-        except UnicodeDecodeError:
-            truncated = truncated[:-1]
+from src.crud.history_cache import history_cache
+from src.crud.content_codec import content_codec
+from src.crud.write_behind import history_write_behind
+from src.crud.pagination import after_cursor, keyset_condition, keyset_order
+from src.crud.search import chat_search_service
+from src.crud.routing import on_replica, recent_writes, session_key, user_key
+from src.crud.session_counters import counter_updates, make_preview, token_counts
+from src.crud.persona import persona_catalog
 
 
 class HistoryChatCreate(BaseModel):
@@ -39,6 +23,9 @@ class HistoryChatCreate(BaseModel):
     session_id: str = Field(description="会话ID")
     role: ChatRole = Field(description="角色")
     content: str = Field(description="对话内容")
+    created_at: Optional[datetime] = Field(None, description="创建时间，为空时使用写入时间")
+
+
 class HistoryChatResponse(BaseModel):
     """历史聊天记录响应模型"""
     id: str
@@ -52,9 +39,41 @@ class HistoryChatUpdate(BaseModel):
     pass
 
 
+# 数据库中保存的角色（枚举名称）-> 大模型请求中的角色（枚举值）
+_ROLE_VALUES = {role.name: role.value for role in ChatRole}
+
+
 class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate]):
     """历史聊天记录CRUD操作类"""
     
+    def to_row(self, obj: Union[HistoryChat, Dict[str, Any]]) -> Dict[str, Any]:
+        """批量写入的参数字典，明文内容按长度压缩（Core 语句不会触发 content_codec 的映射事件）"""
+        row = super().to_row(obj)
+        if row.get("content_codec"):
+            return row
+        return content_codec.encode_row(row)
+    
+    def build(self, obj_in: HistoryChatCreate) -> HistoryChat:
+        """
+        构建历史聊天记录对象（不访问数据库）
+        
+        Args:
+            obj_in: 创建数据
+            
+        Returns:
+            HistoryChat: 历史聊天记录对象
+        """
+        # 超长内容在写入时压缩存储（见 content_codec），不再截断
+        db_obj = HistoryChat(
+            session_id=obj_in.session_id,
+            role=obj_in.role,
+            content=obj_in.content
+        )
+        if obj_in.created_at:
+            db_obj.created_at = obj_in.created_at
+            db_obj.updated_at = obj_in.created_at
+        return db_obj
+    
     async def create(
         self, 
         db: AsyncSession, 
@@ -71,27 +90,74 @@ class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate
         Returns:
             HistoryChat: 创建的历史聊天记录对象
         """
-        # 截取内容以确保不超过 MySQL TEXT 类型限制
-        original_length = len(obj_in.content.encode('utf-8')) if obj_in.content else 0
-        truncated_content = truncate_utf8_string(obj_in.content)
-        truncated_length = len(truncated_content.encode('utf-8')) if truncated_content else 0
-        
-        # 如果内容被截取，记录日志
-        if original_length > truncated_length:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"聊天内容被截取: 原始长度 {original_length} 字节 -> 截取后 {truncated_length} 字节")
-        
-        db_obj = HistoryChat(
-            session_id=obj_in.session_id,
-            role=obj_in.role,
-            content=truncated_content
-        )
+        db_obj = self.build(obj_in)
         db.add(db_obj)
+        for statement in counter_updates([_counter_message(db_obj)]):
+            await db.execute(statement)
         await db.commit()
-        await db.refresh(db_obj)
+        recent_writes.mark(session_key(db_obj.session_id))
+        # ID和时间均在客户端生成，提交后无需再 refresh
+        # 写穿透：同步追加到会话历史缓存
+        history_cache.append(db_obj.session_id, db_obj.role.value, db_obj.content)
+        chat_search_service.fallback_index.add_chat(db_obj)
         return db_obj
     
+    async def create_turn(
+        self, 
+        db: AsyncSession, 
+        *, 
+        objs_in: List[HistoryChatCreate],
+        session: Optional[HistorySession] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> List[HistoryChat]:
+        """
+        在一个事务中写入一轮对话的全部消息（可同时写入新会话）并更新会话计数字段，只提交一次；
+        启用异步落库时消息写入本地日志后即返回，计数字段随消息落库时更新
+        
+        Args:
+            db: 数据库会话
+            objs_in: 按时间顺序排列的消息创建数据
+            session: 尚未写入数据库的新会话，与消息在同一事务中写入
+            usage: 本轮大模型调用的 token 用量（OpenAI 格式），计入会话的 token 累计
+            
+        Returns:
+            List[HistoryChat]: 创建的历史聊天记录对象列表
+        """
+        db_objs = [self.build(obj_in) for obj_in in objs_in]
+        if history_write_behind.running:
+            # 异步落库：新会话同步写入，消息写入本地日志后由后台任务批量落库
+            if session is not None:
+                await persona_catalog.ensure(db, session)
+                db.add(session)
+                await db.commit()
+            await history_write_behind.enqueue(db_objs, usage=usage)
+        else:
+            if session is not None:
+                # 会话与消息之间没有ORM关系，先flush会话以满足外键约束
+                await persona_catalog.ensure(db, session)
+                db.add(session)
+                await db.flush()
+            db.add_all(db_objs)
+            messages = [_counter_message(db_obj) for db_obj in db_objs]
+            if messages:
+                # token 用量计在本轮最后一条（模型回复）消息上
+                messages[-1].update(token_counts(usage))
+            for statement in counter_updates(messages):
+                await db.execute(statement)
+            await db.commit()
+        
+        recent_writes.mark(*{session_key(db_obj.session_id) for db_obj in db_objs})
+        search_index = chat_search_service.fallback_index
+        if session is not None:
+            persona_catalog.remember_session(session)
+            recent_writes.mark(session_key(session.id), user_key(session.username))
+            history_cache.put(session.id, session.system_prompt, session.voice_type, [])
+            search_index.add_session(session.id, session.username, session.session_name)
+        for db_obj in db_objs:
+            history_cache.append(db_obj.session_id, db_obj.role.value, db_obj.content)
+            search_index.add_chat(db_obj)
+        return db_objs
+    
     async def get_by_session_id(
         self, 
         db: AsyncSession, 
@@ -117,8 +183,155 @@ class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate
         if limit:
             query = query.limit(limit)
         
-        result = await db.execute(query)
-        return result.scalars().all()
+        result = await db.execute(on_replica(query, session_key(session_id)))
+        chats = result.scalars().all()
+        return self.merge_pending(chats, session_id=session_id, limit=limit)
+    
+    async def get_messages_by_session_id(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session_id: str
+    ) -> List[Tuple[str, str]]:
+        """
+        以 (role, content) 元组获取会话的全部历史消息，用于构建大模型请求
+        
+        通过 Core 查询只读取所需的列，不创建 ORM 对象（没有身份映射、时间列与枚举转换）；
+        Core 查询不会触发映射事件，压缩存储的内容在这里解压
+        
+        Args:
+            db: 数据库会话
+            session_id: 会话ID
+            
+        Returns:
+            List[Tuple[str, str]]: 按时间顺序排列的 (role, content)，尚未落库的消息排在最后
+        """
+        table = HistoryChat.__table__
+        pending = history_write_behind.pending_for_session(session_id)
+        columns = [type_coerce(table.c.role, String), table.c.content, table.c.content_blob, table.c.content_codec]
+        if pending:
+            # 只有存在待写入消息时才需要按ID去重
+            columns.append(table.c.id)
+        query = select(*columns).where(
+            table.c.session_id == session_id
+        ).order_by(table.c.created_at, table.c.id)
+        
+        result = await db.execute(on_replica(query, session_key(session_id)))
+        rows = result.all()
+        decode = content_codec.decode
+        messages = [
+            (_ROLE_VALUES[row[0]], decode(row[1], row[2], row[3]) if row[3] else row[1])
+            for row in rows
+        ]
+        if pending:
+            stored_ids = {row[4] for row in rows}
+            messages.extend(
+                (chat.role.value, chat.content)
+                for chat in sorted(pending, key=lambda chat: chat.created_at)
+                if chat.id not in stored_ids
+            )
+        return messages
+    
+    async def get_page_by_session_id(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        latest: bool = False
+    ) -> List[HistoryChat]:
+        """
+        按游标分页获取会话的聊天记录
+        
+        Args:
+            db: 数据库会话
+            session_id: 会话ID
+            limit: 每页记录数
+            cursor: 上一页返回的游标
+            latest: 为 True 时从最新消息开始向前翻页（结果按时间倒序），否则从最早消息开始向后翻页
+            
+        Returns:
+            List[HistoryChat]: 按查询方向排列的聊天记录
+            
+        Raises:
+            ValueError: 游标格式无效时抛出异常
+        """
+        query = select(HistoryChat).where(
+            HistoryChat.session_id == session_id
+        ).order_by(*keyset_order(HistoryChat, descending=latest)).limit(limit)
+        if cursor:
+            query = query.where(keyset_condition(HistoryChat, cursor, descending=latest))
+        
+        result = await db.execute(on_replica(query, session_key(session_id)))
+        chats = list(result.scalars().all())
+        
+        # 合并尚未落库的消息：候选集为数据库中的本页与游标之后的待写入消息，排序后取前 limit 条
+        pending = [
+            chat for chat in history_write_behind.pending_for_session(session_id)
+            if after_cursor(chat, cursor, descending=latest)
+        ]
+        if not pending:
+            return chats
+        stored_ids = {chat.id for chat in chats}
+        merged = chats + [chat for chat in pending if chat.id not in stored_ids]
+        merged.sort(key=lambda chat: (chat.created_at, chat.id), reverse=latest)
+        return merged[:limit]
+    
+    async def stream_by_session_id(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session_id: str,
+        yield_per: int = 500
+    ) -> AsyncIterator[HistoryChat]:
+        """
+        使用服务端游标逐行读取会话的聊天记录，内存占用与记录数无关
+        
+        Args:
+            db: 数据库会话（遍历期间占用一个连接）
+            session_id: 会话ID
+            yield_per: 每次从数据库拉取的行数
+            
+        Yields:
+            HistoryChat: 按时间顺序排列的聊天记录（尚未落库的消息排在最后）
+        """
+        pending = {chat.id: chat for chat in history_write_behind.pending_for_session(session_id)}
+        query = select(HistoryChat).where(
+            HistoryChat.session_id == session_id
+        ).order_by(*keyset_order(HistoryChat, descending=False)).execution_options(yield_per=yield_per)
+        result = await db.stream_scalars(on_replica(query, session_key(session_id)))
+        async for chat in result:
+            pending.pop(chat.id, None)
+            yield chat
+        for chat in pending.values():
+            yield chat
+    
+    def merge_pending(
+        self, 
+        chats: List[HistoryChat], 
+        *, 
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> List[HistoryChat]:
+        """
+        合并异步落库队列中尚未写入数据库的聊天记录
+        
+        Args:
+            chats: 从数据库读取的聊天记录（按时间顺序）
+            session_id: 会话ID
+            limit: 限制返回的记录数
+            
+        Returns:
+            List[HistoryChat]: 合并后按时间顺序排列的聊天记录
+        """
+        pending = history_write_behind.pending_for_session(session_id)
+        if not pending:
+            return chats
+        stored_ids = {chat.id for chat in chats}
+        merged = list(chats) + [chat for chat in pending if chat.id not in stored_ids]
+        merged.sort(key=lambda chat: chat.created_at)
+        return merged[:limit] if limit else merged
     
     async def count_by_session_id(
         self, 
@@ -127,7 +340,7 @@ class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate
         session_id: str
     ) -> int:
         """
-        统计会话的聊天记录数量
+        统计会话的聊天记录数量（读取 history_session 上维护的计数，不再扫描 history_chat）
         
         Args:
             db: 数据库会话
@@ -136,14 +349,12 @@ class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate
         Returns:
             int: 聊天记录数量
         """
-        from sqlalchemy import func
-        
-        result = await db.execute(
-            select(func.count(HistoryChat.id)).where(
-                HistoryChat.session_id == session_id
-            )
+        query = select(HistorySession.message_count).where(
+            HistorySession.id == session_id
         )
-        return result.scalar() or 0
+        result = await db.execute(on_replica(query, session_key(session_id)))
+        pending = len(history_write_behind.pending_for_session(session_id))
+        return (result.scalar() or 0) + pending
     
     async def delete_by_session_id(
         self, 
@@ -161,16 +372,80 @@ class CRUDHistoryChat(CRUDBase[HistoryChat, HistoryChatCreate, HistoryChatUpdate
         Returns:
             int: 删除的记录数
         """
+        # 先丢弃尚未落库的消息，避免删除后再被写入
+        await history_write_behind.discard_session(session_id)
         result = await db.execute(
-            select(HistoryChat).where(HistoryChat.session_id == session_id)
+            delete(HistoryChat).where(HistoryChat.session_id == session_id)
         )
-        chats = result.scalars().all()
-        
-        for chat in chats:
-            await db.delete(chat)
+        # 计数字段恢复为没有消息时的值（最后消息时间为创建时间）
+        await db.execute(
+            update(HistorySession).where(HistorySession.id == session_id).values(
+                message_count=0,
+                last_message_at=HistorySession.created_at,
+                last_message_preview="",
+                prompt_tokens=0,
+                completion_tokens=0
+            ).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        recent_writes.mark(session_key(session_id))
+        history_cache.invalidate(session_id)
+        chat_search_service.fallback_index.remove_chats(session_id)
+        return result.rowcount
+
+    
+    async def remove_turn(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session_id: str,
+        ids: List[str],
+        delete_session: bool = False
+    ) -> None:
+        """
+        撤销一轮未完成的对话已写入的消息（含尚未落库的消息），
+        按剩余的聊天记录重新计算会话的消息数、最后消息时间与预览
         
+        Args:
+            db: 数据库会话
+            session_id: 会话ID
+            ids: 要撤销的聊天记录ID
+            delete_session: 是否同时删除会话（会话由本轮创建时）
+        """
+        await history_write_behind.discard_session(session_id, ids=set(ids))
+        if delete_session:
+            await db.execute(delete(HistoryChat).where(HistoryChat.session_id == session_id))
+            await db.execute(delete(HistorySession).where(HistorySession.id == session_id))
+        else:
+            await db.execute(delete(HistoryChat).where(HistoryChat.id.in_(ids)))
+            count = await db.execute(
+                select(func.count(HistoryChat.id)).where(HistoryChat.session_id == session_id)
+            )
+            latest = await db.execute(
+                select(HistoryChat).where(HistoryChat.session_id == session_id)
+                .order_by(*keyset_order(HistoryChat, descending=True)).limit(1)
+            )
+            latest = latest.scalar_one_or_none()
+            await db.execute(
+                update(HistorySession).where(HistorySession.id == session_id).values(
+                    message_count=count.scalar_one(),
+                    last_message_at=latest.created_at if latest else HistorySession.created_at,
+                    last_message_preview=make_preview(latest.content) if latest else ""
+                ).execution_options(synchronize_session=False)
+            )
         await db.commit()
-        return len(chats)
+        recent_writes.mark(session_key(session_id))
+        history_cache.invalidate(session_id)
+        if delete_session:
+            chat_search_service.fallback_index.remove_session(session_id)
+        else:
+            for id in ids:
+                chat_search_service.fallback_index.remove_chat(session_id, id)
+
+
+def _counter_message(chat: HistoryChat) -> Dict[str, Any]:
+    """提取更新会话计数字段所需的消息信息"""
+    return {"session_id": chat.session_id, "created_at": chat.created_at, "content": chat.content}
 
 
 # 创建CRUD实例
@@ -1,10 +1,20 @@
-from typing import Any, Dict, List, Optional, Union
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
 from sqlmodel import select, and_
 from pydantic import BaseModel, Field
 
-from src.model.history_session import HistorySession
+from src.model.history_session import HistorySession, DEFAULT_PROMPT, DEFAULT_VOICE_TYPE
+from src.model.base import get_current_time
 from src.crud.base import CRUDBase
+from src.crud.crud_history_chat import crud_history_chat
+from src.crud.history_cache import CachedConversation, history_cache
+from src.crud.pagination import keyset_condition, keyset_order
+from src.crud.search import NGRAM_TOKEN_SIZE, chat_search_service, fulltext_phrase, is_mysql
+from src.crud.routing import on_replica, recent_writes, session_key, user_key
+from src.crud.archive import session_archiver
+from src.crud.persona import persona_catalog, persona_id_for
 
 
 class HistorySessionCreate(BaseModel):
@@ -29,10 +39,78 @@ class HistorySessionResponse(BaseModel):
     username: str
     session_name: str
     is_deleted: bool
+    persona_id: Optional[str] = None
     system_prompt: str
     voice_type: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class HistorySessionSummary(BaseModel):
+    """会话列表项（只包含角色ID与名称，不返回完整提示词；指定 fields 时只返回请求的字段）"""
+    id: str
+    username: str = ""
+    session_name: str = ""
+    persona_id: Optional[str] = None
+    persona_name: str = ""
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+# 会话列表的排序方式与对应的排序字段：按创建时间 / 按最近活跃时间
+SESSION_SORT_FIELDS = {"created": "created_at", "active": "last_message_at"}
+
+# 会话列表项可请求的字段（persona_name 由 persona_id 经角色目录得到，其余均为会话表的列）
+SUMMARY_FIELDS: Tuple[str, ...] = tuple(HistorySessionSummary.model_fields)
+
+
+def parse_summary_fields(fields: Optional[str]) -> List[str]:
+    """
+    解析逗号分隔的列表项字段（稀疏字段集），id 总是包含在内
+
+    Args:
+        fields: 如 "id,session_name,last_message_at"，为空时返回全部字段
+
+    Returns:
+        List[str]: 字段名
+
+    Raises:
+        ValueError: 包含未知字段时抛出异常
+    """
+    if not fields:
+        return list(SUMMARY_FIELDS)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(unknown)}，可选字段: {', '.join(SUMMARY_FIELDS)}")
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+
+def summary_columns(fields: Sequence[str], sort_field: str = "created_at") -> List[Any]:
+    """
+    列表查询需要读取的列：请求的字段、分页游标所需的 id 与排序字段，以及计算角色名称所需的 persona_id
+
+    Args:
+        fields: 列表项字段
+        sort_field: 排序字段
+
+    Returns:
+        List: 会话表的列
+    """
+    names = [name for name in fields if name != "persona_name"] + ["id", sort_field]
+    if "persona_name" in fields:
+        names.append("persona_id")
+    return [getattr(HistorySession, name) for name in dict.fromkeys(names)]
 
 
 class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistorySessionUpdate]):
@@ -41,6 +119,38 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
     def __init__(self):
         super().__init__(HistorySession)
     
+    def to_row(self, obj: Union[HistorySession, Dict[str, Any]]) -> Dict[str, Any]:
+        """批量写入的参数字典，引用了角色的会话不重复保存提示词与音色（与映射事件的处理一致）"""
+        row = super().to_row(obj)
+        if row.get("persona_id"):
+            row = {**row, "system_prompt": "", "voice_type": ""}
+        return row
+    
+    def build(self, obj_in: HistorySessionCreate) -> HistorySession:
+        """
+        构建历史会话对象（不访问数据库）
+        
+        Args:
+            obj_in: 创建数据
+            
+        Returns:
+            HistorySession: 历史会话对象
+        """
+        system_prompt = obj_in.system_prompt or DEFAULT_PROMPT
+        voice_type = obj_in.voice_type or DEFAULT_VOICE_TYPE
+        # 提示词与音色保存在角色表中，会话只引用角色ID（对象上仍保留生效值）
+        db_obj = HistorySession(
+            username=obj_in.username,
+            session_name=obj_in.session_name,
+            is_deleted=False,
+            persona_id=persona_id_for(system_prompt, voice_type),
+            system_prompt=system_prompt,
+            voice_type=voice_type
+        )
+        # 没有消息的会话以创建时间作为最近活跃时间
+        db_obj.last_message_at = db_obj.created_at
+        return db_obj
+    
     async def create(
         self, 
         db: AsyncSession, 
@@ -57,20 +167,33 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
         Returns:
             HistorySession: 创建的历史会话对象
         """
-        db_obj = HistorySession(
-            username=obj_in.username,
-            session_name=obj_in.session_name,
-            is_deleted=False
-        )
-        if obj_in.system_prompt:
-            db_obj.system_prompt = obj_in.system_prompt
-        if obj_in.voice_type:
-            db_obj.voice_type = obj_in.voice_type
+        db_obj = self.build(obj_in)
+        await persona_catalog.ensure(db, db_obj)
         db.add(db_obj)
         await db.commit()
-        await db.refresh(db_obj)
+        persona_catalog.remember_session(db_obj)
+        recent_writes.mark(session_key(db_obj.id), user_key(db_obj.username))
+        # ID和时间均在客户端生成，提交后无需再 refresh
+        # 新会话没有历史记录，直接写入缓存，后续消息通过写穿透追加
+        history_cache.put(db_obj.id, db_obj.system_prompt, db_obj.voice_type, [])
+        chat_search_service.fallback_index.add_session(db_obj.id, db_obj.username, db_obj.session_name)
         return db_obj
-    
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[HistorySession]:
+        """
+        根据ID获取历史会话（包括已删除的会话），并填充角色的提示词与音色
+
+        Args:
+            db: 数据库会话
+            id: 会话ID
+
+        Returns:
+            Optional[HistorySession]: 历史会话对象或None
+        """
+        session = await super().get(db, id)
+        await persona_catalog.attach(db, [session])
+        return session
+
     async def get_by_id(
         self, 
         db: AsyncSession, 
@@ -95,7 +218,58 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
                 )
             )
         )
-        return result.scalar_one_or_none()
+        session = result.scalar_one_or_none()
+        await persona_catalog.attach(db, [session])
+        return session
+    
+    async def rehydrate(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session: HistorySession
+    ) -> int:
+        """
+        恢复已归档会话的聊天记录，未归档时直接返回
+        
+        Args:
+            db: 数据库会话
+            session: 会话
+            
+        Returns:
+            int: 恢复的聊天记录数
+        """
+        if not session.archive_key:
+            return 0
+        return await session_archiver.rehydrate(db, session)
+    
+    async def get_conversation(
+        self, 
+        db: AsyncSession, 
+        *, 
+        session_id: str
+    ) -> Optional[CachedConversation]:
+        """
+        获取会话的提示词、音色及完整历史消息，优先读取会话历史缓存，
+        未命中时按主键读取会话，再以 (role, content) 元组读取历史消息（不创建聊天记录对象）并写入缓存
+        
+        Args:
+            db: 数据库会话
+            session_id: 会话ID
+            
+        Returns:
+            Optional[CachedConversation]: 会话及其历史消息，会话不存在或已删除时返回None
+        """
+        conversation = history_cache.get(session_id)
+        if conversation is not None:
+            return conversation
+        
+        session = await self.get_by_id(db, id=session_id)
+        if session is None:
+            return None
+        # 冷数据：先将归档的聊天记录恢复到 history_chat
+        await self.rehydrate(db, session=session)
+        messages = await crud_history_chat.get_messages_by_session_id(db, session_id=session_id)
+        return history_cache.put(session_id, session.system_prompt, session.voice_type, messages)
     
     async def get_multi(
         self, 
@@ -103,29 +277,42 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
         *, 
         page: int = 0, 
         page_size: int = 20,
-        username: Optional[str] = "admin"
-    ) -> List[HistorySession]:
+        username: Optional[str] = "admin",
+        cursor: Optional[str] = None,
+        sort: str = "created",
+        fields: Optional[Sequence[str]] = None
+    ) -> List[Any]:
         """
-        获取历史会话列表
+        获取历史会话列表（按创建时间或最近活跃时间倒序），计数与预览直接取自会话行，
+        由 (username, is_deleted, created_at / last_message_at) 索引支撑；
+        不填充角色的提示词，需要时调用 attach_personas
         
         Args:
             db: 数据库会话
-            page: 页码
+            page: 页码（未提供游标时使用 OFFSET 分页）
             page_size: 每页记录数
             username: 用户名过滤（可选）
+            cursor: 上一页返回的游标，提供时按游标分页并忽略 page
+            sort: 排序方式，created 按创建时间，active 按最近活跃时间
+            fields: 列表项字段，提供时只查询所需的列（不读取提示词等大字段），返回行而不是会话对象
             
         Returns:
-            List[HistorySession]: 历史会话列表
+            List: 历史会话列表（HistorySession，或提供 fields 时为只包含所需列的行）
+            
+        Raises:
+            ValueError: 游标格式无效时抛出异常
         """
-        query = select(HistorySession).where(HistorySession.is_deleted == False)
+        query = self._select(fields, SESSION_SORT_FIELDS[sort]).where(HistorySession.is_deleted == False)
         
         if username:
             query = query.where(HistorySession.username == username)
         
-        query = query.offset(page * page_size).limit(page_size).order_by(HistorySession.created_at.desc())
+        query = self._paginate(
+            query, page=page, page_size=page_size, cursor=cursor, field=SESSION_SORT_FIELDS[sort]
+        )
         
-        result = await db.execute(query)
-        return result.scalars().all()
+        result = await db.execute(on_replica(query, user_key(username)))
+        return result.scalars().all() if fields is None else result.all()
     
     async def get_by_username(
         self, 
@@ -143,15 +330,14 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
         Returns:
             List[HistorySession]: 该用户的历史会话列表
         """
-        result = await db.execute(
-            select(HistorySession).where(
-                and_(
-                    HistorySession.username == username,
-                    HistorySession.is_deleted == False
-                )
-            ).order_by(HistorySession.created_at.desc())
-        )
-        return result.scalars().all()
+        query = select(HistorySession).where(
+            and_(
+                HistorySession.username == username,
+                HistorySession.is_deleted == False
+            )
+        ).order_by(HistorySession.created_at.desc())
+        result = await db.execute(on_replica(query, user_key(username)))
+        return await self.attach_personas(db, list(result.scalars().all()))
     
     async def update(
         self, 
@@ -176,12 +362,34 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
         else:
             update_data = obj_in.dict(exclude_unset=True)
         
+        was_deleted = db_obj.is_deleted
         for field, value in update_data.items():
             setattr(db_obj, field, value)
+        if db_obj.is_deleted != was_deleted:
+            # 删除时间，后台清理任务据此判断是否超过保留期
+            db_obj.deleted_at = get_current_time() if db_obj.is_deleted else None
+        
+        if "system_prompt" in update_data or "voice_type" in update_data:
+            # 角色内容不可修改，改为引用新内容对应的角色
+            db_obj.persona_id = persona_id_for(db_obj.system_prompt or "", db_obj.voice_type or "")
+            await persona_catalog.ensure(db, db_obj)
         
         db.add(db_obj)
         await db.commit()
+        persona_catalog.remember_session(db_obj)
         await db.refresh(db_obj)
+        await persona_catalog.attach(db, [db_obj])
+        recent_writes.mark(session_key(db_obj.id), user_key(db_obj.username))
+        if db_obj.is_deleted:
+            history_cache.invalidate(db_obj.id)
+            chat_search_service.fallback_index.remove_session(db_obj.id)
+        else:
+            history_cache.update_session(
+                db_obj.id,
+                system_prompt=db_obj.system_prompt,
+                voice_type=db_obj.voice_type
+            )
+            chat_search_service.fallback_index.add_session(db_obj.id, db_obj.username, db_obj.session_name)
         return db_obj
     
     async def soft_delete(
@@ -205,9 +413,15 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
             return None
         
         db_obj.is_deleted = True
+        # 删除时间，后台清理任务据此判断是否超过保留期
+        db_obj.deleted_at = db_obj.updated_at = get_current_time()
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await persona_catalog.attach(db, [db_obj])
+        recent_writes.mark(session_key(id), user_key(db_obj.username))
+        history_cache.invalidate(id)
+        chat_search_service.fallback_index.remove_session(id)
         return db_obj
     
     async def search_sessions(
@@ -216,62 +430,113 @@ class CRUDHistorySession(CRUDBase[HistorySession, HistorySessionCreate, HistoryS
         *, 
         keyword: Optional[str] = None,
         page: int = 0,
-        page_size: int = 20
-    ) -> List[HistorySession]:
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> List[Any]:
         """
         搜索历史会话
         
         Args:
             db: 数据库会话
-            username: 用户名
             keyword: 搜索关键词（在会话名称中搜索）
-            skip: 跳过的记录数
-            limit: 限制返回的记录数
+            page: 页码（未提供游标时使用 OFFSET 分页）
+            page_size: 每页记录数
+            cursor: 上一页返回的游标，提供时按游标分页并忽略 page
+            fields: 列表项字段，提供时只查询所需的列，返回行而不是会话对象
             
         Returns:
-            List[HistorySession]: 搜索结果列表
+            List: 搜索结果列表（HistorySession，或提供 fields 时为只包含所需列的行）
+            
+        Raises:
+            ValueError: 游标格式无效时抛出异常
         """
-        query = select(HistorySession).where(
+        query = self._select(fields).where(
             HistorySession.is_deleted == False
         )
         
-        if keyword:
+        if keyword and is_mysql(db) and len(keyword) >= NGRAM_TOKEN_SIZE:
+            # 使用 FULLTEXT(ngram) 索引的短语查询缩小范围，避免 LIKE '%关键词%' 全表扫描；
+            # 候选行上再按子串过滤，结果与不使用索引时相同（自然语言模式只要任一分词命中即匹配）
+            query = query.where(
+                text("MATCH(history_session.session_name) AGAINST(:keyword IN BOOLEAN MODE)")
+                .bindparams(keyword=fulltext_phrase(keyword)),
+                HistorySession.session_name.contains(keyword)
+            )
+        elif keyword:
             query = query.where(
                 HistorySession.session_name.contains(keyword)
             )
         
-        query = query.offset(page * page_size).limit(page_size).order_by(HistorySession.created_at.desc())
+        query = self._paginate(query, page=page, page_size=page_size, cursor=cursor)
         
-        result = await db.execute(query)
-        return result.scalars().all()
+        result = await db.execute(on_replica(query))
+        return result.scalars().all() if fields is None else result.all()
     
-    async def count_by_username(
+    async def attach_personas(
         self, 
         db: AsyncSession, 
-        *, 
-        username: str
-    ) -> int:
+        sessions: List[HistorySession]
+    ) -> List[HistorySession]:
         """
-        统计用户的历史会话数量
+        为会话填充所引用角色的提示词与音色（命中进程内缓存时不访问数据库）
         
         Args:
             db: 数据库会话
-            username: 用户名
+            sessions: 会话列表
             
         Returns:
-            int: 会话数量
+            List[HistorySession]: 同一列表
+        """
+        await persona_catalog.attach(db, sessions)
+        return sessions
+    
+    async def summarize(
+        self, 
+        db: AsyncSession, 
+        sessions: List[Any],
+        fields: Optional[Sequence[str]] = None
+    ) -> List[HistorySessionSummary]:
         """
-        from sqlalchemy import func
+        将会话转换为列表项，角色名称取自进程内缓存（未命中的通过一次 IN 查询加载）
         
-        result = await db.execute(
-            select(func.count(HistorySession.id)).where(
-                and_(
-                    HistorySession.username == username,
-                    HistorySession.is_deleted == False
-                )
+        Args:
+            db: 数据库会话
+            sessions: 会话对象或 get_multi / search_sessions 按 fields 查询得到的行
+            fields: 列表项字段，为空时返回全部字段；未请求的字段不会被标记为已设置
+            
+        Returns:
+            List[HistorySessionSummary]: 会话列表项
+        """
+        fields = list(fields or SUMMARY_FIELDS)
+        personas = {}
+        if "persona_name" in fields:
+            personas = await persona_catalog.get_many(
+                db, (session.persona_id for session in sessions if session.persona_id)
             )
-        )
-        return result.scalar() or 0
+        summaries = []
+        for session in sessions:
+            values = {name: getattr(session, name) for name in fields if name != "persona_name"}
+            if "persona_name" in fields:
+                persona = personas.get(session.persona_id) if session.persona_id else None
+                values["persona_name"] = persona.name if persona is not None else ""
+            summaries.append(HistorySessionSummary(**values))
+        return summaries
+    
+    def _select(self, fields: Optional[Sequence[str]], sort_field: str = "created_at"):
+        """查询完整的会话对象，或只查询列表项所需的列"""
+        if fields is None:
+            return select(HistorySession)
+        return select(*summary_columns(fields, sort_field))
+    
+    def _paginate(
+        self, query, *, page: int, page_size: int, cursor: Optional[str], field: str = "created_at"
+    ):
+        """按 (field, id) 倒序分页，有游标时使用 keyset 条件，否则使用 OFFSET"""
+        query = query.order_by(*keyset_order(HistorySession, descending=True, field=field)).limit(page_size)
+        if cursor:
+            return query.where(keyset_condition(HistorySession, cursor, descending=True, field=field))
+        return query.offset(page * page_size)
 
 
 # 创建CRUD实例
@@ -0,0 +1,205 @@
+"""
+会话历史热缓存
+进程内按字节数做 LRU 淘汰的会话缓存，以 session_id 为键，
+保存会话的角色提示词、音色以及只追加的 (role, content) 消息列表，
+避免每轮对话都从数据库重新加载并实例化整段历史
+"""
+import sys
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import settings
+
+# 每条消息元组及列表槽位的固定开销估算（字节）
+_MESSAGE_OVERHEAD = 72
+# 每个会话条目的固定开销估算（字节）
+_ENTRY_OVERHEAD = 256
+
+
+class CachedConversation:
+    """缓存中的会话：提示词、音色与只追加的消息列表"""
+
+    __slots__ = ("session_id", "system_prompt", "voice_type", "messages", "nbytes")
+
+    def __init__(
+        self,
+        session_id: str,
+        system_prompt: str,
+        voice_type: str,
+        messages: List[Tuple[str, str]]
+    ):
+        """
+        Args:
+            session_id: 会话ID
+            system_prompt: 会话的角色提示词
+            voice_type: 会话的音色类型
+            messages: 按时间顺序排列的 (role, content) 列表
+        """
+        self.session_id = session_id
+        self.system_prompt = system_prompt
+        self.voice_type = voice_type
+        self.messages = messages
+        self.nbytes = (
+            _ENTRY_OVERHEAD
+            + sys.getsizeof(session_id)
+            + sys.getsizeof(system_prompt)
+            + sys.getsizeof(voice_type)
+            + sum(_message_size(content) for _, content in messages)
+        )
+
+
+def _message_size(content: str) -> int:
+    """估算单条消息占用的内存字节数"""
+    return _MESSAGE_OVERHEAD + sys.getsizeof(content)
+
+
+class SessionHistoryCache:
+    """按字节数做 LRU 淘汰的会话历史缓存"""
+
+    def __init__(self, max_bytes: int, enabled: bool = True):
+        """
+        Args:
+            max_bytes: 缓存总字节数上限
+            enabled: 是否启用
+        """
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CachedConversation]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, session_id: str) -> Optional[CachedConversation]:
+        """
+        获取缓存的会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            Optional[CachedConversation]: 缓存条目，未命中时返回 None
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def put(
+        self,
+        session_id: str,
+        system_prompt: str,
+        voice_type: str,
+        messages: Iterable[Tuple[str, str]]
+    ) -> CachedConversation:
+        """
+        写入（或替换）会话缓存
+
+        Args:
+            session_id: 会话ID
+            system_prompt: 角色提示词
+            voice_type: 音色类型
+            messages: 按时间顺序排列的 (role, content)
+
+        Returns:
+            CachedConversation: 会话条目（缓存未启用或超出上限时仍返回，但不会被缓存）
+        """
+        entry = CachedConversation(session_id, system_prompt or "", voice_type or "", list(messages))
+        if not self.enabled:
+            return entry
+        self.invalidate(session_id)
+        if entry.nbytes > self.max_bytes:
+            return entry
+        self._entries[session_id] = entry
+        self._bytes += entry.nbytes
+        self._evict()
+        return entry
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """
+        向已缓存的会话追加消息（写穿透），会话未缓存时忽略
+
+        Args:
+            session_id: 会话ID
+            role: 角色
+            content: 消息内容
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = _message_size(content)
+        entry.messages.append((role, content))
+        entry.nbytes += size
+        self._bytes += size
+        self._entries.move_to_end(session_id)
+        self._evict()
+
+    def update_session(
+        self,
+        session_id: str,
+        system_prompt: Optional[str] = None,
+        voice_type: Optional[str] = None
+    ) -> None:
+        """
+        更新已缓存会话的提示词或音色
+
+        Args:
+            session_id: 会话ID
+            system_prompt: 新的角色提示词
+            voice_type: 新的音色类型
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        self.put(
+            session_id,
+            entry.system_prompt if system_prompt is None else system_prompt,
+            entry.voice_type if voice_type is None else voice_type,
+            entry.messages
+        )
+
+    def invalidate(self, session_id: str) -> None:
+        """
+        移除会话缓存
+
+        Args:
+            session_id: 会话ID
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _evict(self) -> None:
+        """按 LRU 淘汰，直到总字节数不超过上限"""
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, int]: 条目数、字节数、命中与未命中次数
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+# 全局会话历史缓存实例
+history_cache = SessionHistoryCache(
+    max_bytes=settings.HISTORY_CACHE_MAX_BYTES,
+    enabled=settings.HISTORY_CACHE_ENABLED
+)
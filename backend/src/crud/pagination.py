@@ -0,0 +1,139 @@
+"""
+基于 (created_at, id) 的游标（keyset）分页
+游标对客户端不透明，内容为最后一条记录的创建时间与ID；
+查询使用 “(created_at, id) 严格小于/大于游标” 的条件代替 OFFSET，深翻页的耗时与第一页相同。
+排序字段可通过 field 参数替换为其他时间列（如会话的 last_message_at）
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    """
+    生成游标
+
+    Args:
+        created_at: 记录的创建时间
+        id: 记录ID
+
+    Returns:
+        str: URL 安全的 base64 游标
+    """
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    解析游标
+
+    Args:
+        cursor: encode_cursor 生成的游标
+
+    Returns:
+        Tuple[datetime, str]: 创建时间与记录ID
+
+    Raises:
+        ValueError: 游标格式无效时抛出异常
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
+def cursor_of(obj: Any, field: str = "created_at") -> str:
+    """
+    生成指向某条记录的游标
+
+    Args:
+        obj: 包含 created_at 与 id 的记录
+        field: 排序使用的时间字段
+
+    Returns:
+        str: 游标
+    """
+    return encode_cursor(getattr(obj, field), obj.id)
+
+
+def keyset_condition(model: Any, cursor: str, descending: bool, field: str = "created_at"):
+    """
+    生成游标之后（按排序方向）的过滤条件
+
+    Args:
+        model: 包含 created_at 与 id 列的表模型
+        cursor: 游标
+        descending: 是否按时间倒序
+        field: 排序使用的时间字段
+
+    Returns:
+        过滤条件表达式
+
+    Raises:
+        ValueError: 游标格式无效时抛出异常
+    """
+    value, id = decode_cursor(cursor)
+    column = getattr(model, field)
+    if descending:
+        return or_(column < value, and_(column == value, model.id < id))
+    return or_(column > value, and_(column == value, model.id > id))
+
+
+def keyset_order(model: Any, descending: bool, field: str = "created_at") -> List[Any]:
+    """
+    生成与游标条件一致的排序表达式
+
+    Args:
+        model: 包含 created_at 与 id 列的表模型
+        descending: 是否按时间倒序
+        field: 排序使用的时间字段
+
+    Returns:
+        List: 排序表达式
+    """
+    column = getattr(model, field)
+    if descending:
+        return [column.desc(), model.id.desc()]
+    return [column.asc(), model.id.asc()]
+
+
+def after_cursor(obj: Any, cursor: Optional[str], descending: bool) -> bool:
+    """
+    判断内存中的记录是否位于游标之后（与 keyset_condition 语义一致）
+
+    Args:
+        obj: 包含 created_at 与 id 的记录
+        cursor: 游标，为空时始终返回 True
+        descending: 是否按时间倒序
+
+    Returns:
+        bool: 是否位于游标之后
+    """
+    if not cursor:
+        return True
+    key = decode_cursor(cursor)
+    return (obj.created_at, obj.id) < key if descending else (obj.created_at, obj.id) > key
+
+
+def next_cursor(items: Iterable[Any], limit: int, field: str = "created_at") -> Optional[str]:
+    """
+    根据本页结果生成下一页游标，本页不足 limit 条时说明已无更多数据
+
+    Args:
+        items: 本页记录（按查询顺序）
+        limit: 每页记录数
+        field: 排序使用的时间字段
+
+    Returns:
+        Optional[str]: 下一页游标，没有更多数据时返回 None
+    """
+    items = list(items)
+    if len(items) < limit or not items:
+        return None
+    return cursor_of(items[-1], field)
@@ -0,0 +1,251 @@
+"""
+角色目录
+每种不同的提示词与音色组合在 persona 表中只保存一份，ID 由内容计算（UUIDv5），会话通过 persona_id 引用。
+角色内容不可修改，进程内按 LRU 缓存，缓存无需失效；会话对象上的 system_prompt / voice_type
+始终是实际生效的值：写入时由映射事件清空引用了角色的会话行中的两列，读取时由 CRUD 层调用 attach 填充
+"""
+import re
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.config import settings
+from src.crud.base import CRUDBase
+from src.model.history_session import HistorySession
+from src.model.persona import Persona
+
+logger = logging.getLogger(__name__)
+
+# 计算角色ID的 UUIDv5 命名空间（固定值，修改会导致相同内容得到不同ID）
+PERSONA_NAMESPACE = uuid.UUID("8f0c52e4-3f59-4c55-9a57-1a4b3d6a7e21")
+
+# 角色名称的最大长度
+NAME_MAX_CHARS = 50
+
+# 从提示词中提取角色名称，如 “扮演用户自定义的角色：Harry Potter。”
+_NAME_PATTERN = re.compile(r"角色[：:]\s*([^\s。，,；;\n][^。，,；;\n]*)")
+
+
+def persona_id_for(system_prompt: str, voice_type: str) -> str:
+    """
+    计算角色ID（相同的提示词与音色总是得到相同的ID）
+
+    Args:
+        system_prompt: 角色提示词
+        voice_type: 音色类型
+
+    Returns:
+        str: UUID 字符串
+    """
+    return str(uuid.uuid5(PERSONA_NAMESPACE, f"{voice_type}\x00{system_prompt}"))
+
+
+def persona_name_for(system_prompt: str) -> str:
+    """
+    从提示词中提取角色名称，提取不到时使用提示词的第一行
+
+    Args:
+        system_prompt: 角色提示词
+
+    Returns:
+        str: 角色名称
+    """
+    match = _NAME_PATTERN.search(system_prompt or "")
+    if match:
+        name = match.group(1).strip()
+    else:
+        name = next((line.strip() for line in (system_prompt or "").splitlines() if line.strip()), "")
+    return name if len(name) <= NAME_MAX_CHARS else name[:NAME_MAX_CHARS - 1] + "…"
+
+
+def build_persona(system_prompt: str, voice_type: str) -> Persona:
+    """
+    构建角色对象（不访问数据库）
+
+    Args:
+        system_prompt: 角色提示词
+        voice_type: 音色类型
+
+    Returns:
+        Persona: 角色对象
+    """
+    system_prompt, voice_type = system_prompt or "", voice_type or ""
+    return Persona(
+        id=persona_id_for(system_prompt, voice_type),
+        name=persona_name_for(system_prompt),
+        system_prompt=system_prompt,
+        voice_type=voice_type
+    )
+
+
+def insert_ignore(persona: Persona) -> Any:
+    """生成 “已存在则忽略” 的角色 INSERT 语句（内容相同的角色ID相同，并发写入不会冲突）"""
+    return insert(Persona).values(
+        id=persona.id,
+        name=persona.name,
+        system_prompt=persona.system_prompt,
+        voice_type=persona.voice_type,
+        created_at=persona.created_at,
+        updated_at=persona.updated_at
+    ).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+
+
+class PersonaCatalog:
+    """角色目录（进程内 LRU 缓存 + persona 表）"""
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: 缓存的最大角色数
+        """
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Persona]" = OrderedDict()
+        self._crud = CRUDBase(Persona)
+
+    def remember(self, persona: Persona) -> None:
+        """
+        缓存已写入数据库的角色
+
+        Args:
+            persona: 角色
+        """
+        self._cache[persona.id] = persona
+        self._cache.move_to_end(persona.id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def get_cached(self, persona_id: str) -> Optional[Persona]:
+        """
+        从缓存中获取角色
+
+        Args:
+            persona_id: 角色ID
+
+        Returns:
+            Optional[Persona]: 角色，未缓存时返回None
+        """
+        persona = self._cache.get(persona_id)
+        if persona is not None:
+            self._cache.move_to_end(persona_id)
+        return persona
+
+    async def get_many(self, db: AsyncSession, persona_ids: Iterable[str]) -> Dict[str, Persona]:
+        """
+        批量获取角色，未缓存的角色按ID分批 IN 查询加载
+
+        Args:
+            db: 数据库会话
+            persona_ids: 角色ID
+
+        Returns:
+            Dict[str, Persona]: 角色ID -> 角色（不存在的ID不包含在结果中）
+        """
+        found: Dict[str, Persona] = {}
+        missing: List[str] = []
+        for persona_id in set(persona_ids):
+            persona = self.get_cached(persona_id)
+            if persona is None:
+                missing.append(persona_id)
+            else:
+                found[persona_id] = persona
+        for persona in await self._crud.get_many(db, missing):
+            self.remember(persona)
+            found[persona.id] = persona
+        return found
+
+    async def ensure(self, db: AsyncSession, session: HistorySession) -> None:
+        """
+        确保会话引用的角色已写入数据库（在调用方的事务中执行，由调用方提交）
+
+        Args:
+            db: 数据库会话
+            session: 由提示词与音色构建、引用了角色的会话
+        """
+        if not session.persona_id or session.persona_id in self._cache:
+            return
+        await db.execute(insert_ignore(build_persona(session.system_prompt, session.voice_type)))
+
+    def remember_session(self, session: HistorySession) -> None:
+        """
+        事务提交后缓存会话引用的角色
+
+        Args:
+            session: 引用了角色的会话（对象上为生效的提示词与音色）
+        """
+        if session.persona_id and session.persona_id not in self._cache:
+            self.remember(build_persona(session.system_prompt, session.voice_type))
+
+    async def attach(self, db: AsyncSession, sessions: Iterable[Optional[HistorySession]]) -> None:
+        """
+        将角色的提示词与音色填充到会话对象上（不标记为修改）
+
+        Args:
+            db: 数据库会话
+            sessions: 会话（忽略None）
+        """
+        sessions = [session for session in sessions if session is not None and session.persona_id]
+        if not sessions:
+            return
+        personas = await self.get_many(db, (session.persona_id for session in sessions))
+        for session in sessions:
+            persona = personas.get(session.persona_id)
+            if persona is None:
+                logger.warning(f"会话 {session.id} 引用的角色不存在: {session.persona_id}")
+                continue
+            set_committed_value(session, "system_prompt", persona.system_prompt)
+            set_committed_value(session, "voice_type", persona.voice_type)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计"""
+        return {"cached": len(self._cache), "max_entries": self.max_entries}
+
+
+def _strip_persona_columns(target: HistorySession, changed_only: bool) -> None:
+    """写入前清空引用了角色的会话行中的提示词与音色，记录生效值以便写入后恢复"""
+    if not target.persona_id:
+        return
+    state = inspect(target)
+    if changed_only and not any(
+        state.attrs[name].history.has_changes() for name in ("system_prompt", "voice_type")
+    ):
+        return
+    state.info["persona_values"] = (target.system_prompt, target.voice_type)
+    target.system_prompt = ""
+    target.voice_type = ""
+
+
+def _restore_persona_columns(target: HistorySession) -> None:
+    """写入后恢复对象上的生效值（缓存与响应使用的是对象本身）"""
+    values = inspect(target).info.pop("persona_values", None)
+    if values is not None:
+        set_committed_value(target, "system_prompt", values[0])
+        set_committed_value(target, "voice_type", values[1])
+
+
+@event.listens_for(HistorySession, "before_insert")
+def _strip_on_insert(mapper, connection, target: HistorySession) -> None:
+    _strip_persona_columns(target, changed_only=False)
+
+
+@event.listens_for(HistorySession, "after_insert")
+def _restore_after_insert(mapper, connection, target: HistorySession) -> None:
+    _restore_persona_columns(target)
+
+
+@event.listens_for(HistorySession, "before_update")
+def _strip_on_update(mapper, connection, target: HistorySession) -> None:
+    _strip_persona_columns(target, changed_only=True)
+
+
+@event.listens_for(HistorySession, "after_update")
+def _restore_after_update(mapper, connection, target: HistorySession) -> None:
+    _restore_persona_columns(target)
+
+
+# 全局角色目录实例
+persona_catalog = PersonaCatalog(max_entries=settings.PERSONA_CACHE_SIZE)
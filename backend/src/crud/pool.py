@@ -0,0 +1,234 @@
+"""
+连接池管理
+取代 pool_pre_ping（每次取用连接都多一次 SELECT 1 往返），只使用 SQLAlchemy 连接池的公开接口与事件：
+- InstrumentedPool 记录取用连接的次数、连接池耗尽时的等待时间与超时次数
+- PoolMonitor 在后台定期检查空闲超过一定时间的连接，失效的连接关闭后在下次取用时重新建立，
+  请求取用连接时不再检查；根据语句执行结果与后台检查记录数据库是否可用，健康检查直接读取该状态，不再额外执行查询
+连接池按 FIFO 取用，队首总是空闲最久的连接：后台检查通过公开的 connect() 每次只取用队首的一个连接，
+检查后归还到队尾，不会同时占用多个空闲连接，也不占用请求仍需要的最后一个空闲连接。
+连接数由 QueuePool 自身控制：最多保留 pool_size 个连接，负载上升时按需创建至 pool_size + max_overflow，
+超出 pool_size 的连接归还时直接关闭。不再按统计收缩空闲连接：公开接口只能关闭连接而不能移除队列中的连接记录，
+FIFO 队列会轮流取到已关闭的记录并重新建立连接，收缩反而造成反复建立连接
+会话本身在第一次执行语句时才取用连接，只读取缓存或不访问数据库的请求不占用连接
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+from sqlalchemy.util import greenlet_spawn
+
+logger = logging.getLogger(__name__)
+
+# 连接归还到连接池的时间（记录在连接的 info 中，连接重新建立时由连接池清空）
+_IDLE_SINCE = "idle_since"
+
+
+class PoolStats:
+    """连接池统计"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.validated = 0
+        self.invalidated = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """统计结果"""
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.waits * 1000, 3) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "validated": self.validated,
+            "invalidated": self.invalidated,
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """记录取用次数、等待时间与耗尽次数的连接池"""
+
+    def __init__(self, *args: Any, max_overflow: int = 10, **kwargs: Any):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        # recreate() 按原参数重建连接池时同样传入
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def connect(self) -> PoolProxiedConnection:
+        # 没有空闲连接且已达到连接数上限时需要等待其他请求归还
+        exhausted = self.checkedin() == 0 and -1 < self.max_overflow <= self.overflow()
+        started = time.monotonic()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        if exhausted:
+            waited = time.monotonic() - started
+            self.stats.waits += 1
+            self.stats.total_wait += waited
+            self.stats.max_wait = max(self.stats.max_wait, waited)
+        self.stats.checkouts += 1
+        return connection
+
+    def connect_unrecorded(self) -> PoolProxiedConnection:
+        """取用连接但不计入统计（PoolMonitor 的后台检查使用）"""
+        return super().connect()
+
+    def recreate(self) -> "InstrumentedPool":
+        # engine.dispose() 会重建连接池，统计延续
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class PoolMonitor:
+    """连接池的后台检查：空闲连接有效性与数据库可用状态"""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        validate_idle: float = 60.0,
+        check_interval: float = 15.0
+    ):
+        """
+        Args:
+            engine: 使用 InstrumentedPool 的引擎
+            validate_idle: 空闲超过该时间（秒）的连接在后台检查有效性
+            check_interval: 检查间隔（秒）
+        """
+        self.engine = engine
+        self.validate_idle = validate_idle
+        self.check_interval = check_interval
+        self.connected = False
+        self.last_error: Optional[str] = None
+        self._last_ok: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "after_cursor_execute", self._on_execute)
+        event.listen(sync_engine, "handle_error", self._on_error)
+
+    @property
+    def pool(self) -> InstrumentedPool:
+        """当前的连接池（engine.dispose() 后为新建的连接池）"""
+        return self.engine.sync_engine.pool
+
+    @property
+    def running(self) -> bool:
+        """后台检查是否在运行"""
+        return self._task is not None
+
+    def _on_checkin(self, dbapi_connection: Any, connection_record: Any) -> None:
+        if dbapi_connection is not None:
+            connection_record.info[_IDLE_SINCE] = time.monotonic()
+
+    def _on_execute(self, *args: Any) -> None:
+        self._mark_ok()
+
+    def _on_error(self, context: Any) -> None:
+        if context.is_disconnect:
+            self.connected = False
+            self.last_error = str(context.original_exception)
+
+    def _mark_ok(self) -> None:
+        self._last_ok = time.monotonic()
+        self.connected = True
+        self.last_error = None
+
+    def _validate_idle(self) -> None:
+        """
+        从队首开始逐个检查空闲超时的连接（在 greenlet 中执行，可以调用同步的驱动方法），
+        遇到尚未超时的连接时结束（之后的连接归还得更晚）
+        """
+        pool = self.pool
+        stats = pool.stats
+        for _ in range(pool.checkedin()):
+            # 有请求在使用连接时保留最后一个空闲连接，避免请求因后台检查而新建连接
+            if pool.checkedin() == 0 or (pool.checkedin() == 1 and pool.checkedout() > 0):
+                return
+            connection = pool.connect_unrecorded()
+            info = connection.info
+            idle_since = info.get(_IDLE_SINCE)
+            if idle_since is None or time.monotonic() - idle_since < self.validate_idle:
+                # 未超时（或刚重新建立）的连接原样归还，保留其归还时间
+                connection.close()
+                if idle_since is not None:
+                    info[_IDLE_SINCE] = idle_since
+                return
+            try:
+                self.engine.dialect.do_ping(connection.dbapi_connection)
+            except Exception as e:
+                # 关闭失效的连接并归还，下次取用时重新建立
+                logger.warning(f"空闲数据库连接已失效: {e}")
+                stats.invalidated += 1
+                connection.invalidate(e)
+                continue
+            stats.validated += 1
+            self._mark_ok()
+            connection.close()
+
+    async def check(self) -> None:
+        """执行一次检查：检查空闲超时的连接；一个周期内没有成功执行过语句时探测数据库是否可用"""
+        try:
+            await greenlet_spawn(self._validate_idle)
+        except Exception as e:
+            # 重新建立已关闭的连接失败
+            logger.warning(f"空闲数据库连接检查失败: {e}")
+            self.connected = False
+            self.last_error = str(e)
+        if self._last_ok is None or time.monotonic() - self._last_ok >= self.check_interval:
+            try:
+                async with self.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            except Exception as e:
+                logger.warning(f"数据库连接检查失败: {e}")
+                self.connected = False
+                self.last_error = str(e)
+
+    async def start(self) -> None:
+        """完成首次检查并启动定期检查任务"""
+        if self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """定期检查任务"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"连接池检查失败: {e}")
+
+    async def close(self) -> None:
+        """停止检查任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """
+        获取连接池状态
+
+        Returns:
+            Dict[str, Any]: 数据库可用状态与连接池统计
+        """
+        pool = self.pool
+        return {
+            "connected": self.connected,
+            "last_ok_seconds_ago": round(time.monotonic() - self._last_ok, 3) if self._last_ok is not None else None,
+            "last_error": self.last_error,
+            "max_connections": pool.size() + pool.max_overflow,
+            **pool.stats.to_dict(),
+        }
@@ -0,0 +1,215 @@
+"""
+读写分离路由
+只读的列表与历史查询通过 on_replica 标记后路由到只读副本，其余查询与全部写入走主库。
+会话或用户在最近一段时间内有写入时，其查询仍走主库，保证读到自己的写入；
+后台任务定期检查副本的复制延迟，延迟超限或无法连接的副本不再接收查询，全部副本不可用时回退到主库
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 语句的执行选项名，标记该查询可以在只读副本上执行
+REPLICA_OPTION = "use_replica"
+
+
+class RecentWrites:
+    """记录最近有写入的会话与用户（进程内）"""
+
+    def __init__(self, window: float):
+        """
+        Args:
+            window: 写入后保持读主库的时间（秒）
+        """
+        self.window = window
+        self._written: Dict[str, float] = {}
+
+    def mark(self, *keys: Optional[str]) -> None:
+        """
+        记录写入
+
+        Args:
+            keys: 被写入的会话ID或用户名（使用 session_key / user_key 生成）
+        """
+        now = time.monotonic()
+        for key in keys:
+            if key:
+                self._written[key] = now
+        if len(self._written) > 10000:
+            self._prune(now)
+
+    def is_recent(self, *keys: Optional[str]) -> bool:
+        """
+        判断是否有任一键在保持时间内被写入过
+
+        Args:
+            keys: 会话ID或用户名键
+
+        Returns:
+            bool: 是否需要读主库
+        """
+        now = time.monotonic()
+        for key in keys:
+            written_at = self._written.get(key) if key else None
+            if written_at is not None and now - written_at < self.window:
+                return True
+        return False
+
+    def _prune(self, now: float) -> None:
+        """移除已过保持时间的记录"""
+        expired = [key for key, written_at in self._written.items() if now - written_at >= self.window]
+        for key in expired:
+            del self._written[key]
+
+
+def session_key(session_id: str) -> str:
+    """会话ID的写入记录键"""
+    return f"session:{session_id}"
+
+
+def user_key(username: Optional[str]) -> Optional[str]:
+    """用户名的写入记录键"""
+    return f"user:{username}" if username else None
+
+
+def on_replica(query: Any, *keys: Optional[str]) -> Any:
+    """
+    将只读查询标记为可在只读副本上执行；相关会话或用户最近有写入时保持走主库
+
+    Args:
+        query: 查询语句
+        keys: 查询涉及的会话ID或用户名键
+
+    Returns:
+        查询语句
+    """
+    if recent_writes.is_recent(*keys):
+        return query
+    return query.execution_options(**{REPLICA_OPTION: True})
+
+
+class ReplicaRouter:
+    """只读副本选择与复制延迟检查"""
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float = 2.0, check_interval: float = 5.0):
+        """
+        Args:
+            engines: 只读副本引擎
+            max_lag: 允许的最大复制延迟（秒）
+            check_interval: 延迟检查间隔（秒）
+        """
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._healthy: List[AsyncEngine] = []
+        self._lags: Dict[int, Optional[float]] = {}
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """
+        轮询选择一个可用的副本
+
+        Returns:
+            Optional[AsyncEngine]: 副本引擎，没有可用副本时返回 None（使用主库）
+        """
+        healthy = self._healthy
+        if not healthy:
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    async def _replica_lag(self, engine: AsyncEngine) -> Optional[float]:
+        """
+        查询副本的复制延迟
+
+        Args:
+            engine: 副本引擎
+
+        Returns:
+            Optional[float]: 延迟秒数，复制已中断时返回 None
+        """
+        async with engine.connect() as conn:
+            if conn.dialect.name != "mysql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            try:
+                result = await conn.execute(text("SHOW REPLICA STATUS"))
+            except Exception:
+                # MySQL 8.0.22 之前的版本
+                result = await conn.execute(text("SHOW SLAVE STATUS"))
+            row = result.mappings().first()
+            if row is None:
+                # 不是复制从库（如云数据库的只读地址），只检查连通性
+                return 0.0
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            return None if lag is None else float(lag)
+
+    async def check(self) -> None:
+        """检查全部副本的复制延迟并更新可用副本列表"""
+        healthy = []
+        for i, engine in enumerate(self.engines):
+            try:
+                lag = await self._replica_lag(engine)
+            except Exception as e:
+                logger.warning(f"只读副本 {i} 连接失败: {e}")
+                lag = None
+            self._lags[i] = lag
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(engine)
+            elif lag is not None:
+                logger.warning(f"只读副本 {i} 复制延迟 {lag:.1f} 秒，超过上限，查询回退到主库")
+        self._healthy = healthy
+
+    async def start(self) -> None:
+        """完成首次检查并启动定期检查任务"""
+        if not self.engines or self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """定期检查任务"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"只读副本检查失败: {e}")
+
+    async def close(self) -> None:
+        """停止检查任务并关闭副本连接"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._healthy = []
+        for engine in self.engines:
+            await engine.dispose()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        获取副本状态
+
+        Returns:
+            List[Dict[str, Any]]: 每个副本的延迟与可用状态
+        """
+        return [
+            {
+                "replica": i,
+                "lag_seconds": self._lags.get(i),
+                "healthy": engine in self._healthy,
+            }
+            for i, engine in enumerate(self.engines)
+        ]
+
+
+# 全局写入记录实例
+recent_writes = RecentWrites(settings.DB_REPLICA_STICKY_SECONDS)
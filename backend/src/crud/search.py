@@ -0,0 +1,446 @@
+"""
+会话名称与聊天内容的全文检索
+MySQL 使用带 ngram 分词器的 FULLTEXT 索引（支持中文），按相关度排序分页；
+其他数据库（如本地开发用的 SQLite）使用进程内的二元分词倒排索引作为回退，
+回退索引只保存最近的 max_documents 条聊天记录，内存占用不随历史数据无限增长
+"""
+import math
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlmodel import select
+
+from src.config import settings
+from src.crud.routing import on_replica, user_key
+from src.model.history_chat import HistoryChat
+from src.model.history_session import HistorySession
+from src.model.ids import id_column_type
+
+logger = logging.getLogger(__name__)
+
+# 需要维护的 FULLTEXT 索引：索引名 -> (表名, 列名)
+FULLTEXT_INDEXES = {
+    "ft_session_name": ("history_session", "session_name"),
+    "ft_chat_content": ("history_chat", "content"),
+}
+
+# MySQL ngram 分词的默认长度，短于该长度的关键词无法使用 FULLTEXT 索引
+NGRAM_TOKEN_SIZE = 2
+
+# 会话名称命中的相关度权重
+SESSION_NAME_WEIGHT = 2.0
+
+
+class SearchHit(BaseModel):
+    """检索结果"""
+    session_id: str = Field(description="会话ID")
+    session_name: str = Field(description="会话名称")
+    chat_id: Optional[str] = Field(None, description="命中的聊天记录ID，命中会话名称时为空")
+    snippet: str = Field(description="命中内容的片段")
+    score: float = Field(description="相关度")
+    created_at: Optional[datetime] = Field(None, description="命中聊天记录的创建时间")
+
+
+def is_mysql(db: AsyncSession) -> bool:
+    """判断数据库会话是否连接 MySQL"""
+    return db.get_bind().dialect.name == "mysql"
+
+
+def fulltext_phrase(keyword: str) -> str:
+    """
+    转换为 BOOLEAN MODE 的短语查询（ngram 分词后要求全部分词按顺序相邻出现），
+    去掉关键词中的双引号，避免破坏短语
+
+    Args:
+        keyword: 搜索关键词
+
+    Returns:
+        str: AGAINST 的参数
+    """
+    return '"' + keyword.replace('"', " ") + '"'
+
+
+def make_snippet(content: str, keyword: str, max_chars: int) -> str:
+    """
+    截取关键词附近的内容作为片段
+
+    Args:
+        content: 完整内容
+        keyword: 关键词
+        max_chars: 片段最大字符数
+
+    Returns:
+        str: 片段，被截断的一侧以省略号标记
+    """
+    if len(content) <= max_chars:
+        return content
+    position = content.lower().find(keyword.lower())
+    if position < 0:
+        # 整个关键词未出现时，定位到第一个命中的二元词
+        position = next(
+            (content.find(gram) for gram in _ngrams(keyword) if gram in content),
+            0
+        )
+    start = max(0, min(position - max_chars // 3, len(content) - max_chars))
+    snippet = content[start:start + max_chars]
+    if start > 0:
+        snippet = "…" + snippet
+    if start + max_chars < len(content):
+        snippet = snippet + "…"
+    return snippet
+
+
+def _ngrams(value: str, size: int = NGRAM_TOKEN_SIZE) -> List[str]:
+    """按字符切分为 ngram（小写，忽略空白），长度不足时返回自身"""
+    value = "".join(value.lower().split())
+    if len(value) <= size:
+        return [value] if value else []
+    return [value[i:i + size] for i in range(len(value) - size + 1)]
+
+
+async def ensure_fulltext_indexes(conn: AsyncConnection) -> None:
+    """
+    创建缺失的 FULLTEXT(ngram) 索引，仅对 MySQL 生效
+
+    Args:
+        conn: 数据库连接
+    """
+    if conn.dialect.name != "mysql":
+        return
+    result = await conn.execute(text(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND INDEX_TYPE = 'FULLTEXT'"
+    ))
+    existing = {row[0] for row in result.fetchall()}
+    for name, (table, column) in FULLTEXT_INDEXES.items():
+        if name in existing:
+            continue
+        logger.info(f"创建全文索引: {table}.{column} ({name})")
+        await conn.execute(text(
+            f"ALTER TABLE `{table}` ADD FULLTEXT INDEX `{name}` (`{column}`) WITH PARSER ngram"
+        ))
+
+
+class NgramSearchIndex:
+    """进程内二元分词倒排索引（非 MySQL 数据库的回退实现）"""
+
+    def __init__(self, max_documents: int = 200000):
+        """
+        Args:
+            max_documents: 最多索引的聊天记录数，超过后淘汰最早加入的记录（会话名称不计入）
+        """
+        self.max_documents = max_documents
+        # 文档键：("chat", chat_id) 或 ("session", session_id)
+        self._postings: Dict[str, Dict[Tuple[str, str], int]] = defaultdict(dict)
+        self._documents: Dict[Tuple[str, str], Tuple[str, str, Optional[datetime]]] = {}
+        # 聊天记录按加入顺序排列，超出上限时从最早的开始淘汰
+        self._chat_keys: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.evicted = 0
+        self._sessions: Dict[str, Tuple[str, str]] = {}
+        self._session_docs: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self._removed: Set[str] = set()
+        self.ready = False
+        self._building = False
+        self._build_lock = asyncio.Lock()
+
+    def _add_document(self, key: Tuple[str, str], session_id: str, value: str, created_at: Optional[datetime]) -> None:
+        if key in self._documents or session_id in self._removed:
+            return
+        self._documents[key] = (session_id, value, created_at)
+        self._session_docs[session_id].add(key)
+        for gram in _ngrams(value):
+            postings = self._postings[gram]
+            postings[key] = postings.get(key, 0) + 1
+        if key[0] == "chat":
+            self._chat_keys[key] = None
+            while len(self._chat_keys) > self.max_documents:
+                oldest = next(iter(self._chat_keys))
+                session_id = self._documents[oldest][0]
+                self._session_docs[session_id].discard(oldest)
+                if not self._session_docs[session_id]:
+                    del self._session_docs[session_id]
+                self._remove_document(oldest)
+                self.evicted += 1
+
+    def _remove_document(self, key: Tuple[str, str]) -> None:
+        self._chat_keys.pop(key, None)
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        for gram in set(_ngrams(document[1])):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[gram]
+
+    def add_session(self, session_id: str, username: str, session_name: str) -> None:
+        """
+        添加或更新会话
+
+        Args:
+            session_id: 会话ID
+            username: 用户名
+            session_name: 会话名称
+        """
+        if not (self.ready or self._building):
+            return
+        self._sessions[session_id] = (username, session_name)
+        self._remove_document(("session", session_id))
+        self._add_document(("session", session_id), session_id, session_name, None)
+
+    def add_chat(self, chat: HistoryChat) -> None:
+        """
+        添加聊天记录
+
+        Args:
+            chat: 聊天记录
+        """
+        if not (self.ready or self._building):
+            return
+        self._add_document(("chat", chat.id), chat.session_id, chat.content, chat.created_at)
+
+    def remove_session(self, session_id: str) -> None:
+        """
+        移除会话及其全部聊天记录（删除会话时调用）
+
+        Args:
+            session_id: 会话ID
+        """
+        if self._building:
+            self._removed.add(session_id)
+        self._sessions.pop(session_id, None)
+        for key in self._session_docs.pop(session_id, set()):
+            self._remove_document(key)
+
+    def remove_chats(self, session_id: str) -> None:
+        """
+        移除会话的全部聊天记录，保留会话名称
+
+        Args:
+            session_id: 会话ID
+        """
+        keys = self._session_docs.get(session_id, set())
+        for key in [key for key in keys if key[0] == "chat"]:
+            keys.discard(key)
+            self._remove_document(key)
+
+    def remove_chat(self, session_id: str, chat_id: str) -> None:
+        """
+        移除一条聊天记录
+
+        Args:
+            session_id: 会话ID
+            chat_id: 聊天记录ID
+        """
+        self._session_docs.get(session_id, set()).discard(("chat", chat_id))
+        self._remove_document(("chat", chat_id))
+
+    async def build(self, db: AsyncSession) -> None:
+        """
+        从数据库全量构建索引，构建期间发生的写入同样会进入索引
+
+        Args:
+            db: 数据库会话
+        """
+        async with self._build_lock:
+            if not self.ready:
+                await self._build(db)
+
+    async def _build(self, db: AsyncSession) -> None:
+        """全量构建索引"""
+        self._building = True
+        try:
+            sessions = await db.stream_scalars(
+                select(HistorySession).where(HistorySession.is_deleted == False)
+            )
+            async for session in sessions:
+                self.add_session(session.id, session.username, session.session_name)
+            # 只加载最近的 max_documents 条聊天记录，按时间顺序加入
+            result = await db.execute(
+                select(HistoryChat.created_at).order_by(HistoryChat.created_at.desc())
+                .offset(self.max_documents - 1).limit(1)
+            )
+            horizon = result.scalar_one_or_none()
+            query = select(HistoryChat).order_by(HistoryChat.created_at, HistoryChat.id)
+            if horizon is not None:
+                query = query.where(HistoryChat.created_at >= horizon)
+            chats = await db.stream_scalars(query.execution_options(yield_per=1000))
+            async for chat in chats:
+                self.add_chat(chat)
+            self.ready = True
+            logger.info(
+                f"全文检索回退索引构建完成: {len(self._documents)} 条文档"
+                + (f"，更早的聊天记录不在索引中（最早 {horizon}）" if horizon is not None else "")
+            )
+        finally:
+            self._building = False
+            self._removed.clear()
+
+    def search(
+        self,
+        keyword: str,
+        username: Optional[str],
+        offset: int,
+        limit: int,
+        snippet_chars: int
+    ) -> List[SearchHit]:
+        """
+        按相关度检索
+
+        Args:
+            keyword: 关键词
+            username: 用户名过滤
+            offset: 跳过的结果数
+            limit: 返回的结果数
+            snippet_chars: 片段最大字符数
+
+        Returns:
+            List[SearchHit]: 按相关度降序排列的结果
+        """
+        grams = _ngrams(keyword)
+        total = max(len(self._documents), 1)
+        scores: Dict[Tuple[str, str], float] = defaultdict(float)
+        for gram in set(grams):
+            postings = self._postings.get(gram, {})
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for key, tf in postings.items():
+                scores[key] += tf * idf
+
+        hits = []
+        for key, score in scores.items():
+            session_id, value, created_at = self._documents[key]
+            session = self._sessions.get(session_id)
+            if session is None or (username and session[0] != username):
+                continue
+            if keyword.lower() in value.lower():
+                # 完整包含关键词的结果排在前面
+                score *= 2
+            if key[0] == "session":
+                score *= SESSION_NAME_WEIGHT
+            hits.append(SearchHit(
+                session_id=session_id,
+                session_name=session[1],
+                chat_id=key[1] if key[0] == "chat" else None,
+                snippet=make_snippet(value, keyword, snippet_chars),
+                score=round(score, 4),
+                created_at=created_at
+            ))
+        hits.sort(key=lambda hit: (hit.score, hit.created_at or datetime.min), reverse=True)
+        return hits[offset:offset + limit]
+
+
+class ChatSearchService:
+    """会话名称与聊天内容的全文检索服务"""
+
+    def __init__(self, fallback_enabled: bool = True, snippet_chars: int = 80, fallback_max_documents: int = 200000):
+        """
+        Args:
+            fallback_enabled: 非 MySQL 数据库是否启用进程内回退索引
+            snippet_chars: 返回片段的最大字符数
+            fallback_max_documents: 回退索引最多保存的聊天记录数
+        """
+        self.fallback_enabled = fallback_enabled
+        self.snippet_chars = snippet_chars
+        self.fallback_index = NgramSearchIndex(max_documents=fallback_max_documents)
+
+    async def search(
+        self,
+        db: AsyncSession,
+        *,
+        keyword: str,
+        username: Optional[str] = None,
+        page: int = 0,
+        page_size: int = 20
+    ) -> List[SearchHit]:
+        """
+        检索会话名称与聊天内容，按相关度降序分页返回
+
+        Args:
+            db: 数据库会话
+            keyword: 关键词
+            username: 用户名过滤
+            page: 页码
+            page_size: 每页结果数
+
+        Returns:
+            List[SearchHit]: 检索结果
+
+        Raises:
+            Exception: 非 MySQL 数据库且未启用回退索引时抛出异常
+        """
+        keyword = keyword.strip()
+        if not keyword:
+            return []
+        if is_mysql(db):
+            return await self._search_mysql(db, keyword, username, page * page_size, page_size)
+        if not self.fallback_enabled:
+            raise Exception("当前数据库不支持全文检索")
+        await self.fallback_index.build(db)
+        return self.fallback_index.search(keyword, username, page * page_size, page_size, self.snippet_chars)
+
+    async def _search_mysql(
+        self,
+        db: AsyncSession,
+        keyword: str,
+        username: Optional[str],
+        offset: int,
+        limit: int
+    ) -> List[SearchHit]:
+        """使用 FULLTEXT 索引检索，会话名称与聊天内容的命中合并后按相关度排序"""
+        if len(keyword) < NGRAM_TOKEN_SIZE:
+            name_match = "s.session_name LIKE :pattern"
+            content_match = "c.content LIKE :pattern"
+            name_score = content_score = "1"
+        else:
+            name_match = name_score = "MATCH(s.session_name) AGAINST(:keyword IN NATURAL LANGUAGE MODE)"
+            content_match = content_score = "MATCH(c.content) AGAINST(:keyword IN NATURAL LANGUAGE MODE)"
+        user_filter = "AND s.username = :username" if username else ""
+        statement = text(f"""
+            SELECT session_id, session_name, chat_id, content, created_at, score FROM (
+                SELECT s.id AS session_id, s.session_name, NULL AS chat_id, s.session_name AS content,
+                       NULL AS created_at, ({name_score}) * {SESSION_NAME_WEIGHT} AS score
+                FROM history_session s
+                WHERE s.is_deleted = 0 {user_filter} AND {name_match}
+                UNION ALL
+                SELECT c.session_id, s.session_name, c.id AS chat_id, c.content,
+                       c.created_at, {content_score} AS score
+                FROM history_chat c JOIN history_session s ON s.id = c.session_id
+                WHERE s.is_deleted = 0 {user_filter} AND {content_match}
+            ) hits
+            ORDER BY score DESC, created_at DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(session_id=id_column_type(), chat_id=id_column_type())
+        result = await db.execute(on_replica(statement, user_key(username)), {
+            "keyword": keyword,
+            "pattern": f"%{keyword}%",
+            "username": username,
+            "limit": limit,
+            "offset": offset,
+        })
+        return [
+            SearchHit(
+                session_id=row.session_id,
+                session_name=row.session_name,
+                chat_id=row.chat_id,
+                snippet=make_snippet(row.content or "", keyword, self.snippet_chars),
+                score=round(float(row.score or 0), 4),
+                created_at=row.created_at
+            )
+            for row in result
+        ]
+
+
+# 全局全文检索服务实例
+chat_search_service = ChatSearchService(
+    fallback_enabled=settings.SEARCH_FALLBACK_INDEX_ENABLED,
+    snippet_chars=settings.SEARCH_SNIPPET_CHARS,
+    fallback_max_documents=settings.SEARCH_FALLBACK_INDEX_MAX_DOCS
+)
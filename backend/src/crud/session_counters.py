@@ -0,0 +1,92 @@
+"""
+会话计数字段维护
+history_session 上冗余保存消息数、最后消息时间、最后一条消息的预览与 token 累计，
+由写入聊天记录的同一事务中的 UPDATE 增量维护，会话列表无需再查询 history_chat
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, or_, update
+
+from src.model.history_session import HistorySession
+
+# 最后一条消息预览的最大字符数
+PREVIEW_CHARS = 100
+
+
+def make_preview(content: str) -> str:
+    """
+    生成消息预览（合并空白并截断）
+
+    Args:
+        content: 消息内容
+
+    Returns:
+        str: 预览文本
+    """
+    text = " ".join((content or "").split())
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS - 1] + "…"
+
+
+def token_counts(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    从大模型返回的 usage 中提取 token 数
+
+    Args:
+        usage: OpenAI 格式的 usage 字典
+
+    Returns:
+        Dict[str, int]: prompt_tokens 与 completion_tokens
+    """
+    usage = usage or {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or 0),
+    }
+
+
+def counter_updates(messages: Iterable[Dict[str, Any]]) -> List[Any]:
+    """
+    为一批新写入的消息生成会话计数字段的增量 UPDATE（每个会话一条）
+
+    Args:
+        messages: 包含 session_id、created_at、content 的字典，可选 prompt_tokens、completion_tokens
+
+    Returns:
+        List: UPDATE 语句，需与消息的 INSERT 在同一事务中执行
+    """
+    grouped: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for message in messages:
+        entry = grouped.setdefault(message["session_id"], {
+            "count": 0, "last_at": None, "last_content": "", "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        entry["count"] += 1
+        entry["prompt_tokens"] += message.get("prompt_tokens") or 0
+        entry["completion_tokens"] += message.get("completion_tokens") or 0
+        if entry["last_at"] is None or message["created_at"] >= entry["last_at"]:
+            entry["last_at"] = message["created_at"]
+            entry["last_content"] = message["content"]
+
+    statements = []
+    for session_id, entry in grouped.items():
+        last_at: datetime = entry["last_at"]
+        # 并发写入时只让更晚的消息覆盖最后消息时间与预览
+        is_newer = or_(HistorySession.last_message_at.is_(None), HistorySession.last_message_at <= last_at)
+        statements.append(
+            update(HistorySession)
+            .where(HistorySession.id == session_id)
+            .values(
+                message_count=HistorySession.message_count + entry["count"],
+                prompt_tokens=HistorySession.prompt_tokens + entry["prompt_tokens"],
+                completion_tokens=HistorySession.completion_tokens + entry["completion_tokens"],
+                last_message_at=case((is_newer, last_at), else_=HistorySession.last_message_at),
+                last_message_preview=case(
+                    (is_newer, make_preview(entry["last_content"])),
+                    else_=HistorySession.last_message_preview
+                ),
+            )
+            # 增量更新无法在 Python 端求值，也不需要同步身份映射中的对象
+            .execution_options(synchronize_session=False)
+        )
+    return statements
@@ -0,0 +1,191 @@
+"""
+嵌入式 SQLite 后端（单机部署）
+数据库文件使用 WAL 日志模式：读取不阻塞写入，写入只追加 WAL 文件，synchronous=NORMAL 时提交无需 fsync 主文件。
+SQLite 同一时刻只允许一个写事务，写入在进程内排队（SQLiteWriteQueue），按到达顺序依次获得写锁，
+而不是由 SQLite 的 busy handler 轮询重试；只读查询（on_replica）走独立的只读连接池，与写入并行
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import TextClause, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from src.config import settings
+from src.crud.pool import InstrumentedPool
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_url(url: str) -> bool:
+    """判断连接URL是否为 SQLite"""
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_memory_url(url: str) -> bool:
+    """判断连接URL是否为内存数据库（每个连接各自独立，不能使用只读连接池）"""
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def _pragmas(read_only: bool) -> Dict[str, Any]:
+    """每个新连接上执行的 PRAGMA"""
+    pragmas: Dict[str, Any] = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        # 负数表示以 KiB 为单位
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+    if read_only:
+        pragmas["query_only"] = "ON"
+    return pragmas
+
+
+def _is_write(statement: Any) -> bool:
+    """语句是否会写入（文本SQL除 SELECT / PRAGMA 查询外一律按写入处理）"""
+    if isinstance(statement, TextClause):
+        return not statement.text.lstrip().upper().startswith(("SELECT", "PRAGMA"))
+    return getattr(statement, "is_dml", False)
+
+
+def create_sqlite_engine(url: str, *, read_only: bool = False, pool_size: int = 5, echo: bool = False) -> AsyncEngine:
+    """
+    创建 SQLite 引擎，新连接上设置 WAL 模式及调优 PRAGMA
+
+    Args:
+        url: sqlite+aiosqlite 连接URL
+        read_only: 是否为只读连接池（连接上设置 query_only）
+        pool_size: 连接池大小
+        echo: 是否打印SQL语句
+
+    Returns:
+        AsyncEngine: 异步引擎
+    """
+    # 与服务器数据库相同使用 InstrumentedPool，PoolMonitor 记录连接池统计与数据库可用状态
+    engine = create_async_engine(url, poolclass=InstrumentedPool, pool_size=pool_size, max_overflow=0, echo=echo)
+    pragmas = _pragmas(read_only)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+class SQLiteWriteQueue:
+    """进程内的 SQLite 写入队列（同一时刻只有一个数据库会话持有写锁）"""
+
+    def __init__(self, timeout: float = 30.0):
+        """
+        Args:
+            timeout: 等待写锁的最长时间（秒）
+        """
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def acquire(self) -> None:
+        """
+        获取写锁
+
+        Raises:
+            Exception: 等待超时时抛出异常
+        """
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"等待 SQLite 写锁超时（{self.timeout} 秒）")
+        waited = time.monotonic() - started
+        self._waits += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def release(self) -> None:
+        """释放写锁"""
+        self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """写入排队统计"""
+        return {
+            "writes": self._waits,
+            "waiting": self._lock.locked(),
+            "avg_wait_ms": round(self._total_wait / self._waits * 1000, 3) if self._waits else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 3),
+        }
+
+
+# 全局 SQLite 写入队列
+sqlite_write_queue = SQLiteWriteQueue(timeout=settings.SQLITE_WRITE_TIMEOUT)
+
+
+class SerializedWriteSession(AsyncSession):
+    """
+    写入经过 SQLiteWriteQueue 排队的数据库会话：第一次写入（flush 或 DML 语句）前获取写锁，
+    提交、回滚或关闭时释放。只读会话不占用写锁
+    """
+
+    _write_queue: SQLiteWriteQueue = sqlite_write_queue
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._holds_write_lock = False
+
+    def _has_pending_writes(self) -> bool:
+        sync_session = self.sync_session
+        return bool(sync_session.new or sync_session.dirty or sync_session.deleted)
+
+    async def _begin_write(self, statement: Optional[Any] = None) -> None:
+        if self._holds_write_lock:
+            return
+        if self._has_pending_writes() or _is_write(statement):
+            await self._write_queue.acquire()
+            self._holds_write_lock = True
+
+    def _end_write(self) -> None:
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self._write_queue.release()
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        await self._begin_write(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        await self._begin_write(statement)
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def flush(self, objects: Optional[Any] = None) -> None:
+        await self._begin_write()
+        await super().flush(objects)
+
+    async def commit(self) -> None:
+        await self._begin_write()
+        try:
+            await super().commit()
+        finally:
+            self._end_write()
+
+    async def rollback(self) -> None:
+        try:
+            await super().rollback()
+        finally:
+            self._end_write()
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            self._end_write()
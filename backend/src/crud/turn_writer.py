@@ -0,0 +1,176 @@
+"""
+对话轮次的并发落库
+用户消息在后台与大模型请求并行写入，助手回复在返回结果后再写入。
+同一会话的写入按提交顺序串行执行，读取历史记录前会等待该会话进行中的写入完成，
+保证历史记录顺序正确；大模型调用失败或客户端断开时撤销本轮已写入的用户消息
+"""
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.crud.crud_history_chat import HistoryChatCreate, crud_history_chat
+from src.crud.crud_history_session import crud_history_session
+from src.model.history_chat import HistoryChat
+from src.model.history_session import HistorySession
+
+logger = logging.getLogger(__name__)
+
+
+class TurnWriter:
+    """按会话串行、与请求处理并发的对话落库器"""
+
+    def __init__(self):
+        self.session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._tails: Dict[str, asyncio.Task] = {}
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        设置数据库会话工厂
+
+        Args:
+            session_factory: 数据库会话工厂，每次写入使用独立的会话
+        """
+        self.session_factory = session_factory
+
+    def _chain(self, session_id: str, write: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """将写入排在该会话上一次写入之后执行（无论上一次是否成功），任务结果为写入的返回值"""
+        previous = self._tails.get(session_id)
+
+        async def run() -> Any:
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            return await write()
+
+        task = asyncio.create_task(run())
+        self._tails[session_id] = task
+        task.add_done_callback(functools.partial(self._on_task_done, session_id))
+        return task
+
+    def _on_task_done(self, session_id: str, task: asyncio.Task) -> None:
+        """写入结束后移除记录并输出失败日志"""
+        if self._tails.get(session_id) is task:
+            del self._tails[session_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"会话 {session_id} 的聊天记录写入失败: {task.exception()}")
+
+    async def _write(
+        self,
+        objs_in: List[HistoryChatCreate],
+        session: Optional[HistorySession] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> List[HistoryChat]:
+        """使用独立的数据库会话写入消息（及新会话）"""
+        if self.session_factory is None:
+            raise Exception("对话落库未启动")
+        async with self.session_factory() as db:
+            return await crud_history_chat.create_turn(db, objs_in=objs_in, session=session, usage=usage)
+
+    def submit_user_message(
+        self,
+        user_chat: HistoryChatCreate,
+        session: Optional[HistorySession] = None
+    ) -> asyncio.Task:
+        """
+        在后台写入用户消息（及新会话），调用方可同时请求大模型
+
+        Args:
+            user_chat: 用户消息
+            session: 尚未写入数据库的新会话
+
+        Returns:
+            asyncio.Task: 写入任务，结果为写入的聊天记录；失败时由 submit_reply 补写，本轮未完成时由 discard 撤销
+        """
+        return self._chain(user_chat.session_id, lambda: self._write([user_chat], session))
+
+    def submit_reply(
+        self,
+        user_task: asyncio.Task,
+        user_chat: HistoryChatCreate,
+        assistant_chat: HistoryChatCreate,
+        session: Optional[HistorySession] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> asyncio.Task:
+        """
+        在后台写入助手回复；用户消息写入失败时将用户消息与回复在同一事务中补写
+
+        Args:
+            user_task: submit_user_message 返回的写入任务
+            user_chat: 用户消息
+            assistant_chat: 助手回复
+            session: 本轮创建的新会话
+            usage: 本轮大模型调用的 token 用量（流式回复与预生成开场白没有用量信息）
+
+        Returns:
+            asyncio.Task: 写入任务
+        """
+        async def write() -> None:
+            if not user_task.cancelled() and user_task.exception() is None:
+                await self._write([assistant_chat], usage=usage)
+                return
+            logger.warning(f"用户消息写入失败，与助手回复一起补写: {user_chat.session_id}")
+            retry_session = session
+            if session is not None:
+                async with self.session_factory() as db:
+                    if await crud_history_session.get_by_id(db, id=session.id):
+                        retry_session = None
+            await self._write([user_chat, assistant_chat], retry_session, usage)
+
+        return self._chain(user_chat.session_id, write)
+
+    def discard(
+        self,
+        user_task: asyncio.Task,
+        session_id: str,
+        session: Optional[HistorySession] = None
+    ) -> asyncio.Task:
+        """
+        撤销本轮已在后台写入的用户消息（大模型调用失败、没有返回内容或客户端断开时调用），
+        本轮创建的新会话一并删除，会话计数字段按剩余的聊天记录重新计算
+
+        Args:
+            user_task: submit_user_message 返回的写入任务
+            session_id: 会话ID
+            session: 本轮创建的新会话
+
+        Returns:
+            asyncio.Task: 撤销任务
+        """
+        async def write() -> None:
+            if user_task.cancelled() or user_task.exception() is not None:
+                return
+            async with self.session_factory() as db:
+                await crud_history_chat.remove_turn(
+                    db,
+                    session_id=session_id,
+                    ids=[chat.id for chat in user_task.result()],
+                    delete_session=session is not None
+                )
+
+        return self._chain(session_id, write)
+
+    async def wait(self, session_id: str) -> None:
+        """
+        等待会话中进行中的写入完成（不抛出写入异常）
+
+        Args:
+            session_id: 会话ID
+        """
+        task = self._tails.get(session_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def wait_all(self) -> None:
+        """等待所有会话进行中的写入完成（不抛出写入异常），用于跨会话的列表、检索与导出"""
+        if self._tails:
+            await asyncio.gather(*list(self._tails.values()), return_exceptions=True)
+
+    async def close(self) -> None:
+        """等待所有进行中的写入完成"""
+        await asyncio.gather(*list(self._tails.values()), return_exceptions=True)
+
+
+# 全局对话落库实例
+turn_writer = TurnWriter()
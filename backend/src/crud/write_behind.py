@@ -0,0 +1,394 @@
+"""
+聊天记录异步落库（write-behind）
+聊天接口产生的 HistoryChat 先追加写入本地日志文件（fsync），再放入异步队列，
+由后台任务按批次使用多行 INSERT 写入数据库，每批写入后日志只保留未落库的消息；进程崩溃后启动时从日志重放未落库的消息。
+批次多次重试仍失败时改为逐行写入，无法写入的消息移入死信文件，不再阻塞队列。
+未落库的消息保存在内存中，CRUD 层读取历史记录时会一并返回；
+会话的计数字段与每批消息在同一事务中更新
+"""
+import os
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.crud.session_counters import counter_updates, token_counts
+from src.model.history_chat import HistoryChat, ChatRole
+
+logger = logging.getLogger(__name__)
+
+
+def _to_record(chat: HistoryChat) -> Dict[str, Any]:
+    """将聊天记录对象转换为可写入日志的字典"""
+    return {
+        "id": chat.id,
+        "session_id": chat.session_id,
+        "role": chat.role.value,
+        "content": chat.content,
+        "created_at": chat.created_at.isoformat(),
+        "updated_at": chat.updated_at.isoformat(),
+    }
+
+
+def _counter_message(record: Dict[str, Any]) -> Dict[str, Any]:
+    """提取更新会话计数字段所需的消息信息（含 token 用量）"""
+    return {
+        "session_id": record["session_id"],
+        "created_at": datetime.fromisoformat(record["created_at"]),
+        "content": record["content"],
+        "prompt_tokens": record.get("prompt_tokens", 0),
+        "completion_tokens": record.get("completion_tokens", 0),
+    }
+
+
+def _to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """将日志中的字典转换为 INSERT 参数（内容由 crud_history_chat.to_row 压缩）"""
+    return {
+        "id": record["id"],
+        "session_id": record["session_id"],
+        "role": ChatRole(record["role"]),
+        "content": record["content"],
+        "created_at": datetime.fromisoformat(record["created_at"]),
+        "updated_at": datetime.fromisoformat(record["updated_at"]),
+    }
+
+
+def _chat_crud():
+    """聊天记录的 CRUD 实例（crud_history_chat 依赖本模块，在使用时导入以避免循环导入）"""
+    from src.crud.crud_history_chat import crud_history_chat
+    return crud_history_chat
+
+
+class HistoryWriteBehind:
+    """聊天记录异步批量落库器"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        journal_path: str = "data/history_journal.jsonl",
+        batch_size: int = 100,
+        flush_interval: float = 0.2,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+        max_retries: int = 5,
+        dead_letter_path: str = "data/history_dead_letter.jsonl"
+    ):
+        """
+        Args:
+            enabled: 是否启用异步落库
+            journal_path: 本地日志文件路径
+            batch_size: 单次 INSERT 的最大行数
+            flush_interval: 凑批等待时间（秒）
+            retry_delay: 写库失败后的初始重试间隔（秒）
+            max_retry_delay: 写库失败后的最大重试间隔（秒）
+            max_retries: 批次写库失败后的最大重试次数，超过后逐行写入
+            dead_letter_path: 无法落库的消息的死信文件路径
+        """
+        self.enabled = enabled
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._journal_lock = asyncio.Lock()
+        self._batch_lock = asyncio.Lock()
+        self._inflight: List[Dict[str, Any]] = []
+        self._writer_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """后台写入任务是否在运行"""
+        return self._writer_task is not None and not self._writer_task.done()
+
+    async def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        重放本地日志中未落库的消息并启动后台写入任务
+
+        Args:
+            session_factory: 数据库会话工厂
+        """
+        if not self.enabled or self.running:
+            return
+        self._session_factory = session_factory
+        self._queue = asyncio.Queue()
+        self._journal_lock = asyncio.Lock()
+        self._batch_lock = asyncio.Lock()
+
+        records = await asyncio.to_thread(self._read_journal)
+        if records:
+            logger.info(f"从日志重放未落库的聊天记录: {len(records)} 条")
+            for record in records:
+                self._pending[record["id"]] = record
+                self._queue.put_nowait(record)
+
+        self._writer_task = asyncio.create_task(self._run())
+
+    async def enqueue(self, chats: List[HistoryChat], usage: Optional[Dict[str, Any]] = None) -> None:
+        """
+        将聊天记录写入本地日志并放入落库队列，返回后即保证消息不会丢失
+
+        Args:
+            chats: 待写入的聊天记录
+            usage: 本轮大模型调用的 token 用量，记录在最后一条消息上，落库时计入会话
+
+        Raises:
+            Exception: 异步落库未启动时抛出异常
+        """
+        if not self.running:
+            raise Exception("异步落库未启动")
+        records = [_to_record(chat) for chat in chats]
+        if records and usage:
+            records[-1].update(token_counts(usage))
+        async with self._journal_lock:
+            await asyncio.to_thread(self._append_journal, records)
+            for record in records:
+                self._pending[record["id"]] = record
+                self._queue.put_nowait(record)
+
+    def pending_for_session(self, session_id: str) -> List[HistoryChat]:
+        """
+        获取会话中尚未落库的聊天记录
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            List[HistoryChat]: 按写入顺序排列的聊天记录
+        """
+        if not self._pending:
+            return []
+        return [
+            HistoryChat(**_to_row(record))
+            for record in self._pending.values()
+            if record["session_id"] == session_id
+        ]
+
+    async def discard_session(self, session_id: str, ids: Optional[Collection[str]] = None) -> int:
+        """
+        丢弃会话中尚未落库的聊天记录（会话或其聊天记录被删除时调用），
+        同时从日志中移除；正在写入的批次包含这些消息时等待其完成，保证返回后不会再有这些消息落库
+
+        Args:
+            session_id: 会话ID
+            ids: 只丢弃这些消息，为空时丢弃该会话的全部消息
+
+        Returns:
+            int: 丢弃的消息数（不含正在写入的批次中的消息）
+        """
+        def matches(record: Dict[str, Any]) -> bool:
+            return record["session_id"] == session_id and (ids is None or record["id"] in ids)
+
+        discarded = 0
+        if any(matches(record) for record in self._pending.values()):
+            async with self._journal_lock:
+                for record_id in [record_id for record_id, record in self._pending.items() if matches(record)]:
+                    del self._pending[record_id]
+                    discarded += 1
+                discarded -= sum(matches(record) for record in self._inflight)
+                await asyncio.to_thread(self._rewrite_journal, list(self._pending.values()))
+        if any(matches(record) for record in self._inflight):
+            async with self._batch_lock:
+                pass
+        return discarded
+
+    def pending_count(self) -> int:
+        """未落库的消息数"""
+        return len(self._pending)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        等待队列中的消息落库后停止后台任务，超时未写完的消息保留在日志中，下次启动时重放
+
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"异步落库关闭超时，{len(self._pending)} 条消息将在下次启动时重放")
+        self._writer_task.cancel()
+        await asyncio.gather(self._writer_task, return_exceptions=True)
+        self._writer_task = None
+
+    async def _run(self) -> None:
+        """后台写入任务：凑批后写库"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            async with self._batch_lock:
+                # 等待期间被丢弃（所属会话已删除）的消息不再写入
+                self._inflight = [record for record in batch if record["id"] in self._pending]
+                try:
+                    if self._inflight:
+                        await self._flush(self._inflight)
+                finally:
+                    self._inflight = []
+
+            for record in batch:
+                self._pending.pop(record["id"], None)
+            # 持续有消息写入时队列很少为空，每批写入后都用剩余的未落库消息重写日志，
+            # 日志只保留未落库的消息，不会无限增长，重启时也不会重放已落库的消息
+            async with self._journal_lock:
+                if self._pending:
+                    await asyncio.to_thread(self._rewrite_journal, list(self._pending.values()))
+                else:
+                    await asyncio.to_thread(self._truncate_journal)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, records: List[Dict[str, Any]]) -> None:
+        """写入一批消息，失败时按指数退避重试，超过最大重试次数后逐行写入，无法写入的行移入死信文件"""
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                failed = await self._insert_batch(records)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"聊天记录批量落库失败 {attempt + 1} 次，改为逐行写入: {e}")
+                    failed = await self._insert_each(records)
+                    break
+                logger.error(f"聊天记录批量落库失败，{delay:.1f} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+        if failed:
+            await asyncio.to_thread(self._append_dead_letter, failed)
+            logger.error(f"{len(failed)} 条聊天记录无法落库，已移入死信文件 {self.dead_letter_path}")
+
+    async def _insert_batch(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        通过 crud_history_chat.bulk_create 使用多行 INSERT 写入一批消息，并在同一事务中更新会话计数字段；
+        主键冲突（如重放已落库的消息）时改为逐行写入并跳过已存在的行
+
+        Args:
+            records: 日志中的消息字典
+
+        Returns:
+            List[Dict[str, Any]]: 逐行写入时无法写入的消息（如所属会话已被删除）
+        """
+        crud = _chat_crud()
+        async with self._session_factory() as db:
+            try:
+                await crud.bulk_create(db, [_to_row(record) for record in records])
+                for statement in counter_updates(_counter_message(record) for record in records):
+                    await db.execute(statement)
+                await db.commit()
+                return []
+            except IntegrityError:
+                await db.rollback()
+        return await self._insert_each(records)
+
+    async def _insert_each(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        逐行写入消息，每行单独提交；已落库的行由 crud_history_chat.upsert 忽略，不重复更新计数
+
+        Args:
+            records: 日志中的消息字典
+
+        Returns:
+            List[Dict[str, Any]]: 写入失败的消息
+        """
+        crud = _chat_crud()
+        failed = []
+        async with self._session_factory() as db:
+            for record in records:
+                try:
+                    if await crud.upsert(db, [_to_row(record)]):
+                        for statement in counter_updates([_counter_message(record)]):
+                            await db.execute(statement)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"聊天记录无法落库: {record['id']} ({e})")
+                    failed.append(record)
+        return failed
+
+    def _append_journal(self, records: List[Dict[str, Any]]) -> None:
+        """追加写入日志并 fsync"""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append_dead_letter(self, records: List[Dict[str, Any]]) -> None:
+        """将无法落库的消息追加写入死信文件，供人工排查后重新导入"""
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """读取日志中的全部消息，忽略崩溃时写了一半的末行"""
+        if not os.path.exists(self.journal_path):
+            return []
+        records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("忽略日志中不完整的记录")
+                    continue
+                records[record["id"]] = record
+        return list(records.values())
+
+    def _rewrite_journal(self, records: List[Dict[str, Any]]) -> None:
+        """用剩余的未落库消息重写日志（先写临时文件再替换）"""
+        if not os.path.exists(self.journal_path):
+            return
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+
+    def _truncate_journal(self) -> None:
+        """所有消息均已落库后清空日志"""
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+# 全局聊天记录异步落库实例
+history_write_behind = HistoryWriteBehind(
+    enabled=settings.HISTORY_WRITE_BEHIND_ENABLED,
+    journal_path=settings.HISTORY_WRITE_BEHIND_JOURNAL,
+    batch_size=settings.HISTORY_WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.HISTORY_WRITE_BEHIND_FLUSH_INTERVAL,
+    retry_delay=settings.HISTORY_WRITE_BEHIND_RETRY_DELAY,
+    max_retries=settings.HISTORY_WRITE_BEHIND_MAX_RETRIES,
+    dead_letter_path=settings.HISTORY_WRITE_BEHIND_DEAD_LETTER
+)
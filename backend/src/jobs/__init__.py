@@ -0,0 +1,3 @@
+"""
+后台任务模块
+"""
@@ -0,0 +1,163 @@
+"""
+冷数据归档任务
+定期查找超过指定天数没有新消息的会话，将其聊天记录移出 history_chat 写入归档存储，
+保持热表与索引足够小；会话再次被访问时由 CRUD 层按需恢复
+"""
+import time
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Callable, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, and_
+
+from src.config import settings
+from src.crud.archive import SessionArchiver, session_archiver
+from src.model.base import get_current_time
+from src.model.history_chat import HistoryChat
+from src.model.history_session import HistorySession
+
+logger = logging.getLogger(__name__)
+
+# 每轮查询的会话数
+_SESSION_BATCH_SIZE = 100
+
+
+class ArchiveStats(BaseModel):
+    """归档结果统计"""
+    sessions_archived: int = Field(0, description="归档的会话数")
+    chats_archived: int = Field(0, description="移出热表的聊天记录数")
+    elapsed_seconds: float = Field(0, description="耗时（秒）")
+
+
+class SessionArchiveJob:
+    """未活跃会话的后台归档任务"""
+
+    def __init__(
+        self,
+        archiver: SessionArchiver,
+        enabled: bool = False,
+        idle_days: int = 7,
+        interval: int = 3600,
+        pause: float = 0.05
+    ):
+        """
+        Args:
+            archiver: 会话归档器
+            enabled: 是否启用定期归档
+            idle_days: 会话超过该天数没有新消息后归档
+            interval: 执行间隔（秒）
+            pause: 每归档一个会话后的停顿（秒）
+        """
+        self.archiver = archiver
+        self.enabled = enabled
+        self.idle_days = idle_days
+        self.interval = interval
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def run_once(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        idle_days: Optional[int] = None
+    ) -> ArchiveStats:
+        """
+        执行一次归档
+
+        Args:
+            session_factory: 数据库会话工厂
+            idle_days: 未活跃天数，为空时使用默认配置
+
+        Returns:
+            ArchiveStats: 归档结果统计
+        """
+        async with self._lock:
+            started = time.monotonic()
+            days = self.idle_days if idle_days is None else idle_days
+            cutoff = get_current_time() - timedelta(days=days)
+            stats = ArchiveStats()
+
+            # 热表中有聊天记录，且没有 cutoff 之后的新消息（由 (session_id, created_at) 索引支撑）
+            has_chats = select(HistoryChat.id).where(HistoryChat.session_id == HistorySession.id).exists()
+            has_recent_chats = select(HistoryChat.id).where(
+                and_(
+                    HistoryChat.session_id == HistorySession.id,
+                    HistoryChat.created_at >= cutoff
+                )
+            ).exists()
+
+            last_session_id = ""
+            while True:
+                async with session_factory() as db:
+                    result = await db.execute(
+                        select(HistorySession).where(
+                            and_(
+                                HistorySession.is_deleted == False,
+                                HistorySession.created_at < cutoff,
+                                HistorySession.id > last_session_id,
+                                has_chats,
+                                ~has_recent_chats
+                            )
+                        ).order_by(HistorySession.id).limit(_SESSION_BATCH_SIZE)
+                    )
+                    sessions = list(result.scalars().all())
+                    await db.commit()
+                if not sessions:
+                    break
+                last_session_id = sessions[-1].id
+
+                for session in sessions:
+                    # 每个会话使用独立的数据库会话，避免身份映射累积已归档的对象
+                    async with session_factory() as db:
+                        archived = await self.archiver.archive_session(db, session)
+                    if archived:
+                        stats.sessions_archived += 1
+                        stats.chats_archived += archived
+                    if self.pause > 0:
+                        await asyncio.sleep(self.pause)
+
+            stats.elapsed_seconds = round(time.monotonic() - started, 3)
+            logger.info(
+                f"会话归档完成: 会话 {stats.sessions_archived} 个, "
+                f"聊天记录 {stats.chats_archived} 条, 耗时 {stats.elapsed_seconds} 秒"
+            )
+            return stats
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        启动定期归档任务
+
+        Args:
+            session_factory: 数据库会话工厂
+        """
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """定期执行归档，异常只记录日志"""
+        while True:
+            try:
+                await self.run_once(session_factory)
+            except Exception as e:
+                logger.error(f"会话归档失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        """停止定期归档任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局归档任务实例
+session_archive_job = SessionArchiveJob(
+    archiver=session_archiver,
+    enabled=settings.HISTORY_ARCHIVE_ENABLED,
+    idle_days=settings.HISTORY_ARCHIVE_IDLE_DAYS,
+    interval=settings.HISTORY_ARCHIVE_INTERVAL,
+    pause=settings.HISTORY_ARCHIVE_PAUSE
+)
@@ -0,0 +1,170 @@
+"""
+存量聊天内容的压缩回填任务
+按主键顺序分批扫描以明文存储、长度超过压缩阈值的聊天记录，压缩后写回 content_blob；
+并为早先压缩时 content 列留空的行补写明文前缀（使其能被全文检索命中）。
+每批单独提交并短暂停顿；任务可重复执行，已处理的行不会再被处理
+"""
+import time
+import asyncio
+import logging
+from typing import Callable, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.crud.content_codec import CODEC_PLAIN, ContentCodec, content_codec
+from src.crud.crud_history_chat import crud_history_chat
+from src.crud.search import is_mysql
+from src.model.history_chat import HistoryChat
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillStats(BaseModel):
+    """回填结果统计"""
+    rows_compressed: int = Field(0, description="压缩的聊天记录数")
+    bytes_before: int = Field(0, description="压缩前的内容字节数")
+    bytes_after: int = Field(0, description="压缩后的内容字节数")
+    prefixes_filled: int = Field(0, description="补写明文前缀的已压缩聊天记录数")
+    batches: int = Field(0, description="执行的批次数")
+    elapsed_seconds: float = Field(0, description="耗时（秒）")
+
+
+class ContentBackfillJob:
+    """存量聊天内容压缩回填任务"""
+
+    def __init__(
+        self,
+        codec: ContentCodec,
+        enabled: bool = True,
+        batch_size: int = 500,
+        batch_pause: float = 0.1
+    ):
+        """
+        Args:
+            codec: 聊天内容编解码器
+            enabled: 是否在启动时执行
+            batch_size: 每批处理的行数
+            batch_pause: 每批之间的停顿（秒）
+        """
+        self.codec = codec
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def run_once(self, session_factory: Callable[[], AsyncSession]) -> BackfillStats:
+        """
+        执行一次回填
+
+        Args:
+            session_factory: 数据库会话工厂
+
+        Returns:
+            BackfillStats: 回填结果统计
+        """
+        async with self._lock:
+            started = time.monotonic()
+            stats = BackfillStats()
+
+            async with session_factory() as db:
+                # MySQL 的 LENGTH 为字节数；其他数据库按字符数预筛选（UTF-8 每字符最多 4 字节），由编码器最终判断
+                min_length = self.codec.threshold if is_mysql(db) else self.codec.threshold // 4
+                chunks = crud_history_chat.iter_chunks(
+                    db,
+                    HistoryChat.content_codec == CODEC_PLAIN,
+                    func.length(HistoryChat.content) > min_length,
+                    columns=[HistoryChat.id, HistoryChat.content],
+                    chunk_size=self.batch_size
+                )
+                async for rows in chunks:
+                    params = []
+                    for row in rows:
+                        content, blob, codec = self.codec.encode(row.content)
+                        if not codec:
+                            continue
+                        params.append({"id": row.id, "content": content, "content_blob": blob, "content_codec": codec})
+                        stats.bytes_before += len(row.content.encode("utf-8"))
+                        stats.bytes_after += len(blob)
+                    if params:
+                        await crud_history_chat.bulk_update(db, params)
+                    await db.commit()
+                    stats.rows_compressed += len(params)
+                    stats.batches += 1
+                    if self.batch_pause > 0:
+                        await asyncio.sleep(self.batch_pause)
+
+                if self.codec.search_prefix > 0:
+                    await self._fill_prefixes(db, stats)
+
+            stats.elapsed_seconds = round(time.monotonic() - started, 3)
+            if stats.rows_compressed:
+                logger.info(
+                    f"存量聊天内容压缩完成: {stats.rows_compressed} 条, "
+                    f"{stats.bytes_before} -> {stats.bytes_after} 字节, 耗时 {stats.elapsed_seconds} 秒"
+                )
+            if stats.prefixes_filled:
+                logger.info(f"已压缩聊天内容补写明文前缀: {stats.prefixes_filled} 条")
+            return stats
+
+    async def _fill_prefixes(self, db: AsyncSession, stats: BackfillStats) -> None:
+        """为 content 列为空的已压缩聊天记录补写明文前缀"""
+        chunks = crud_history_chat.iter_chunks(
+            db,
+            HistoryChat.content_codec != CODEC_PLAIN,
+            HistoryChat.content == "",
+            columns=[HistoryChat.id, HistoryChat.content_blob, HistoryChat.content_codec],
+            chunk_size=self.batch_size
+        )
+        async for rows in chunks:
+            params = [
+                {
+                    "id": row.id,
+                    "content": self.codec.prefix(
+                        self.codec.decode("", row.content_blob, row.content_codec).encode("utf-8")
+                    )
+                }
+                for row in rows
+            ]
+            await crud_history_chat.bulk_update(db, params)
+            await db.commit()
+            stats.prefixes_filled += len(params)
+            stats.batches += 1
+            if self.batch_pause > 0:
+                await asyncio.sleep(self.batch_pause)
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        在后台执行一次回填
+
+        Args:
+            session_factory: 数据库会话工厂
+        """
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """后台执行回填，异常只记录日志（下次启动时继续）"""
+        try:
+            await self.run_once(session_factory)
+        except Exception as e:
+            logger.error(f"存量聊天内容压缩失败: {e}")
+
+    async def close(self) -> None:
+        """停止回填任务（已提交的批次保留）"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局回填任务实例
+content_backfill_job = ContentBackfillJob(
+    codec=content_codec,
+    enabled=settings.HISTORY_CONTENT_BACKFILL_ENABLED,
+    batch_size=settings.HISTORY_CONTENT_BACKFILL_BATCH_SIZE,
+    batch_pause=settings.HISTORY_CONTENT_BACKFILL_BATCH_PAUSE
+)
@@ -0,0 +1,202 @@
+"""
+已删除会话的后台清理任务
+定期物理删除软删除时间超过保留期的会话及其聊天记录。
+聊天记录按主键范围分批删除、每批单独提交并短暂停顿，避免长事务锁住 history_chat 表
+"""
+import time
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Callable, List, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, and_
+
+from src.config import settings
+from src.crud.history_cache import history_cache
+from src.crud.archive import session_archiver
+from src.crud.write_behind import history_write_behind
+from src.model.base import get_current_time
+from src.model.history_chat import HistoryChat
+from src.model.history_session import HistorySession
+
+logger = logging.getLogger(__name__)
+
+# 每轮处理的会话数
+_SESSION_BATCH_SIZE = 100
+
+
+class PurgeStats(BaseModel):
+    """清理结果统计"""
+    sessions_purged: int = Field(0, description="删除的会话数")
+    chats_purged: int = Field(0, description="删除的聊天记录数")
+    batches: int = Field(0, description="执行的删除批次数")
+    elapsed_seconds: float = Field(0, description="耗时（秒）")
+
+
+class SessionPurgeJob:
+    """已删除会话的后台清理任务"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        retention_days: int = 30,
+        min_retention_days: int = 1,
+        interval: int = 3600,
+        batch_size: int = 1000,
+        batch_pause: float = 0.1
+    ):
+        """
+        Args:
+            enabled: 是否启用定期清理
+            retention_days: 软删除后保留的天数
+            min_retention_days: 执行时可指定的最短保留天数
+            interval: 执行间隔（秒）
+            batch_size: 每批删除的聊天记录行数
+            batch_pause: 每批之间的停顿（秒）
+        """
+        self.enabled = enabled
+        self.retention_days = retention_days
+        self.min_retention_days = min_retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def run_once(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        retention_days: Optional[int] = None
+    ) -> PurgeStats:
+        """
+        执行一次清理
+
+        Args:
+            session_factory: 数据库会话工厂
+            retention_days: 保留天数，为空时使用默认配置
+
+        Returns:
+            PurgeStats: 清理结果统计
+
+        Raises:
+            ValueError: 保留天数小于最短保留天数时抛出异常
+        """
+        if retention_days is not None and retention_days < self.min_retention_days:
+            raise ValueError(f"保留天数不能小于 {self.min_retention_days} 天")
+        async with self._lock:
+            started = time.monotonic()
+            days = self.retention_days if retention_days is None else retention_days
+            cutoff = get_current_time() - timedelta(days=days)
+            stats = PurgeStats()
+
+            async with session_factory() as db:
+                last_session_id = ""
+                while True:
+                    result = await db.execute(
+                        select(HistorySession.id, HistorySession.archive_key).where(
+                            and_(
+                                HistorySession.is_deleted == True,
+                                HistorySession.deleted_at < cutoff,
+                                HistorySession.id > last_session_id
+                            )
+                        ).order_by(HistorySession.id).limit(_SESSION_BATCH_SIZE)
+                    )
+                    rows = result.all()
+                    await db.commit()
+                    if not rows:
+                        break
+                    session_ids = [row.id for row in rows]
+                    last_session_id = session_ids[-1]
+
+                    # 丢弃尚未落库的消息，避免删除后再被写入
+                    for session_id in session_ids:
+                        await history_write_behind.discard_session(session_id)
+                    stats.chats_purged += await self._purge_chats(db, session_ids, stats)
+                    result = await db.execute(
+                        delete(HistorySession).where(HistorySession.id.in_(session_ids))
+                    )
+                    await db.commit()
+                    stats.sessions_purged += result.rowcount
+                    for session_id in session_ids:
+                        history_cache.invalidate(session_id)
+                    # 删除已归档会话的归档文件
+                    for row in rows:
+                        if row.archive_key:
+                            await session_archiver.store.delete(row.archive_key)
+
+            stats.elapsed_seconds = round(time.monotonic() - started, 3)
+            logger.info(
+                f"已删除会话清理完成: 会话 {stats.sessions_purged} 个, "
+                f"聊天记录 {stats.chats_purged} 条, {stats.batches} 批, 耗时 {stats.elapsed_seconds} 秒"
+            )
+            return stats
+
+    async def _purge_chats(self, db: AsyncSession, session_ids: List[str], stats: PurgeStats) -> int:
+        """按主键范围分批删除会话的聊天记录"""
+        purged = 0
+        last_id = ""
+        while True:
+            # 取本批的主键上界，删除语句只锁定 (last_id, upper] 范围内的行
+            result = await db.execute(
+                select(HistoryChat.id).where(
+                    and_(
+                        HistoryChat.session_id.in_(session_ids),
+                        HistoryChat.id > last_id
+                    )
+                ).order_by(HistoryChat.id).offset(self.batch_size - 1).limit(1)
+            )
+            upper = result.scalar_one_or_none()
+
+            condition = and_(HistoryChat.session_id.in_(session_ids), HistoryChat.id > last_id)
+            if upper is not None:
+                condition = and_(condition, HistoryChat.id <= upper)
+            result = await db.execute(delete(HistoryChat).where(condition))
+            await db.commit()
+            purged += result.rowcount
+            stats.batches += 1
+
+            if upper is None:
+                return purged
+            last_id = upper
+            if self.batch_pause > 0:
+                await asyncio.sleep(self.batch_pause)
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        启动定期清理任务
+
+        Args:
+            session_factory: 数据库会话工厂
+        """
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """定期执行清理，异常只记录日志"""
+        while True:
+            try:
+                await self.run_once(session_factory)
+            except Exception as e:
+                logger.error(f"已删除会话清理失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        """停止定期清理任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局清理任务实例
+session_purge_job = SessionPurgeJob(
+    enabled=settings.HISTORY_PURGE_ENABLED,
+    retention_days=settings.HISTORY_PURGE_RETENTION_DAYS,
+    min_retention_days=settings.HISTORY_PURGE_MIN_RETENTION_DAYS,
+    interval=settings.HISTORY_PURGE_INTERVAL,
+    batch_size=settings.HISTORY_PURGE_BATCH_SIZE,
+    batch_pause=settings.HISTORY_PURGE_BATCH_PAUSE
+)
@@ -0,0 +1,170 @@
+"""
+会话计数字段对账任务
+history_session 上的消息数、最后消息时间与预览由写入路径增量维护，
+该任务定期按 history_chat 重新统计并校正偏差（如迁移前的存量会话、直接改库等）。
+校正使用乐观条件更新：期间有新消息写入的会话计数已变化，本轮跳过，下次再对账
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, and_
+
+from src.config import settings
+from src.crud.crud_history_session import crud_history_session
+from src.crud.pagination import keyset_order
+from src.crud.session_counters import make_preview
+from src.crud.write_behind import history_write_behind
+from src.model.history_chat import HistoryChat
+from src.model.history_session import HistorySession
+
+logger = logging.getLogger(__name__)
+
+
+class ReconcileStats(BaseModel):
+    """对账结果统计"""
+    sessions_checked: int = Field(0, description="检查的会话数")
+    sessions_fixed: int = Field(0, description="校正的会话数")
+    elapsed_seconds: float = Field(0, description="耗时（秒）")
+
+
+class SessionCounterReconcileJob:
+    """会话计数字段的后台对账任务"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        interval: int = 86400,
+        batch_size: int = 500,
+        batch_pause: float = 0.1
+    ):
+        """
+        Args:
+            enabled: 是否启用定期对账
+            interval: 执行间隔（秒）
+            batch_size: 每批检查的会话数
+            batch_pause: 每批之间的停顿（秒）
+        """
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def run_once(self, session_factory: Callable[[], AsyncSession]) -> ReconcileStats:
+        """
+        执行一次对账
+
+        Args:
+            session_factory: 数据库会话工厂
+
+        Returns:
+            ReconcileStats: 对账结果统计
+        """
+        async with self._lock:
+            started = time.monotonic()
+            stats = ReconcileStats()
+            async with session_factory() as db:
+                # 已归档会话的聊天记录不在热表中，计数保持归档前的值
+                chunks = crud_history_session.iter_chunks(
+                    db,
+                    HistorySession.is_deleted == False,
+                    HistorySession.archive_key == None,
+                    chunk_size=self.batch_size
+                )
+                async for sessions in chunks:
+                    stats.sessions_checked += len(sessions)
+                    stats.sessions_fixed += await self._reconcile_batch(db, sessions)
+                    if self.batch_pause > 0:
+                        await asyncio.sleep(self.batch_pause)
+
+            stats.elapsed_seconds = round(time.monotonic() - started, 3)
+            logger.info(
+                f"会话计数对账完成: 检查 {stats.sessions_checked} 个, "
+                f"校正 {stats.sessions_fixed} 个, 耗时 {stats.elapsed_seconds} 秒"
+            )
+            return stats
+
+    async def _reconcile_batch(self, db: AsyncSession, sessions: List[HistorySession]) -> int:
+        """按 history_chat 的统计结果校正一批会话，返回校正的会话数"""
+        # 存在未落库消息的会话计数尚未更新，跳过
+        sessions = [s for s in sessions if not history_write_behind.pending_for_session(s.id)]
+        if not sessions:
+            return 0
+        result = await db.execute(
+            select(HistoryChat.session_id, func.count(HistoryChat.id), func.max(HistoryChat.created_at))
+            .where(HistoryChat.session_id.in_([s.id for s in sessions]))
+            .group_by(HistoryChat.session_id)
+        )
+        actual: Dict[str, Tuple[int, datetime]] = {row[0]: (row[1], row[2]) for row in result.all()}
+
+        fixed = 0
+        for session in sessions:
+            count, last_at = actual.get(session.id, (0, session.created_at))
+            if session.message_count == count and session.last_message_at == last_at:
+                continue
+            preview = ""
+            if count:
+                latest = await db.execute(
+                    select(HistoryChat).where(HistoryChat.session_id == session.id)
+                    .order_by(*keyset_order(HistoryChat, descending=True)).limit(1)
+                )
+                preview = make_preview(latest.scalar_one().content)
+            result = await db.execute(
+                update(HistorySession).where(
+                    and_(
+                        HistorySession.id == session.id,
+                        HistorySession.message_count == session.message_count
+                    )
+                ).values(
+                    message_count=count, last_message_at=last_at, last_message_preview=preview
+                ).execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                fixed += 1
+                logger.warning(
+                    f"会话 {session.id} 的计数字段已校正: {session.message_count} -> {count}"
+                )
+        await db.commit()
+        return fixed
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        启动定期对账任务
+
+        Args:
+            session_factory: 数据库会话工厂
+        """
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """定期执行对账，异常只记录日志"""
+        while True:
+            try:
+                await self.run_once(session_factory)
+            except Exception as e:
+                logger.error(f"会话计数对账失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        """停止定期对账任务"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局对账任务实例
+session_reconcile_job = SessionCounterReconcileJob(
+    enabled=settings.HISTORY_RECONCILE_ENABLED,
+    interval=settings.HISTORY_RECONCILE_INTERVAL,
+    batch_size=settings.HISTORY_RECONCILE_BATCH_SIZE,
+    batch_pause=settings.HISTORY_RECONCILE_BATCH_PAUSE
+)
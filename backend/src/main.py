@@ -8,9 +8,17 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from src.api.api_v1 import api_router
-from src.api.deps import create_tables, close_db_connections, health_check
+from src.api.deps import AsyncSessionLocal, create_tables, close_db_connections, health_check, check_schema_indexes, replica_router, start_pool_monitors
+from src.crud.write_behind import history_write_behind
+from src.crud.turn_writer import turn_writer
+from src.jobs.purge import session_purge_job
+from src.jobs.content_backfill import content_backfill_job
+from src.jobs.archive import session_archive_job
+from src.jobs.reconcile import session_reconcile_job
 from src.config import settings
 from src.model_server import init_model_service
+from src.model_server.greeting_cache import greeting_cache
+from src.model.history_session import DEFAULT_PROMPT, DEFAULT_VOICE_TYPE
 
 # 配置日志
 logging.basicConfig(
@@ -37,6 +45,22 @@ async def lifespan(app: FastAPI):
             # 只在需要时创建表
             await create_tables()
             logger.info("数据库表检查/创建完成")
+            # 检查只读副本复制延迟并启动定期检查
+            await replica_router.start()
+            # 启动连接池的后台检查（空闲连接有效性与数据库可用状态）
+            await start_pool_monitors()
+            # 启动聊天记录异步落库（重放上次未落库的消息）
+            await history_write_behind.start(AsyncSessionLocal)
+            # 对话轮次的后台落库
+            turn_writer.start(AsyncSessionLocal)
+            # 启动已删除会话的后台清理任务
+            session_purge_job.start(AsyncSessionLocal)
+            # 后台压缩存量的超长聊天内容
+            content_backfill_job.start(AsyncSessionLocal)
+            # 启动未活跃会话的冷数据归档任务
+            session_archive_job.start(AsyncSessionLocal)
+            # 启动会话计数字段的对账任务
+            session_reconcile_job.start(AsyncSessionLocal)
         else:
             logger.error("数据库连接失败")
             raise Exception("数据库连接失败")
@@ -45,6 +69,9 @@ async def lifespan(app: FastAPI):
         init_model_service()
         logger.info("模型服务初始化完成")
         
+        # 后台预生成默认角色的开场白
+        greeting_cache.schedule_warm(DEFAULT_PROMPT, DEFAULT_VOICE_TYPE)
+        
     except Exception as e:
         logger.error(f"应用初始化失败: {e}")
         raise
@@ -53,6 +80,13 @@ async def lifespan(app: FastAPI):
     
     # 关闭时执行
     logger.info("应用关闭中...")
+    await greeting_cache.close()
+    await session_purge_job.close()
+    await content_backfill_job.close()
+    await session_archive_job.close()
+    await session_reconcile_job.close()
+    await turn_writer.close()
+    await history_write_behind.close()
     try:
         await close_db_connections()
         logger.info("数据库连接已关闭")
@@ -165,6 +199,21 @@ async def health():
         )
 
 
+@app.get("/health/indexes")
+async def health_indexes():
+    """索引检查端点：报告缺失与未使用的索引"""
+    try:
+        return await check_schema_indexes()
+    except Exception as e:
+        logger.error(f"索引检查失败: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "error": str(e)
+            }
+        )
+
+
 # 根路径
 @app.get("/")
 async def root():
@@ -0,0 +1,12 @@
+"""
+数据库迁移模块
+"""
+from .runner import Migration, migration_lock, run_migrations
+from .versions import MIGRATIONS, EXPECTED_INDEXES
+from .index_check import IndexReport, check_indexes
+from .id_storage import ensure_id_storage
+
+__all__ = [
+    "Migration", "migration_lock", "run_migrations", "MIGRATIONS", "EXPECTED_INDEXES",
+    "IndexReport", "check_indexes", "ensure_id_storage"
+]
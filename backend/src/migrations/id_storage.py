@@ -0,0 +1,193 @@
+"""
+主键存储格式转换（仅MySQL）
+DB_ID_BINARY 切换后，启动时（执行版本迁移之前）将各表的ID列在 VARCHAR(255) 与 BINARY(16) 之间转换：
+先删除引用会话ID的外键及包含ID列的索引，新增临时列并按 UUID 文本与字节的对应关系回填，
+再替换原列并重建主键、索引与外键。转换会重写整张表，应在维护窗口内执行
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .runner import create_index, drop_index, get_indexes, migration_lock
+
+logger = logging.getLogger(__name__)
+
+# 需要转换的ID列：(表名, 列名, 是否可为空)，主键在前；不存在的表或列（尚未执行对应迁移）跳过
+ID_COLUMNS: List[Tuple[str, str, bool]] = [
+    ("history_session", "id", False),
+    ("history_chat", "id", False),
+    ("history_chat", "session_id", False),
+    ("persona", "id", False),
+    ("history_session", "persona_id", True),
+]
+
+# 转换为 BINARY(16) 前校验ID均为标准 UUID 文本
+_UUID_PATTERN = "^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+
+
+async def column_is_binary(conn: AsyncConnection, table: str, column: str) -> Optional[bool]:
+    """
+    判断ID列当前是否以二进制存储
+
+    Args:
+        conn: 数据库连接
+        table: 表名
+        column: 列名
+
+    Returns:
+        Optional[bool]: 为 BINARY 类型时返回 True，表或列不存在时返回 None
+    """
+    def _get_type(sync_conn):
+        inspector = inspect(sync_conn)
+        if not inspector.has_table(table):
+            return None
+        return next((c["type"] for c in inspector.get_columns(table) if c["name"] == column), None)
+
+    column_type = await conn.run_sync(_get_type)
+    if column_type is None:
+        return None
+    return "BINARY" in str(column_type).upper()
+
+
+async def id_columns_binary(conn: AsyncConnection) -> bool:
+    """
+    判断ID列当前是否以二进制存储（以 history_session.id 为准，新增ID列时应使用相同类型）
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        bool: history_session.id 为 BINARY 类型时返回 True
+    """
+    return bool(await column_is_binary(conn, "history_session", "id"))
+
+
+def _to_binary_expression(column: str) -> str:
+    return f"UNHEX(REPLACE({column}, '-', ''))"
+
+
+def _to_text_expression(column: str) -> str:
+    hex_value = f"LOWER(HEX({column}))"
+    parts = [f"SUBSTR({hex_value}, {start}, {length})" for start, length in ((1, 8), (9, 4), (13, 4), (17, 4), (21, 12))]
+    return f"CONCAT_WS('-', {', '.join(parts)})"
+
+
+async def pending_id_columns(conn: AsyncConnection, binary: bool) -> List[Tuple[str, str, bool]]:
+    """
+    获取存储格式与目标不一致的ID列
+
+    Args:
+        conn: 数据库连接
+        binary: 目标格式是否为 BINARY(16)
+
+    Returns:
+        List: (表名, 列名, 是否可为空)
+    """
+    pending = []
+    for table, column, nullable in ID_COLUMNS:
+        current = await column_is_binary(conn, table, column)
+        if current is not None and current != binary:
+            pending.append((table, column, nullable))
+    return pending
+
+
+async def convert_id_storage(conn: AsyncConnection, binary: bool) -> None:
+    """
+    转换ID列的存储格式（只转换格式与目标不一致的列）
+
+    Args:
+        conn: 数据库连接（不能处于 engine.begin() 事务块中）
+        binary: True 转换为 BINARY(16)，False 转换回 VARCHAR(255)
+
+    Raises:
+        Exception: 存在无法转换为 UUID 的ID时抛出异常（此时未做任何修改）
+    """
+    preparer = conn.dialect.identifier_preparer
+    columns_to_convert = await pending_id_columns(conn, binary)
+    if binary:
+        for table, column, _ in columns_to_convert:
+            result = await conn.execute(text(
+                f"SELECT COUNT(*) FROM {preparer.quote(table)} WHERE {preparer.quote(column)} NOT REGEXP :pattern"
+            ), {"pattern": _UUID_PATTERN})
+            invalid = result.scalar()
+            if invalid:
+                raise Exception(f"{table}.{column} 中有 {invalid} 个ID不是 UUID，无法转换为 BINARY(16)")
+
+    # 删除引用会话ID的外键，转换完成后按原定义重建
+    foreign_keys: List[Dict[str, Any]] = await conn.run_sync(
+        lambda sync_conn: inspect(sync_conn).get_foreign_keys("history_chat")
+    )
+    for foreign_key in foreign_keys:
+        await conn.execute(text(
+            f"ALTER TABLE history_chat DROP FOREIGN KEY {preparer.quote(foreign_key['name'])}"
+        ))
+
+    column_type = "BINARY(16)" if binary else "VARCHAR(255) COLLATE utf8mb4_unicode_ci"
+    convert = _to_binary_expression if binary else _to_text_expression
+    for table, column, nullable in columns_to_convert:
+        quoted_table, quoted_column = preparer.quote(table), preparer.quote(column)
+        temp_column = preparer.quote(f"{column}__new")
+        logger.info(f"转换ID列: {table}.{column} -> {column_type}")
+
+        # 删除包含该列的二级索引（删除列时 MySQL 只会从索引中去掉该列，而不会删除索引）
+        indexes = {
+            name: columns for name, columns in (await get_indexes(conn, table)).items() if column in columns
+        }
+        for name in indexes:
+            await drop_index(conn, table, name)
+
+        await conn.execute(text(f"ALTER TABLE {quoted_table} ADD COLUMN {temp_column} {column_type} NULL"))
+        await conn.execute(text(f"UPDATE {quoted_table} SET {temp_column} = {convert(quoted_column)}"))
+        await conn.commit()
+        # 在同一条 ALTER 中替换原列，表在任何时刻都有主键
+        clauses = [
+            f"DROP COLUMN {quoted_column}",
+            f"CHANGE COLUMN {temp_column} {quoted_column} {column_type} {'NULL' if nullable else 'NOT NULL'}",
+        ]
+        if column == "id":
+            clauses = ["DROP PRIMARY KEY"] + clauses + [f"ADD PRIMARY KEY ({quoted_column})"]
+        await conn.execute(text(f"ALTER TABLE {quoted_table} {', '.join(clauses)}"))
+
+        # 重建索引，跳过作为其他索引前缀的冗余索引（如外键自动创建的单列索引）
+        for name, columns in indexes.items():
+            redundant = any(
+                other != name and other_columns[:len(columns)] == columns and len(other_columns) > len(columns)
+                for other, other_columns in indexes.items()
+            )
+            if not redundant:
+                await create_index(conn, table, name, columns)
+
+    for foreign_key in foreign_keys:
+        columns = ", ".join(preparer.quote(c) for c in foreign_key["constrained_columns"])
+        referred = ", ".join(preparer.quote(c) for c in foreign_key["referred_columns"])
+        on_delete = foreign_key.get("options", {}).get("ondelete")
+        await conn.execute(text(
+            f"ALTER TABLE history_chat ADD CONSTRAINT {preparer.quote(foreign_key['name'])} "
+            f"FOREIGN KEY ({columns}) REFERENCES {preparer.quote(foreign_key['referred_table'])} ({referred})"
+            + (f" ON DELETE {on_delete}" if on_delete else "")
+        ))
+    await conn.commit()
+    logger.info(f"ID列存储格式转换完成: {column_type}")
+
+
+async def ensure_id_storage(conn: AsyncConnection, binary: bool, lock_timeout: int = 60) -> bool:
+    """
+    使ID列的存储格式与配置一致（非MySQL数据库始终以字符串存储，直接返回）
+
+    Args:
+        conn: 数据库连接（不能处于 engine.begin() 事务块中）
+        binary: 是否以 BINARY(16) 存储
+        lock_timeout: 等待迁移锁的时间（秒）
+
+    Returns:
+        bool: 是否执行了转换
+    """
+    if conn.dialect.name != "mysql":
+        return False
+    async with migration_lock(conn, lock_timeout):
+        if not await pending_id_columns(conn, binary):
+            return False
+        await convert_id_storage(conn, binary)
+        return True
@@ -0,0 +1,82 @@
+"""
+索引检查
+对比迁移声明的索引与数据库中实际存在的索引，报告缺失的索引；
+MySQL 下再根据 performance_schema 的索引访问统计报告自上次重启以来从未使用过的索引
+"""
+import logging
+from typing import List
+
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.crud.search import FULLTEXT_INDEXES
+from .runner import get_indexes
+from .versions import EXPECTED_INDEXES
+
+logger = logging.getLogger(__name__)
+
+
+class IndexReport(BaseModel):
+    """索引检查结果"""
+    missing: List[str] = Field(default_factory=list, description="缺失或列不一致的索引（表名.索引名）")
+    unused: List[str] = Field(default_factory=list, description="从未被使用的索引（表名.索引名）")
+    unused_checked: bool = Field(False, description="是否检查了未使用的索引（需要MySQL performance_schema）")
+
+
+async def _find_unused_indexes(conn: AsyncConnection) -> List[str]:
+    """
+    查询自 MySQL 启动以来没有任何读写访问的索引（不含主键）
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        List[str]: 表名.索引名
+    """
+    result = await conn.execute(text(
+        "SELECT OBJECT_NAME, INDEX_NAME "
+        "FROM performance_schema.table_io_waits_summary_by_index_usage "
+        "WHERE OBJECT_SCHEMA = DATABASE() AND INDEX_NAME IS NOT NULL "
+        "AND INDEX_NAME <> 'PRIMARY' AND COUNT_STAR = 0 "
+        "ORDER BY OBJECT_NAME, INDEX_NAME"
+    ))
+    return [f"{table}.{index}" for table, index in result.fetchall()]
+
+
+async def check_indexes(conn: AsyncConnection) -> IndexReport:
+    """
+    检查缺失与未使用的索引
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        IndexReport: 检查结果
+    """
+    report = IndexReport()
+    is_mysql = conn.dialect.name == "mysql"
+
+    expected = {table: dict(indexes) for table, indexes in EXPECTED_INDEXES.items()}
+    if is_mysql:
+        for name, (table, column) in FULLTEXT_INDEXES.items():
+            expected.setdefault(table, {})[name] = [column]
+
+    for table, indexes in expected.items():
+        existing = await get_indexes(conn, table)
+        for name, columns in indexes.items():
+            if existing.get(name) != columns:
+                report.missing.append(f"{table}.{name}")
+
+    if is_mysql:
+        try:
+            report.unused = await _find_unused_indexes(conn)
+            report.unused_checked = True
+        except Exception as e:
+            logger.warning(f"无法读取索引使用统计（performance_schema 未启用？）: {e}")
+
+    if report.missing:
+        logger.warning(f"缺失的索引: {report.missing}")
+    if report.unused:
+        logger.info(f"自数据库启动以来未使用的索引: {report.unused}")
+    return report
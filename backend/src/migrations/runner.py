@@ -0,0 +1,208 @@
+"""
+数据库迁移执行器
+已应用的迁移版本记录在 schema_migrations 表中，启动时按版本号顺序执行尚未应用的迁移。
+MySQL 的 DDL 会隐式提交，迁移无法整体回滚，因此每个迁移都应写成可重复执行的（先检查再变更），
+执行成功后立即记录版本；中途失败时下次启动会从失败的迁移重新开始
+"""
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Sequence
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.model.base import get_current_time
+
+logger = logging.getLogger(__name__)
+
+# 迁移锁名称（MySQL GET_LOCK），避免多个实例同时启动时重复执行迁移
+_LOCK_NAME = "personatalk_schema_migrations"
+
+# 迁移版本表使用独立的 MetaData，不参与 SQLModel.metadata.create_all
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration:
+    """单个数据库迁移"""
+
+    def __init__(self, version: int, description: str, upgrade: Callable[[AsyncConnection], Awaitable[None]]):
+        """
+        Args:
+            version: 迁移版本号，必须唯一且递增
+            description: 迁移说明
+            upgrade: 执行迁移的协程函数
+        """
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+async def get_indexes(conn: AsyncConnection, table: str) -> Dict[str, List[str]]:
+    """
+    获取表上的索引（不含主键）
+
+    Args:
+        conn: 数据库连接
+        table: 表名
+
+    Returns:
+        Dict[str, List[str]]: 索引名 -> 索引列
+    """
+    indexes = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_indexes(table))
+    return {index["name"]: list(index["column_names"]) for index in indexes}
+
+
+async def create_index(conn: AsyncConnection, table: str, name: str, columns: Sequence[str]) -> None:
+    """
+    创建索引，同名索引已存在时跳过
+
+    Args:
+        conn: 数据库连接
+        table: 表名
+        name: 索引名
+        columns: 索引列（按顺序）
+    """
+    if name in await get_indexes(conn, table):
+        return
+    preparer = conn.dialect.identifier_preparer
+    column_list = ", ".join(preparer.quote(column) for column in columns)
+    logger.info(f"创建索引: {table}.{name} ({', '.join(columns)})")
+    await conn.execute(text(
+        f"CREATE INDEX {preparer.quote(name)} ON {preparer.quote(table)} ({column_list})"
+    ))
+
+
+async def drop_index(conn: AsyncConnection, table: str, name: str) -> None:
+    """
+    删除索引，索引不存在时跳过
+
+    Args:
+        conn: 数据库连接
+        table: 表名
+        name: 索引名
+    """
+    if name not in await get_indexes(conn, table):
+        return
+    preparer = conn.dialect.identifier_preparer
+    logger.info(f"删除索引: {table}.{name}")
+    if conn.dialect.name == "mysql":
+        await conn.execute(text(f"DROP INDEX {preparer.quote(name)} ON {preparer.quote(table)}"))
+    else:
+        await conn.execute(text(f"DROP INDEX {preparer.quote(name)}"))
+
+
+async def add_column(conn: AsyncConnection, table: str, name: str, definition: str) -> None:
+    """
+    添加列，列已存在时跳过
+
+    Args:
+        conn: 数据库连接
+        table: 表名
+        name: 列名
+        definition: 列定义（类型及约束）
+    """
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(table))
+    if name in {column["name"] for column in columns}:
+        return
+    preparer = conn.dialect.identifier_preparer
+    logger.info(f"添加列: {table}.{name} {definition}")
+    await conn.execute(text(
+        f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {preparer.quote(name)} {definition}"
+    ))
+
+
+async def get_applied_versions(conn: AsyncConnection) -> List[int]:
+    """
+    获取已应用的迁移版本
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        List[int]: 已应用的版本号（升序）
+    """
+    await conn.run_sync(schema_migrations.create, checkfirst=True)
+    result = await conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version))
+    versions = [row[0] for row in result.fetchall()]
+    await conn.commit()
+    return versions
+
+
+@asynccontextmanager
+async def migration_lock(conn: AsyncConnection, lock_timeout: int = 60) -> AsyncIterator[None]:
+    """
+    持有数据库迁移锁（仅MySQL，其他数据库直接执行），保证多实例启动时结构变更串行执行
+
+    Args:
+        conn: 数据库连接
+        lock_timeout: 等待迁移锁的时间（秒）
+
+    Raises:
+        Exception: 获取迁移锁超时时抛出异常
+    """
+    is_mysql = conn.dialect.name == "mysql"
+    if is_mysql:
+        result = await conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"), {"name": _LOCK_NAME, "timeout": lock_timeout}
+        )
+        if result.scalar() != 1:
+            raise Exception("获取数据库迁移锁超时")
+    try:
+        yield
+    finally:
+        if is_mysql:
+            await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _LOCK_NAME})
+
+
+async def run_migrations(
+    conn: AsyncConnection,
+    migrations: Sequence[Migration],
+    lock_timeout: int = 60
+) -> List[int]:
+    """
+    按版本号顺序执行尚未应用的迁移
+
+    Args:
+        conn: 数据库连接（不能处于 engine.begin() 事务块中，每个迁移完成后会单独提交）
+        migrations: 全部迁移
+        lock_timeout: 等待迁移锁的时间（秒，仅MySQL）
+
+    Returns:
+        List[int]: 本次执行的迁移版本号
+
+    Raises:
+        Exception: 迁移版本号重复、获取迁移锁超时或迁移执行失败时抛出异常
+    """
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise Exception(f"迁移版本号重复: {versions}")
+
+    executed: List[int] = []
+    async with migration_lock(conn, lock_timeout):
+        applied = set(await get_applied_versions(conn))
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+            logger.info(f"执行数据库迁移 {migration.version}: {migration.description}")
+            await migration.upgrade(conn)
+            await conn.execute(schema_migrations.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=get_current_time()
+            ))
+            # MySQL 的 DDL 已隐式提交，这里提交版本记录，保证已完成的迁移不会重复执行
+            await conn.commit()
+            executed.append(migration.version)
+        if executed:
+            logger.info(f"数据库迁移完成: {executed}")
+        else:
+            logger.info("数据库结构已是最新版本")
+        return executed
@@ -0,0 +1,148 @@
+"""
+数据库迁移列表
+新增迁移时追加到 MIGRATIONS 末尾并使用递增的版本号，已发布的迁移不要再修改；
+迁移新增或删除的索引需要同步到 EXPECTED_INDEXES，表结构变更需要同步到 deploy/db/init.sql
+"""
+from typing import Dict, List
+
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.crud.persona import build_persona, insert_ignore
+from src.crud.search import ensure_fulltext_indexes
+from src.model.history_session import HistorySession
+from src.model.persona import Persona
+from .id_storage import id_columns_binary
+from .runner import Migration, add_column, create_index, drop_index
+
+# 回填角色引用时每批处理的会话数
+PERSONA_BACKFILL_BATCH_SIZE = 1000
+
+# 热点查询依赖的普通索引：表名 -> {索引名: 索引列}
+EXPECTED_INDEXES: Dict[str, Dict[str, List[str]]] = {
+    "history_chat": {
+        # 按会话加载历史记录并按时间排序（InnoDB 二级索引隐含主键 id，覆盖 (created_at, id) 游标排序）
+        "idx_chat_session_created": ["session_id", "created_at"],
+    },
+    "history_session": {
+        # 按用户分页查询未删除的会话并按时间排序
+        "idx_session_user_deleted_created": ["username", "is_deleted", "created_at"],
+        # 后台清理任务按软删除时间查找过期会话
+        "idx_session_deleted_at": ["is_deleted", "deleted_at"],
+        # 按最近活跃时间排序的会话列表
+        "idx_session_user_deleted_active": ["username", "is_deleted", "last_message_at"],
+    },
+}
+
+
+async def _add_composite_indexes(conn: AsyncConnection) -> None:
+    """为历史记录加载与会话列表查询添加复合索引"""
+    await create_index(conn, "history_chat", "idx_chat_session_created", ["session_id", "created_at"])
+    await create_index(
+        conn, "history_session", "idx_session_user_deleted_created", ["username", "is_deleted", "created_at"]
+    )
+    await create_index(conn, "history_session", "idx_session_deleted_updated", ["is_deleted", "updated_at"])
+
+
+async def _drop_single_column_indexes(conn: AsyncConnection) -> None:
+    """删除已被复合索引前缀覆盖的单列索引（外键 session_id 由复合索引支撑）"""
+    await drop_index(conn, "history_chat", "idx_session_id")
+    await drop_index(conn, "history_session", "idx_username")
+    await drop_index(conn, "history_session", "idx_is_deleted")
+
+
+async def _add_fulltext_indexes(conn: AsyncConnection) -> None:
+    """添加会话名称与聊天内容的 FULLTEXT(ngram) 索引（仅MySQL）"""
+    await ensure_fulltext_indexes(conn)
+
+
+async def _add_content_compression_columns(conn: AsyncConnection) -> None:
+    """添加超长聊天内容的压缩存储列"""
+    blob_type = "MEDIUMBLOB" if conn.dialect.name == "mysql" else "BLOB"
+    await add_column(conn, "history_chat", "content_blob", f"{blob_type} NULL")
+    await add_column(conn, "history_chat", "content_codec", "VARCHAR(8) NOT NULL DEFAULT ''")
+
+
+async def _add_archive_key_column(conn: AsyncConnection) -> None:
+    """添加会话的冷数据归档键列"""
+    await add_column(conn, "history_session", "archive_key", "VARCHAR(255) NULL")
+
+
+async def _add_session_counter_columns(conn: AsyncConnection) -> None:
+    """添加会话的冗余计数字段与最近活跃索引（计数由后台对账任务回填）"""
+    await add_column(conn, "history_session", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    await add_column(conn, "history_session", "last_message_at", "DATETIME NULL")
+    await add_column(conn, "history_session", "last_message_preview", "VARCHAR(200) NOT NULL DEFAULT ''")
+    await add_column(conn, "history_session", "prompt_tokens", "BIGINT NOT NULL DEFAULT 0")
+    await add_column(conn, "history_session", "completion_tokens", "BIGINT NOT NULL DEFAULT 0")
+    await conn.execute(text(
+        "UPDATE history_session SET last_message_at = created_at WHERE last_message_at IS NULL"
+    ))
+    await create_index(
+        conn, "history_session", "idx_session_user_deleted_active", ["username", "is_deleted", "last_message_at"]
+    )
+
+
+async def _add_deleted_at_column(conn: AsyncConnection) -> None:
+    """
+    添加会话的软删除时间列，已删除的会话以 updated_at 回填，
+    清理任务改用 (is_deleted, deleted_at) 索引（updated_at 会随会话的任何修改变化）
+    """
+    await add_column(conn, "history_session", "deleted_at", "DATETIME NULL")
+    await conn.execute(text(
+        "UPDATE history_session SET deleted_at = updated_at WHERE is_deleted = 1 AND deleted_at IS NULL"
+    ))
+    await create_index(conn, "history_session", "idx_session_deleted_at", ["is_deleted", "deleted_at"])
+    await drop_index(conn, "history_session", "idx_session_deleted_updated")
+
+
+async def _add_persona_catalog(conn: AsyncConnection) -> None:
+    """
+    创建角色表并将会话中重复保存的提示词与音色改为引用角色：
+    按主键分批扫描尚未引用角色的会话，在应用层计算角色ID（避免按 TEXT 列比较，且不受排序规则大小写影响），
+    写入角色后将会话行中的两列清空，每批单独提交
+    """
+    await conn.run_sync(Persona.__table__.create, checkfirst=True)
+    id_type = "BINARY(16)" if conn.dialect.name == "mysql" and await id_columns_binary(conn) else "VARCHAR(255)"
+    await add_column(conn, "history_session", "persona_id", f"{id_type} NULL")
+    await conn.commit()
+
+    session_table = HistorySession.__table__
+    last_id = ""
+    while True:
+        result = await conn.execute(
+            select(session_table.c.id, session_table.c.system_prompt, session_table.c.voice_type)
+            .where(session_table.c.persona_id.is_(None), session_table.c.id > last_id)
+            .order_by(session_table.c.id)
+            .limit(PERSONA_BACKFILL_BATCH_SIZE)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        session_ids_by_persona: Dict[str, List[str]] = {}
+        for session_id, system_prompt, voice_type in rows:
+            persona = build_persona(system_prompt, voice_type)
+            if persona.id not in session_ids_by_persona:
+                await conn.execute(insert_ignore(persona))
+                session_ids_by_persona[persona.id] = []
+            session_ids_by_persona[persona.id].append(session_id)
+        for persona_id, session_ids in session_ids_by_persona.items():
+            await conn.execute(
+                update(session_table)
+                .where(session_table.c.id.in_(session_ids))
+                .values(persona_id=persona_id, system_prompt="", voice_type="")
+            )
+        await conn.commit()
+        last_id = rows[-1][0]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "添加 history_chat 与 history_session 的复合索引", _add_composite_indexes),
+    Migration(2, "删除被复合索引覆盖的单列索引", _drop_single_column_indexes),
+    Migration(3, "添加全文检索索引", _add_fulltext_indexes),
+    Migration(4, "添加聊天内容压缩存储列", _add_content_compression_columns),
+    Migration(5, "添加会话归档键列", _add_archive_key_column),
+    Migration(6, "添加会话计数字段与最近活跃索引", _add_session_counter_columns),
+    Migration(7, "创建角色表并回填会话的角色引用", _add_persona_catalog),
+    Migration(8, "添加会话软删除时间列", _add_deleted_at_column),
+]
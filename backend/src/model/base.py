@@ -1,17 +1,19 @@
-import uuid
 from datetime import datetime
 from sqlmodel import Field
 
+from .ids import id_column_type, new_id
+
 def get_current_time():
     """获取当前时间（东八区）"""
     return datetime.now()
 
 
 class IDMixin:
-    """ID字段Mixin"""
+    """ID字段Mixin（按时间递增的 UUID 字符串，见 ids 模块）"""
     id: str = Field(
-        default_factory=lambda: str(uuid.uuid4()),
+        default_factory=new_id,
         primary_key=True,
+        sa_type=id_column_type(),
         description="唯一标识符"
     )
 
@@ -1,6 +1,9 @@
 from enum import Enum
+from typing import Optional
+from sqlalchemy import Column, LargeBinary
 from sqlmodel import SQLModel, Field
 from .base import BaseModelMixin
+from .ids import id_column_type
 
 
 class ChatRole(str, Enum):
@@ -17,12 +20,20 @@ class HistoryChat(SQLModel, BaseModelMixin, table=True):
     - id: 聊天记录唯一标识符
     - session_id: 会话ID，关联到HistorySession
     - role: 角色（用户或大模型）
-    - content: 对话内容
+    - content: 对话内容（超长内容压缩存入 content_blob，此时该列只保留明文前缀供全文检索，读取时由 CRUD 层透明解压）
+    - content_blob: 压缩后的对话内容
+    - content_codec: 内容编码，空字符串表示明文存于 content
     - created_at: 创建时间
     - updated_at: 更新时间
     """
     __tablename__ = "history_chat"
     
-    session_id: str = Field(description="会话ID，关联到HistorySession")
+    session_id: str = Field(sa_type=id_column_type(), description="会话ID，关联到HistorySession")
     role: ChatRole = Field(description="角色（用户或大模型）")
     content: str = Field(default="", description="对话内容")
+    content_blob: Optional[bytes] = Field(
+        default=None,
+        sa_column=Column(LargeBinary(16 * 1024 * 1024 - 1), nullable=True),  # MySQL 下为 MEDIUMBLOB
+        description="压缩后的对话内容"
+    )
+    content_codec: str = Field(default="", max_length=8, description="内容编码：空为明文，zlib/zstd 为压缩")
@@ -1,5 +1,8 @@
+from datetime import datetime
+from typing import Optional
 from sqlmodel import SQLModel, Field
-from .base import BaseModelMixin
+from .base import BaseModelMixin, get_current_time
+from .ids import id_column_type
 
 DEFAULT_PROMPT = """
 你现在需要完全扮演用户自定义的角色：Harry Potter。
@@ -10,6 +13,8 @@ DEFAULT_PROMPT = """
         5. 核心要求：严格按上述设定回复，不偏离角色，不暴露AI身份，用角色的视角与用户聊天，在没有特别表明的情况下需要讲中文。
 """
 
+DEFAULT_VOICE_TYPE = "qiniu_zh_female_wwxkjx"
+
 class HistorySession(SQLModel, BaseModelMixin, table=True):
     """
     历史聊天会话数据库表模型
@@ -21,11 +26,25 @@ class HistorySession(SQLModel, BaseModelMixin, table=True):
     - username: 用户名
     - session_name: 会话名称
     - is_deleted: 状态（是否删除）
+    - deleted_at: 软删除时间，后台清理任务据此判断是否超过保留期
+    - persona_id: 引用的角色ID；不为空时提示词与音色保存在 persona 表中，本表的 system_prompt、voice_type 列为空，
+      读取时由 CRUD 层填充（为空的是迁移前的旧会话，仍使用本表中的提示词与音色）
+    - archive_key: 聊天记录归档文件的键（冷数据归档后 history_chat 中不再保留该会话的记录）
+    - message_count / last_message_at / last_message_preview / prompt_tokens / completion_tokens:
+      冗余的计数字段，与聊天记录在同一事务中增量维护，由后台对账任务校正
     """
     __tablename__ = "history_session"
     
     username: str = Field(default="", max_length=100, description="用户名")
     session_name: str = Field(default="", max_length=200, description="会话名称")
     is_deleted: bool = Field(default=False, description="状态（是否删除）")
+    deleted_at: Optional[datetime] = Field(default=None, description="软删除时间，为空表示未删除")
     system_prompt: str = Field(default=DEFAULT_PROMPT, description="当前角色的提示词")
-    voice_type: str = Field(default="qiniu_zh_female_wwxkjx", description="当前角色的音色类型：温婉学科讲师")
\ No newline at end of file
+    voice_type: str = Field(default=DEFAULT_VOICE_TYPE, description="当前角色的音色类型：温婉学科讲师")
+    persona_id: Optional[str] = Field(default=None, sa_type=id_column_type(), description="引用的角色ID")
+    archive_key: Optional[str] = Field(default=None, max_length=255, description="聊天记录归档文件的键，为空表示未归档")
+    message_count: int = Field(default=0, description="消息数")
+    last_message_at: datetime = Field(default_factory=get_current_time, description="最后一条消息的时间（没有消息时为创建时间）")
+    last_message_preview: str = Field(default="", max_length=200, description="最后一条消息的预览")
+    prompt_tokens: int = Field(default=0, description="累计输入 token 数")
+    completion_tokens: int = Field(default=0, description="累计输出 token 数")
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+主键生成与存储
+默认使用按时间递增的 UUIDv7（RFC 9562）作为主键，新行总是追加在聚簇索引末尾，
+避免随机 UUIDv4 导致的页分裂与缓冲池失效；对外仍是 36 位的 UUID 字符串。
+MySQL 下可选以 BINARY(16) 存储（DB_ID_BINARY），主键及所有二级索引的体积约为 VARCHAR 的一半
+"""
+import time
+import uuid
+import secrets
+import threading
+from typing import Any, Optional
+
+from sqlalchemy.types import BINARY, String, TypeDecorator
+
+from src.config import settings
+
+# rand_a 计数器的位数与最大值
+_COUNTER_BITS = 12
+_COUNTER_MAX = (1 << _COUNTER_BITS) - 1
+
+
+class UUID7Generator:
+    """单调递增的 UUIDv7 生成器（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def __call__(self) -> str:
+        """
+        生成 UUIDv7：48 位毫秒时间戳 + 12 位计数器 + 62 位随机数；
+        同一毫秒内计数器递增，保证同一进程生成的ID严格递增
+
+        Returns:
+            str: UUID 字符串
+        """
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                # 计数器起点随机但留出递增空间
+                self._counter = secrets.randbits(_COUNTER_BITS - 1)
+            else:
+                # 同一毫秒内（或系统时钟回拨）继续递增，计数器用尽时借用下一毫秒
+                self._counter += 1
+                if self._counter > _COUNTER_MAX:
+                    self._last_ms += 1
+                    self._counter = 0
+            timestamp_ms, counter = self._last_ms, self._counter
+        value = (
+            (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+            | 0x7 << 76
+            | counter << 64
+            | 0b10 << 62
+            | secrets.randbits(62)
+        )
+        return str(uuid.UUID(int=value))
+
+
+# 全局 UUIDv7 生成器
+uuid7 = UUID7Generator()
+
+
+def new_id() -> str:
+    """
+    按 DB_ID_FORMAT 配置生成新的主键
+
+    Returns:
+        str: UUID 字符串
+    """
+    if settings.DB_ID_FORMAT == "uuid4":
+        return str(uuid.uuid4())
+    return uuid7()
+
+
+class IdType(TypeDecorator):
+    """
+    主键列类型：应用层始终使用 UUID 字符串；binary=True 且为 MySQL 时以 BINARY(16) 存储，
+    其他情况（及 SQLite 等数据库）以 VARCHAR(255) 存储
+    """
+    impl = String(255)
+    cache_ok = True
+
+    def __init__(self, binary: bool = False):
+        """
+        Args:
+            binary: 是否以 BINARY(16) 存储（仅 MySQL）
+        """
+        super().__init__()
+        self.binary = binary
+
+    def _is_binary(self, dialect: Any) -> bool:
+        return self.binary and dialect.name == "mysql"
+
+    def load_dialect_impl(self, dialect: Any) -> Any:
+        if self._is_binary(dialect):
+            return dialect.type_descriptor(BINARY(16))
+        return dialect.type_descriptor(String(255))
+
+    def process_bind_param(self, value: Optional[str], dialect: Any) -> Any:
+        if value is None or not self._is_binary(dialect):
+            return value
+        # 空字符串用作按ID分批扫描的起点，对应排在所有ID之前的空字节串
+        return uuid.UUID(value).bytes if value else b""
+
+    def process_result_value(self, value: Any, dialect: Any) -> Optional[str]:
+        if value is None or not self._is_binary(dialect):
+            return value
+        return str(uuid.UUID(bytes=bytes(value)))
+
+
+def id_column_type() -> IdType:
+    """按 DB_ID_BINARY 配置创建主键列类型（用于主键及引用主键的列）"""
+    return IdType(binary=settings.DB_ID_BINARY)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Text
+from sqlmodel import SQLModel, Field
+from .base import BaseModelMixin
+
+
+class Persona(SQLModel, BaseModelMixin, table=True):
+    """
+    角色（人设）数据库表模型，每种不同的提示词与音色组合只保存一份
+
+    字段说明:
+    - id: 由提示词与音色内容计算的 UUIDv5（内容寻址，相同内容总是得到相同ID）
+    - name: 角色名称（从提示词中提取，用于会话列表展示）
+    - system_prompt: 角色提示词
+    - voice_type: 音色类型
+    - created_at: 创建时间
+    - updated_at: 更新时间
+
+    角色内容不可修改，会话修改提示词或音色时改为引用新的角色
+    """
+    __tablename__ = "persona"
+
+    name: str = Field(default="", max_length=100, description="角色名称")
+    system_prompt: str = Field(default="", sa_column=Column(Text, nullable=False), description="角色提示词")
+    voice_type: str = Field(default="", max_length=255, description="音色类型")
@@ -0,0 +1,317 @@
+"""
+音频拼接工具
+用于将分段合成的音频按顺序拼接为一个完整的音频
+- mp3: 按帧拼接，去除每段的 ID3 标签与 Xing/Info/VBRI 头帧
+- wav: 解析 RIFF 结构，合并 data 块并重写头部长度
+- pcm: 原始采样直接拼接
+- ogg_opus: 按页拼接为链式 Ogg 流，重写每段的流序列号与 CRC
+"""
+import struct
+from typing import Iterator, List, Tuple
+
+
+# MPEG 音频比特率表（kbps），索引为 (版本, 层)
+_MP3_BITRATES = {
+    # MPEG-1
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    # MPEG-2 / MPEG-2.5
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# 采样率表（Hz），索引为 MPEG 版本
+_MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    25: [11025, 12000, 8000],
+}
+
+
+def _strip_id3(data: bytes) -> bytes:
+    """
+    去除 mp3 数据首部的 ID3v2 标签和尾部的 ID3v1 标签
+
+    Args:
+        data: mp3 原始数据
+
+    Returns:
+        bytes: 去除标签后的数据
+    """
+    while len(data) >= 10 and data[:3] == b"ID3":
+        flags = data[5]
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        size += 10
+        if flags & 0x10:
+            # 存在 ID3v2 footer
+            size += 10
+        data = data[size:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def _parse_mp3_header(data: bytes, offset: int) -> Tuple[int, int, int, int]:
+    """
+    解析 mp3 帧头
+
+    Args:
+        data: mp3 数据
+        offset: 帧头偏移
+
+    Returns:
+        Tuple[int, int, int, int]: (帧长度, MPEG版本, 声道模式, 层)，帧头无效时帧长度为 0
+    """
+    if offset + 4 > len(data):
+        return 0, 0, 0, 0
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return 0, 0, 0, 0
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+
+    if version_bits == 0x01 or layer_bits == 0x00:
+        return 0, 0, 0, 0
+    if bitrate_index in (0x00, 0x0F) or sample_rate_index == 0x03:
+        # 不支持 free format
+        return 0, 0, 0, 0
+
+    version = {0x03: 1, 0x02: 2, 0x00: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        length = 144 * bitrate // sample_rate + padding
+    return length, version, channel_mode, layer
+
+
+def _iter_mp3_frames(data: bytes) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    遍历 mp3 数据中的音频帧
+
+    Args:
+        data: 去除标签后的 mp3 数据
+
+    Yields:
+        Tuple[int, int, int, int]: (帧偏移, 帧长度, MPEG版本, 声道模式)
+    """
+    offset = 0
+    while offset + 4 <= len(data):
+        length, version, channel_mode, _ = _parse_mp3_header(data, offset)
+        if length <= 4 or offset + length > len(data):
+            # 非帧头或末尾残缺帧，逐字节重新同步
+            offset += 1
+            continue
+        yield offset, length, version, channel_mode
+        offset += length
+
+
+def _is_vbr_info_frame(frame: bytes, version: int, channel_mode: int) -> bool:
+    """
+    判断帧是否为 Xing/Info/VBRI 信息帧（只描述单段音频，拼接后会失效）
+
+    Args:
+        frame: 帧数据
+        version: MPEG版本
+        channel_mode: 声道模式
+
+    Returns:
+        bool: 是否为信息帧
+    """
+    mono = channel_mode == 0x03
+    if version == 1:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    tag = frame[4 + side_info:8 + side_info]
+    return tag in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+
+def concat_mp3(parts: List[bytes]) -> bytes:
+    """
+    按帧拼接多段 mp3 音频
+
+    Args:
+        parts: 各分段的 mp3 数据
+
+    Returns:
+        bytes: 拼接后的 mp3 数据
+    """
+    frames: List[bytes] = []
+    for part in parts:
+        data = _strip_id3(part)
+        for offset, length, version, channel_mode in _iter_mp3_frames(data):
+            frame = data[offset:offset + length]
+            if _is_vbr_info_frame(frame, version, channel_mode):
+                continue
+            frames.append(frame)
+    return b"".join(frames)
+
+
+def _iter_riff_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    遍历 wav 文件中的 RIFF 子块
+
+    Args:
+        data: wav 数据
+
+    Yields:
+        Tuple[bytes, bytes]: (块ID, 块内容)
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("无效的 wav 数据")
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        start = offset + 8
+        if chunk_id == b"data" and (chunk_size == 0xFFFFFFFF or start + chunk_size > len(data)):
+            # 流式 wav 的 data 块长度未知，取到文件末尾
+            chunk_size = len(data) - start
+        yield chunk_id, data[start:start + chunk_size]
+        offset = start + chunk_size + (chunk_size & 1)
+
+
+def concat_wav(parts: List[bytes]) -> bytes:
+    """
+    拼接多段 wav 音频，要求各段 fmt 一致
+
+    Args:
+        parts: 各分段的 wav 数据
+
+    Returns:
+        bytes: 拼接后的 wav 数据
+    """
+    fmt_chunk = b""
+    samples: List[bytes] = []
+    for part in parts:
+        chunks = dict(_iter_riff_chunks(part))
+        if b"fmt " not in chunks or b"data" not in chunks:
+            raise ValueError("wav 数据缺少 fmt 或 data 块")
+        if fmt_chunk and chunks[b"fmt "] != fmt_chunk:
+            raise ValueError("分段 wav 的音频格式不一致，无法拼接")
+        fmt_chunk = chunks[b"fmt "]
+        samples.append(chunks[b"data"])
+
+    data = b"".join(samples)
+    fmt_block = b"fmt " + struct.pack("<I", len(fmt_chunk)) + fmt_chunk
+    if len(fmt_chunk) & 1:
+        fmt_block += b"\x00"
+    data_block = b"data" + struct.pack("<I", len(data)) + data
+    body = b"WAVE" + fmt_block + data_block
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _ogg_crc_table() -> List[int]:
+    """生成 Ogg 页校验使用的 CRC32 表（多项式 0x04C11DB7，非反射）"""
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def _ogg_crc(page: bytes) -> int:
+    """计算 Ogg 页的 CRC 校验值"""
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def _iter_ogg_pages(data: bytes) -> Iterator[bytearray]:
+    """
+    遍历 Ogg 数据中的页
+
+    Args:
+        data: Ogg 数据
+
+    Yields:
+        bytearray: 单个页的数据
+    """
+    offset = 0
+    while offset + 27 <= len(data):
+        if data[offset:offset + 4] != b"OggS":
+            raise ValueError("无效的 Ogg 数据")
+        segments = data[offset + 26]
+        header_size = 27 + segments
+        body_size = sum(data[offset + 27:offset + header_size])
+        yield bytearray(data[offset:offset + header_size + body_size])
+        offset += header_size + body_size
+
+
+def concat_ogg(parts: List[bytes]) -> bytes:
+    """
+    将多段 Ogg 音频拼接为链式 Ogg 流
+
+    链式流要求各逻辑流的序列号互不相同，因此每段的序列号会被重写并重新计算页校验值
+
+    Args:
+        parts: 各分段的 Ogg 数据
+
+    Returns:
+        bytes: 拼接后的 Ogg 数据
+    """
+    pages: List[bytes] = []
+    used_serials = set()
+    for part in parts:
+        serial_map = {}
+        for page in _iter_ogg_pages(part):
+            serial = struct.unpack("<I", page[14:18])[0]
+            if serial not in serial_map:
+                new_serial = serial
+                while new_serial in used_serials:
+                    new_serial = (new_serial + 1) & 0xFFFFFFFF
+                used_serials.add(new_serial)
+                serial_map[serial] = new_serial
+            page[14:18] = struct.pack("<I", serial_map[serial])
+            page[22:26] = b"\x00\x00\x00\x00"
+            page[22:26] = struct.pack("<I", _ogg_crc(bytes(page)))
+            pages.append(bytes(page))
+    return b"".join(pages)
+
+
+def concat_audio(parts: List[bytes], encoding: str) -> bytes:
+    """
+    按编码格式拼接多段音频
+
+    Args:
+        parts: 各分段的音频数据（按播放顺序）
+        encoding: 音频编码格式（mp3、wav、pcm、ogg_opus）
+
+    Returns:
+        bytes: 拼接后的音频数据
+
+    Raises:
+        ValueError: 不支持的编码格式或音频数据无效
+    """
+    if len(parts) == 1:
+        return parts[0]
+
+    encoding = (encoding or "").lower()
+    if encoding == "mp3":
+        return concat_mp3(parts)
+    if encoding == "wav":
+        return concat_wav(parts)
+    if encoding == "pcm":
+        return b"".join(parts)
+    if encoding in ("ogg_opus", "ogg", "opus"):
+        return concat_ogg(parts)
+    raise ValueError(f"不支持拼接的音频编码格式: {encoding}")
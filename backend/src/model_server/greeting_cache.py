@@ -0,0 +1,250 @@
+"""
+角色开场白预生成缓存
+为每个不同的“角色提示词 + 音色”组合预先生成开场回复及其语音，
+会话首轮用户发送问候语时直接返回，避免首轮同时等待大模型与TTS。
+缓存按规范化后的问候语区分（“你好”与“hello”的回复不同），预生成只针对配置的问候语，
+其他问候语在首轮实时生成后写入缓存
+"""
+import re
+import time
+import asyncio
+import hashlib
+import functools
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from src.config import settings
+from src.model_server.base import ChatMessage, ChatRequest
+from src.model_server.factory import model_service_manager
+from src.model_server.tts_service import tts_service, TTSRequest
+
+logger = logging.getLogger(__name__)
+
+# 判断问候语时忽略的标点与空白
+_GREETING_STRIP_PATTERN = re.compile(r"[\s\.,!?。，！？~～…、]+")
+
+
+class GreetingEntry(BaseModel):
+    """开场白缓存条目"""
+    prompt_hash: str = Field(description="角色提示词的哈希值")
+    voice_type: str = Field(description="音色类型")
+    greeting: str = Field(description="规范化后的用户问候语")
+    reply: str = Field(description="开场回复文本")
+    audio_data: Optional[str] = Field(None, description="开场回复的语音数据（base64编码）")
+    created_at: float = Field(default_factory=time.time, description="生成时间戳")
+
+
+class PersonaGreetingCache:
+    """角色开场白预生成缓存"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: int = 3600,
+        max_entries: int = 256,
+        greeting_message: str = "你好",
+        greeting_patterns: Iterable[str] = ()
+    ):
+        """
+        初始化开场白缓存
+
+        Args:
+            enabled: 是否启用
+            ttl: 缓存条目的刷新间隔（秒）
+            max_entries: 最多缓存的条目数，超出后淘汰最久未使用的条目
+            greeting_message: 预生成时使用的用户问候语
+            greeting_patterns: 视为问候语的用户消息
+        """
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.greeting_message = greeting_message
+        self.greeting_patterns = {self._normalize(p) for p in greeting_patterns}
+        self._entries: "OrderedDict[Tuple[str, str, str], GreetingEntry]" = OrderedDict()
+        self._tasks: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        """规范化用户消息，用于问候语匹配"""
+        return _GREETING_STRIP_PATTERN.sub("", message or "").lower()
+
+    @staticmethod
+    def prompt_hash(system_prompt: str) -> str:
+        """
+        计算角色提示词的哈希值，提示词任何修改都会得到新的缓存键
+
+        Args:
+            system_prompt: 角色提示词
+
+        Returns:
+            str: 提示词的 SHA-256 十六进制摘要
+        """
+        return hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()
+
+    def _key(self, system_prompt: str, voice_type: str, message: Optional[str]) -> Tuple[str, str, str]:
+        greeting = self._normalize(self.greeting_message if message is None else message)
+        return self.prompt_hash(system_prompt), voice_type or "", greeting
+
+    def is_greeting(self, message: str) -> bool:
+        """
+        判断用户消息是否为问候语
+
+        Args:
+            message: 用户消息
+
+        Returns:
+            bool: 是否为问候语
+        """
+        return self._normalize(message) in self.greeting_patterns
+
+    def get(self, system_prompt: str, voice_type: str, message: Optional[str] = None) -> Optional[GreetingEntry]:
+        """
+        获取开场白，条目过期时在后台刷新（本次仍返回旧条目）
+
+        Args:
+            system_prompt: 角色提示词
+            voice_type: 音色类型
+            message: 用户问候语，为 None 时为预生成使用的问候语
+
+        Returns:
+            Optional[GreetingEntry]: 缓存条目，未命中时返回 None
+        """
+        if not self.enabled:
+            return None
+        key = self._key(system_prompt, voice_type, message)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        if time.time() - entry.created_at > self.ttl:
+            self.schedule_warm(system_prompt, voice_type, message)
+        return entry
+
+    def put(
+        self,
+        system_prompt: str,
+        voice_type: str,
+        reply: str,
+        audio_data: Optional[str] = None,
+        message: Optional[str] = None
+    ) -> GreetingEntry:
+        """
+        写入开场白缓存（如首轮实时生成的问候回复）
+
+        Args:
+            system_prompt: 角色提示词
+            voice_type: 音色类型
+            reply: 开场回复文本
+            audio_data: 开场回复的语音数据
+            message: 用户问候语，为 None 时为预生成使用的问候语
+
+        Returns:
+            GreetingEntry: 写入的缓存条目
+        """
+        key = self._key(system_prompt, voice_type, message)
+        entry = GreetingEntry(
+            prompt_hash=key[0],
+            voice_type=key[1],
+            greeting=key[2],
+            reply=reply,
+            audio_data=audio_data
+        )
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def schedule_warm(self, system_prompt: str, voice_type: str, message: Optional[str] = None) -> None:
+        """
+        在后台预生成开场白，已有未过期条目时跳过，同一组合同时只会有一个生成任务
+
+        Args:
+            system_prompt: 角色提示词
+            voice_type: 音色类型
+            message: 用户问候语，为 None 时为预生成使用的问候语
+        """
+        if not self.enabled:
+            return
+        key = self._key(system_prompt, voice_type, message)
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.created_at <= self.ttl:
+            return
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self._warm(system_prompt, voice_type, message))
+        self._tasks[key] = task
+        task.add_done_callback(functools.partial(self._on_task_done, key))
+
+    def _on_task_done(self, key: Tuple[str, str, str], task: asyncio.Task) -> None:
+        """预生成任务结束后移除任务记录"""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def _warm(self, system_prompt: str, voice_type: str, message: Optional[str]) -> Optional[GreetingEntry]:
+        """后台任务入口，异常只记录日志"""
+        try:
+            return await self.warm(system_prompt, voice_type, message)
+        except Exception as e:
+            logger.warning(f"开场白预生成失败: {e}")
+            return None
+
+    async def warm(self, system_prompt: str, voice_type: str, message: Optional[str] = None) -> GreetingEntry:
+        """
+        生成开场回复及其语音并写入缓存
+
+        Args:
+            system_prompt: 角色提示词
+            voice_type: 音色类型
+            message: 用户问候语，为 None 时为预生成使用的问候语
+
+        Returns:
+            GreetingEntry: 生成的缓存条目
+
+        Raises:
+            Exception: 大模型请求失败时抛出异常（TTS失败时只缓存文本）
+        """
+        messages = []
+        if system_prompt:
+            messages.append(ChatMessage(role="system", content=system_prompt))
+        messages.append(ChatMessage(role="user", content=self.greeting_message if message is None else message))
+        response = await model_service_manager.get_service().chat_completion(
+            ChatRequest(messages=messages, temperature=0.7, max_tokens=4096)
+        )
+        reply = response.choices[0]['message']['content']
+
+        audio_data = None
+        speakable = tts_service.normalize_text(reply)
+        if voice_type and speakable.text:
+            try:
+                tts_response = await tts_service.text_to_speech(
+                    TTSRequest.create_simple(text=speakable.text, voice_type=voice_type)
+                )
+                audio_data = tts_response.data
+            except Exception as e:
+                logger.warning(f"开场白语音合成失败: {e}")
+
+        entry = self.put(system_prompt, voice_type, reply, audio_data, message)
+        logger.info(f"开场白预生成完成: {entry.prompt_hash[:12]} / {entry.voice_type} / {entry.greeting}")
+        return entry
+
+    async def close(self) -> None:
+        """取消所有进行中的预生成任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# 全局开场白缓存实例
+greeting_cache = PersonaGreetingCache(
+    enabled=settings.GREETING_CACHE_ENABLED,
+    ttl=settings.GREETING_CACHE_TTL,
+    max_entries=settings.GREETING_CACHE_MAX_ENTRIES,
+    greeting_message=settings.GREETING_MESSAGE,
+    greeting_patterns=settings.GREETING_PATTERNS
+)
@@ -1,9 +1,445 @@
 
+import re
+import time
+import base64
+import random
 import aiohttp
 import asyncio
 from typing import List, Dict, Any, Optional, AsyncGenerator
 from pydantic import BaseModel, Field
 from src.model_server.base import BaseModelService, ChatRequest, ChatResponse, StreamResponse
+from src.model_server.audio_concat import concat_audio
+
+
+# 句末标点（切分后保留在句尾）
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？!?；;…\n])|(?<=\.)(?=\s)")
+# 句内停顿标点，句子过长时作为次级切分点
+_CLAUSE_END_PATTERN = re.compile(r"(?<=[，,、：:])")
+
+
+def _pack_pieces(pieces: List[str], max_chars: int) -> List[str]:
+    """
+    将切分后的片段按顺序合并为不超过 max_chars 的分段
+
+    Args:
+        pieces: 片段列表
+        max_chars: 分段最大字符数
+
+    Returns:
+        List[str]: 分段列表
+    """
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_text_for_tts(text: str, max_chars: int) -> List[str]:
+    """
+    按句子边界将长文本切分为不超过 max_chars 的分段
+    优先在句末标点处切分，单句过长时退化到逗号等停顿处，仍过长时按长度硬切
+
+    Args:
+        text: 待切分的文本
+        max_chars: 单个分段的最大字符数
+
+    Returns:
+        List[str]: 按原文顺序排列的分段列表（不含空白分段）
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END_PATTERN.split(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_END_PATTERN.split(sentence):
+            while len(clause) > max_chars:
+                pieces.append(clause[:max_chars])
+                clause = clause[max_chars:]
+            pieces.append(clause)
+
+    return [chunk for chunk in _pack_pieces(pieces, max_chars) if chunk.strip()]
+
+
+# ---------------------------------------------------------------------------
+# 可朗读文本规范化
+# ---------------------------------------------------------------------------
+
+# 推理模型输出中的思考过程
+_REASONING_PATTERN = re.compile(r"<think>.*?</think>", re.S | re.I)
+# 舞台指示：*挥动魔杖*、（微笑）；星号紧贴字母或数字时（如 a*b*c）不是舞台指示
+_STAGE_DIRECTION_PATTERN = re.compile(
+    r"(?<![*A-Za-z0-9])\*(?![*\s])[^*\n]+?(?<![*\s])\*(?![*A-Za-z0-9])|（[^（）\n]*）"
+)
+# Markdown 语法
+_CODE_BLOCK_PATTERN = re.compile(r"```.*?(```|$)", re.S)
+_INLINE_CODE_PATTERN = re.compile(r"`([^`\n]*)`")
+_IMAGE_PATTERN = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK_PATTERN = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_URL_PATTERN = re.compile(r"https?://\S+")
+_HTML_TAG_PATTERN = re.compile(r"</?[A-Za-z][^>\n]*>")
+_HEADING_PATTERN = re.compile(r"^\s{0,3}#{1,6}\s*", re.M)
+_BLOCKQUOTE_PATTERN = re.compile(r"^\s{0,3}>\s?", re.M)
+_LIST_MARKER_PATTERN = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+", re.M)
+_RULE_PATTERN = re.compile(r"^\s*(?:[-*_]\s*){3,}$", re.M)
+_EMPHASIS_PATTERN = re.compile(r"(\*\*|__|~~)(.+?)\1")
+# 未成对的强调符号（两侧不全是字母或数字的星号）
+_STRAY_ASTERISK_PATTERN = re.compile(r"(?<![A-Za-z0-9])\*+|\*+(?![A-Za-z0-9])")
+_TABLE_PIPE_PATTERN = re.compile(r"\s*\|\s*")
+_TABLE_DIVIDER_PATTERN = re.compile(r"^\s*\|?(?:\s*:?-+:?\s*\|)+\s*:?-*:?\s*$", re.M)
+# Emoji 及其修饰符
+_EMOJI_PATTERN = re.compile(
+    "[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U00002B00-\U00002BFF"
+    "\U0001F1E6-\U0001F1FF\U0000FE0F\U0000200D\U000020E3]+"
+)
+_WHITESPACE_PATTERN = re.compile(r"[ \t　]+")
+_BLANK_LINES_PATTERN = re.compile(r"\n\s*\n+")
+_CJK_PATTERN = re.compile(r"[一-鿿]")
+
+# 数字（可带货币符号、千分位、小数与单位）；数字串用原子组整体匹配，
+# 紧贴字母的数字串（如 10am、a1）整体跳过，不会退回到只匹配其中一部分数字
+_NUMBER_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9])(?P<currency>[¥￥$])?(?P<sign>(?<![0-9A-Za-z])-)?"
+    r"(?P<number>(?>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?))"
+    r"(?P<unit>%|‰|℃|°C|°F|km/h|km|kg|cm|mm|ml|mg|m|g|L|l|h|min|s)?(?![A-Za-z0-9])"
+)
+_TIME_PATTERN = re.compile(r"(?<![\d:])(?P<hour>[01]?\d|2[0-3]):(?P<minute>[0-5]\d)(?![\d:])")
+# 电话号码（区号-号码、11位手机号），逐位朗读
+_PHONE_PATTERN = re.compile(r"(?<!\d)(?:\d{3,4}-\d{7,8}|1\d{10})(?!\d)")
+
+_ZH_DIGITS = "零一二三四五六七八九"
+_ZH_UNITS = ["", "十", "百", "千"]
+_ZH_SECTIONS = ["", "万", "亿", "万亿"]
+_ZH_MEASURE_UNITS = {
+    "%": "", "‰": "", "℃": "摄氏度", "°C": "摄氏度", "°F": "华氏度",
+    "km/h": "千米每小时", "km": "千米", "kg": "千克", "cm": "厘米", "mm": "毫米",
+    "ml": "毫升", "mg": "毫克", "m": "米", "g": "克", "L": "升", "l": "升",
+    "h": "小时", "min": "分钟", "s": "秒",
+}
+_ZH_CURRENCIES = {"¥": "元", "￥": "元", "$": "美元"}
+
+_EN_ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen",
+]
+_EN_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_EN_SCALES = [(10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand")]
+_EN_MEASURE_UNITS = {
+    "%": "percent", "‰": "per mille", "℃": "degrees Celsius", "°C": "degrees Celsius",
+    "°F": "degrees Fahrenheit", "km/h": "kilometers per hour", "km": "kilometers",
+    "kg": "kilograms", "cm": "centimeters", "mm": "millimeters", "ml": "milliliters",
+    "mg": "milligrams", "m": "meters", "g": "grams", "L": "liters", "l": "liters",
+    "h": "hours", "min": "minutes", "s": "seconds",
+}
+_EN_CURRENCIES = {"¥": "yuan", "￥": "yuan", "$": "dollars"}
+# 英文金额的主辅币单位（单数、复数）
+_EN_MONEY_UNITS = {"$": (("dollar", "dollars"), ("cent", "cents"))}
+
+
+def _zh_section(n: int) -> str:
+    """将 0-9999 的整数转换为中文读法"""
+    result = ""
+    pending_zero = False
+    for pos in range(3, -1, -1):
+        digit = n // (10 ** pos) % 10
+        if digit == 0:
+            pending_zero = bool(result)
+            continue
+        if pending_zero:
+            result += "零"
+            pending_zero = False
+        result += _ZH_DIGITS[digit] + _ZH_UNITS[pos]
+    return result
+
+
+def _zh_integer(n: int) -> str:
+    """
+    将整数转换为中文读法，如 10005 -> 一万零五
+
+    Args:
+        n: 非负整数（小于一亿亿）
+
+    Returns:
+        str: 中文读法
+    """
+    if n == 0:
+        return "零"
+    sections = []
+    while n:
+        sections.append(n % 10000)
+        n //= 10000
+    result = ""
+    pending_zero = False
+    for index in range(len(sections) - 1, -1, -1):
+        section = sections[index]
+        if section == 0:
+            pending_zero = bool(result)
+            continue
+        if result and (pending_zero or section < 1000):
+            result += "零"
+        result += _zh_section(section) + _ZH_SECTIONS[index]
+        pending_zero = False
+    if result.startswith("一十"):
+        result = result[1:]
+    return result
+
+
+def _en_integer(n: int) -> str:
+    """
+    将整数转换为英文读法，如 1234 -> one thousand two hundred thirty-four
+
+    Args:
+        n: 非负整数
+
+    Returns:
+        str: 英文读法
+    """
+    if n < 20:
+        return _EN_ONES[n]
+    if n < 100:
+        return _EN_TENS[n // 10] + (f"-{_EN_ONES[n % 10]}" if n % 10 else "")
+    if n < 1000:
+        rest = n % 100
+        return f"{_EN_ONES[n // 100]} hundred" + (f" {_en_integer(rest)}" if rest else "")
+    for scale, name in _EN_SCALES:
+        if n >= scale:
+            rest = n % scale
+            return f"{_en_integer(n // scale)} {name}" + (f" {_en_integer(rest)}" if rest else "")
+    return str(n)
+
+
+def _read_digits(digits: str, chinese: bool) -> str:
+    """逐位读出数字串，如编号、年份、小数部分"""
+    if chinese:
+        return "".join(_ZH_DIGITS[int(d)] for d in digits)
+    return " ".join(_EN_ONES[int(d)] for d in digits)
+
+
+def _expand_number(match: "re.Match", chinese: bool) -> str:
+    """
+    将匹配到的数字（含货币、单位）展开为可朗读的文字
+
+    Args:
+        match: _NUMBER_PATTERN 的匹配结果
+        chinese: 是否按中文读法展开
+
+    Returns:
+        str: 展开后的文字
+    """
+    number = match.group("number").replace(",", "")
+    unit = match.group("unit") or ""
+    currency = match.group("currency") or ""
+    integer_part, _, fraction_part = number.partition(".")
+    following = match.string[match.end():match.end() + 1]
+
+    if currency and not unit and not match.group("sign") and len(fraction_part) <= 2:
+        spoken = _read_money(currency, int(integer_part), fraction_part.ljust(2, "0") if fraction_part else "", chinese)
+        if spoken:
+            return spoken
+
+    if chinese and following == "年" and len(integer_part) == 4 and not fraction_part:
+        # 年份逐位读：2024年 -> 二零二四年
+        spoken = _read_digits(integer_part, chinese)
+    elif len(integer_part) > 1 and integer_part.startswith("0") or len(integer_part) > 15:
+        # 编号、电话号码等逐位读
+        spoken = _read_digits(integer_part, chinese)
+    elif chinese:
+        spoken = _zh_integer(int(integer_part))
+    else:
+        spoken = _en_integer(int(integer_part))
+
+    if fraction_part:
+        spoken += ("点" if chinese else " point ") + _read_digits(fraction_part, chinese)
+    if match.group("sign"):
+        spoken = ("负" if chinese else "minus ") + spoken
+
+    if chinese:
+        if unit == "%":
+            spoken = "百分之" + spoken
+        elif unit == "‰":
+            spoken = "千分之" + spoken
+        else:
+            spoken += _ZH_MEASURE_UNITS.get(unit, "")
+        return spoken + _ZH_CURRENCIES.get(currency, "")
+
+    if unit:
+        spoken += " " + _EN_MEASURE_UNITS[unit]
+    if currency:
+        spoken += " " + _EN_CURRENCIES[currency]
+    return spoken
+
+
+def _read_money(currency: str, integer: int, cents: str, chinese: bool) -> Optional[str]:
+    """
+    按金额读法展开，如 ¥3.50 -> 三元五角，$3.50 -> three dollars and fifty cents
+
+    Args:
+        currency: 货币符号
+        integer: 整数部分
+        cents: 两位的小数部分，没有小数时为空
+        chinese: 是否按中文读法展开
+
+    Returns:
+        Optional[str]: 展开后的文字，没有对应读法时返回 None（按普通小数展开）
+    """
+    if chinese:
+        if currency == "$":
+            # 美元按小数读：三点五美元
+            cents = cents.rstrip("0")
+            return _zh_integer(integer) + ("点" + _read_digits(cents, True) if cents else "") + "美元"
+        jiao, fen = (int(cents[0]), int(cents[1])) if cents else (0, 0)
+        # 不足一元时省略"零元"：¥0.50 -> 五角
+        spoken = _zh_integer(integer) + "元" if integer or not (jiao or fen) else ""
+        if jiao:
+            spoken += _ZH_DIGITS[jiao] + "角"
+        if fen:
+            spoken += ("零" if spoken and not jiao else "") + _ZH_DIGITS[fen] + "分"
+        return spoken
+    units = _EN_MONEY_UNITS.get(currency)
+    if units is None:
+        return None
+    (major, majors), (minor, minors) = units
+    minor_amount = int(cents) if cents else 0
+    minor_spoken = f"{_en_integer(minor_amount)} {minor if minor_amount == 1 else minors}"
+    if not integer and minor_amount:
+        return minor_spoken
+    spoken = f"{_en_integer(integer)} {major if integer == 1 else majors}"
+    return spoken + f" and {minor_spoken}" if minor_amount else spoken
+
+
+def _strip_reasoning(text: str) -> str:
+    """去除推理模型的思考过程（<think>...</think>），包括未闭合或缺少起始标签的情况"""
+    text = _REASONING_PATTERN.sub("", text)
+    lowered = text.lower()
+    if "</think>" in lowered:
+        text = text[lowered.rindex("</think>") + len("</think>"):]
+        lowered = text.lower()
+    if "<think>" in lowered:
+        text = text[:lowered.index("<think>")]
+    return text
+
+
+def _strip_stage_directions(text: str) -> str:
+    """去除舞台指示，如 *挥动魔杖*、（微笑）"""
+    return _STAGE_DIRECTION_PATTERN.sub("", text)
+
+
+def _strip_markdown(text: str) -> str:
+    """去除 Markdown 与 HTML 标记，保留可朗读的文字"""
+    text = _CODE_BLOCK_PATTERN.sub("", text)
+    text = _INLINE_CODE_PATTERN.sub(r"\1", text)
+    text = _IMAGE_PATTERN.sub(r"\1", text)
+    text = _LINK_PATTERN.sub(r"\1", text)
+    text = _URL_PATTERN.sub("", text)
+    text = _HTML_TAG_PATTERN.sub("", text)
+    text = _TABLE_DIVIDER_PATTERN.sub("", text)
+    text = _RULE_PATTERN.sub("", text)
+    text = _HEADING_PATTERN.sub("", text)
+    text = _BLOCKQUOTE_PATTERN.sub("", text)
+    text = _LIST_MARKER_PATTERN.sub("", text)
+    text = _EMPHASIS_PATTERN.sub(r"\2", text)
+    text = _STRAY_ASTERISK_PATTERN.sub("", text)
+    lines = []
+    for line in text.split("\n"):
+        if line.count("|") >= 2:
+            line = _TABLE_PIPE_PATTERN.sub("，", line.strip().strip("|"))
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _strip_emoji(text: str) -> str:
+    """去除 emoji"""
+    return _EMOJI_PATTERN.sub("", text)
+
+
+def _expand_numbers(text: str) -> str:
+    """将数字、时间、电话号码、百分比及常见单位展开为中文或英文读法（按文本是否含中文决定）"""
+    chinese = bool(_CJK_PATTERN.search(text))
+
+    def expand_time(match: "re.Match") -> str:
+        hour, minute = int(match.group("hour")), int(match.group("minute"))
+        if chinese:
+            return f"{_zh_integer(hour)}点" + (f"{_zh_integer(minute)}分" if minute else "")
+        if minute == 0:
+            return f"{_en_integer(hour)} o'clock"
+        return f"{_en_integer(hour)} " + (f"oh {_en_integer(minute)}" if minute < 10 else _en_integer(minute))
+
+    text = _PHONE_PATTERN.sub(lambda m: _read_digits(m.group(0).replace("-", ""), chinese), text)
+    text = _TIME_PATTERN.sub(expand_time, text)
+    return _NUMBER_PATTERN.sub(lambda m: _expand_number(m, chinese), text)
+
+
+def _collapse_whitespace(text: str) -> str:
+    """合并多余空白与空行"""
+    text = _WHITESPACE_PATTERN.sub(" ", text)
+    text = _BLANK_LINES_PATTERN.sub("\n", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+
+# 规范化步骤注册表，按配置中的顺序执行
+NORMALIZE_STEPS = {
+    "reasoning": _strip_reasoning,
+    "stage_directions": _strip_stage_directions,
+    "markdown": _strip_markdown,
+    "emoji": _strip_emoji,
+    "numbers": _expand_numbers,
+    "whitespace": _collapse_whitespace,
+}
+
+
+class SpeakableText(BaseModel):
+    """规范化后的可朗读文本"""
+    text: str = Field(description="可朗读的文本")
+    original_chars: int = Field(description="原始文本字符数")
+    saved_chars: int = Field(description="规范化节省的字符数（数字展开可能使其为负）")
+
+
+class SpeakableTextNormalizer:
+    """TTS 前的可朗读文本规范化流水线"""
+
+    def __init__(self, steps: List[str]):
+        """
+        初始化规范化流水线
+
+        Args:
+            steps: 按顺序执行的步骤名称，可选值见 NORMALIZE_STEPS
+
+        Raises:
+            ValueError: 包含未知步骤时抛出
+        """
+        unknown = [step for step in steps if step not in NORMALIZE_STEPS]
+        if unknown:
+            raise ValueError(f"未知的文本规范化步骤: {unknown}. 支持的步骤: {list(NORMALIZE_STEPS.keys())}")
+        self.steps = list(steps)
+
+    def normalize(self, text: str) -> SpeakableText:
+        """
+        执行规范化
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            SpeakableText: 规范化结果
+        """
+        original = text or ""
+        result = original
+        for step in self.steps:
+            result = NORMALIZE_STEPS[step](result)
+        return SpeakableText(
+            text=result,
+            original_chars=len(original),
+            saved_chars=len(original) - len(result)
+        )
 
 
 class VoiceInfo(BaseModel):
@@ -69,6 +505,86 @@ class TTSResponse(BaseModel):
     addition: Optional[Dict[str, Any]] = Field(None, description="附加信息")
 
 
+class TTSError(Exception):
+    """TTS合成失败，reason 为可展示给调用方的失败原因"""
+    
+    def __init__(self, message: str, reason: str, retryable: bool = False, status: Optional[int] = None):
+        """
+        Args:
+            message: 错误信息
+            reason: 失败原因（timeout、connect_error、rate_limited、provider_error、
+                    invalid_request、circuit_open、concat_error）
+            retryable: 是否可重试
+            status: 上游返回的HTTP状态码
+        """
+        super().__init__(message)
+        self.reason = reason
+        self.retryable = retryable
+        self.status = status
+
+
+class CircuitBreaker:
+    """
+    简单熔断器
+    连续失败达到阈值后熔断，熔断期间直接拒绝请求；
+    超过重置时间后放行一个试探请求，成功则恢复，失败则继续熔断
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Args:
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断持续时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+    
+    def allow_request(self) -> bool:
+        """
+        判断是否允许发送请求
+        
+        Returns:
+            bool: 是否允许
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+    
+    def record_success(self) -> None:
+        """记录一次成功请求"""
+        self.state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+    
+    def release(self) -> None:
+        """放弃本次请求且不计入结果（如请求被取消），半开状态下允许下一个请求重新试探"""
+        self._trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        """记录一次上游故障"""
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
 class TTSModelService(BaseModelService):
     """TTS模型服务类"""
     
@@ -84,11 +600,30 @@ class TTSModelService(BaseModelService):
         """
         super().__init__(api_key, base_url, model, **kwargs)
         self.session: Optional[aiohttp.ClientSession] = None
+        self.long_text_enabled = kwargs.get('long_text_enabled', True)
+        self.chunk_max_chars = kwargs.get('chunk_max_chars', 300)
+        self.chunk_concurrency = kwargs.get('chunk_concurrency', 4)
+        self.normalize_enabled = kwargs.get('normalize_enabled', True)
+        self.normalizer = SpeakableTextNormalizer(kwargs.get('normalize_steps', list(NORMALIZE_STEPS.keys())))
+        self.connect_timeout = kwargs.get('connect_timeout', 3)
+        self.first_byte_timeout = kwargs.get('first_byte_timeout', 15)
+        self.total_timeout = kwargs.get('total_timeout', 30)
+        self.max_retries = kwargs.get('max_retries', 2)
+        self.retry_base_delay = kwargs.get('retry_base_delay', 0.3)
+        self.fallback_voice_type = kwargs.get('fallback_voice_type', "")
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=kwargs.get('circuit_failure_threshold', 5),
+            reset_timeout=kwargs.get('circuit_reset_timeout', 30)
+        )
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建HTTP会话"""
+        """获取或创建HTTP会话（总超时由调用方控制）"""
         if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=360)
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                connect=self.connect_timeout,
+                sock_connect=self.connect_timeout
+            )
             self.session = aiohttp.ClientSession(timeout=timeout)
         return self.session
     
@@ -116,7 +651,7 @@ class TTSModelService(BaseModelService):
         }
         
         try:
-            async with session.get(url, headers=headers) as response:
+            async with asyncio.timeout(self.total_timeout), session.get(url, headers=headers) as response:
                 if response.status != 200:
                     raise Exception(f"获取音色列表失败: HTTP {response.status}")
                 
@@ -146,18 +681,175 @@ class TTSModelService(BaseModelService):
         except Exception as e:
             raise Exception(f"获取音色列表失败: {str(e)}")
     
-    async def text_to_speech(self, request: TTSRequest) -> TTSResponse:
+    def normalize_text(self, text: str) -> SpeakableText:
+        """
+        将文本规范化为可朗读文本（去除思考过程、Markdown、舞台指示、emoji，展开数字与单位）
+        
+        Args:
+            text: 原始文本
+            
+        Returns:
+            SpeakableText: 规范化结果，未启用规范化时原样返回
+        """
+        if not self.normalize_enabled:
+            return SpeakableText(text=text or "", original_chars=len(text or ""), saved_chars=0)
+        return self.normalizer.normalize(text)
+    
+    async def text_to_speech(
+        self,
+        request: TTSRequest,
+        long_text: Optional[bool] = None
+    ) -> TTSResponse:
         """
         文字转语音
+        文本超过分段长度上限时，按句切分后并发合成并按顺序拼接音频
         
         Args:
             request: TTS请求
+            long_text: 是否启用长文本分段合成，为 None 时按服务配置决定
             
         Returns:
             TTSResponse: TTS响应
             
         Raises:
-            Exception: 请求失败时抛出异常
+            TTSError: 合成失败、超过总时限或熔断中时抛出异常
+        """
+        try:
+            async with asyncio.timeout(self.total_timeout):
+                try:
+                    return await self._dispatch(request, long_text)
+                except TTSError as e:
+                    fallback = self.fallback_voice_type
+                    # 只有请求被拒绝（如音色不存在或不支持）时才改用备用音色；服务故障换音色也无济于事
+                    if not fallback or fallback == request.audio.voice_type or e.reason != "invalid_request":
+                        raise
+                    # 指定音色合成失败时改用备用音色
+                    fallback_request = request.model_copy(
+                        update={"audio": request.audio.model_copy(update={"voice_type": fallback})}
+                    )
+                    response = await self._dispatch(fallback_request, long_text)
+                    response.addition = {**(response.addition or {}), "fallback_voice_type": fallback}
+                    return response
+        except TimeoutError:
+            raise TTSError(f"TTS转换超时: 超过 {self.total_timeout} 秒", reason="timeout")
+    
+    async def _dispatch(self, request: TTSRequest, long_text: Optional[bool]) -> TTSResponse:
+        """按文本长度选择单次合成或分段并发合成"""
+        if long_text is None:
+            long_text = self.long_text_enabled
+        if long_text and len(request.request.text) > self.chunk_max_chars:
+            return await self._text_to_speech_chunked(request)
+        return await self._synthesize(request)
+    
+    async def _text_to_speech_chunked(self, request: TTSRequest) -> TTSResponse:
+        """
+        长文本分段并发合成
+        
+        Args:
+            request: TTS请求
+            
+        Returns:
+            TTSResponse: 拼接后的TTS响应
+            
+        Raises:
+            TTSError: 任一分段合成失败或音频拼接失败时抛出异常
+        """
+        chunks = split_text_for_tts(request.request.text, self.chunk_max_chars)
+        if len(chunks) <= 1:
+            return await self._synthesize(request)
+        
+        semaphore = asyncio.Semaphore(max(1, self.chunk_concurrency))
+        
+        async def synthesize_chunk(text: str) -> TTSResponse:
+            chunk_request = TTSRequest(
+                audio=request.audio,
+                request=TTSRequestData(text=text)
+            )
+            async with semaphore:
+                return await self._synthesize(chunk_request)
+        
+        tasks = [asyncio.create_task(synthesize_chunk(chunk)) for chunk in chunks]
+        try:
+            responses = await asyncio.gather(*tasks)
+        finally:
+            # 任一分段失败时取消其余分段，不再占用并发与配额
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        try:
+            audio = concat_audio(
+                [base64.b64decode(response.data) for response in responses],
+                request.audio.encoding
+            )
+        except ValueError as e:
+            raise TTSError(f"TTS音频拼接失败: {str(e)}", reason="concat_error")
+        
+        addition: Dict[str, Any] = {"chunks": str(len(chunks))}
+        try:
+            addition["duration"] = str(sum(
+                int((response.addition or {}).get("duration", 0)) for response in responses
+            ))
+        except (TypeError, ValueError):
+            pass
+        
+        return TTSResponse(
+            reqid=responses[0].reqid,
+            operation=responses[0].operation,
+            sequence=responses[-1].sequence,
+            data=base64.b64encode(audio).decode("ascii"),
+            addition=addition
+        )
+    
+    async def _synthesize(self, request: TTSRequest) -> TTSResponse:
+        """
+        单段合成，可重试的失败按指数退避加随机抖动重试
+        
+        Args:
+            request: TTS请求
+            
+        Returns:
+            TTSResponse: TTS响应
+            
+        Raises:
+            TTSError: 重试耗尽、不可重试的失败或熔断中时抛出异常
+        """
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise TTSError("TTS服务熔断中，暂时跳过语音合成", reason="circuit_open")
+            try:
+                response = await self._post_tts(request)
+            except TTSError as e:
+                if e.retryable:
+                    self.circuit_breaker.record_failure()
+                else:
+                    # 请求本身的问题（如音色不存在）不代表服务故障
+                    self.circuit_breaker.record_success()
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(random.uniform(0, self.retry_base_delay * (2 ** attempt)))
+                attempt += 1
+                continue
+            except BaseException:
+                # 被取消（总超时、其他分段失败、客户端断开）或意外异常，不代表服务故障，释放试探名额
+                self.circuit_breaker.release()
+                raise
+            self.circuit_breaker.record_success()
+            return response
+    
+    async def _post_tts(self, request: TTSRequest) -> TTSResponse:
+        """
+        发送单次TTS合成请求
+        
+        Args:
+            request: TTS请求
+            
+        Returns:
+            TTSResponse: TTS响应
+            
+        Raises:
+            TTSError: 请求失败时抛出异常
         """
         session = await self._get_session()
         url = f"{self.base_url.rstrip('/')}/v1/voice/tts"
@@ -179,10 +871,26 @@ class TTSModelService(BaseModelService):
         }
         
         try:
-            async with session.post(url, headers=headers, json=payload) as response:
+            # 首字节时限：从发出请求到收到响应头
+            try:
+                async with asyncio.timeout(self.first_byte_timeout):
+                    response = await session.post(url, headers=headers, json=payload)
+            except TimeoutError:
+                raise TTSError(
+                    f"TTS首字节超时: 超过 {self.first_byte_timeout} 秒",
+                    reason="timeout",
+                    retryable=True
+                )
+            
+            async with response:
                 if response.status != 200:
                     error_text = await response.text()
-                    raise Exception(f"TTS请求失败: HTTP {response.status}, {error_text}")
+                    message = f"TTS请求失败: HTTP {response.status}, {error_text}"
+                    if response.status == 429:
+                        raise TTSError(message, reason="rate_limited", retryable=True, status=response.status)
+                    if response.status >= 500:
+                        raise TTSError(message, reason="provider_error", retryable=True, status=response.status)
+                    raise TTSError(message, reason="invalid_request", status=response.status)
                 
                 # 解析JSON响应
                 data = await response.json()
@@ -194,10 +902,16 @@ class TTSModelService(BaseModelService):
                     addition=data.get("addition", {})
                 )
                 
+        except TTSError:
+            raise
+        except TimeoutError as e:
+            raise TTSError(f"TTS连接超时: {str(e)}", reason="timeout", retryable=True)
+        except aiohttp.ClientConnectionError as e:
+            raise TTSError(f"网络请求失败: {str(e)}", reason="connect_error", retryable=True)
         except aiohttp.ClientError as e:
-            raise Exception(f"网络请求失败: {str(e)}")
+            raise TTSError(f"网络请求失败: {str(e)}", reason="provider_error", retryable=True)
         except Exception as e:
-            raise Exception(f"TTS转换失败: {str(e)}")
+            raise TTSError(f"TTS转换失败: {str(e)}", reason="provider_error")
     
     # 实现BaseModelService的抽象方法（TTS服务不需要这些方法，但为了兼容性提供默认实现）
     async def chat_completion(self, request: ChatRequest) -> ChatResponse:
@@ -234,7 +948,20 @@ from src.config import settings
 tts_service = TTSModelService(
     api_key=settings.OPENAI_API_KEY,
     base_url=settings.OPENAI_BASE_URL,
-    model=settings.TTS_MODEL
+    model=settings.TTS_MODEL,
+    long_text_enabled=settings.TTS_LONG_TEXT_ENABLED,
+    chunk_max_chars=settings.TTS_CHUNK_MAX_CHARS,
+    chunk_concurrency=settings.TTS_CHUNK_CONCURRENCY,
+    normalize_enabled=settings.TTS_NORMALIZE_ENABLED,
+    normalize_steps=settings.TTS_NORMALIZE_STEPS,
+    connect_timeout=settings.TTS_CONNECT_TIMEOUT,
+    first_byte_timeout=settings.TTS_FIRST_BYTE_TIMEOUT,
+    total_timeout=settings.TTS_TOTAL_TIMEOUT,
+    max_retries=settings.TTS_MAX_RETRIES,
+    retry_base_delay=settings.TTS_RETRY_BASE_DELAY,
+    circuit_failure_threshold=settings.TTS_CIRCUIT_FAILURE_THRESHOLD,
+    circuit_reset_timeout=settings.TTS_CIRCUIT_RESET_TIMEOUT,
+    fallback_voice_type=settings.TTS_FALLBACK_VOICE_TYPE
 )
 
 async def main():
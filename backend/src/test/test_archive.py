@@ -0,0 +1,87 @@
+"""
+冷数据归档的单元测试
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.crud.archive import LocalArchiveStore, SessionArchiver
+from src.crud.crud_history_chat import crud_history_chat
+from src.crud.crud_history_session import crud_history_session
+from src.jobs.archive import SessionArchiveJob
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    old = datetime.now() - timedelta(days=30)
+    async with factory() as db:
+        db.add(HistorySession(id="idle", username="admin", session_name="idle", created_at=old))
+        db.add(HistorySession(id="active", username="admin", session_name="active", created_at=old))
+        for i in range(3):
+            created_at = old + timedelta(minutes=i)
+            db.add(HistoryChat(session_id="idle", role=ChatRole.USER, content=f"m{i}",
+                               created_at=created_at, updated_at=created_at))
+        db.add(HistoryChat(session_id="active", role=ChatRole.USER, content="new"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def _count_chats(factory, session_id: str) -> int:
+    async with factory() as db:
+        result = await db.execute(select(func.count(HistoryChat.id)).where(HistoryChat.session_id == session_id))
+        return result.scalar()
+
+
+class TestSessionArchive:
+    """测试归档与恢复"""
+
+    @pytest.mark.asyncio
+    async def test_archive_and_rehydrate(self, session_factory, tmp_path):
+        archiver = SessionArchiver(LocalArchiveStore(str(tmp_path)))
+        job = SessionArchiveJob(archiver, idle_days=7, pause=0)
+
+        stats = await job.run_once(session_factory)
+        assert (stats.sessions_archived, stats.chats_archived) == (1, 3)
+        assert await _count_chats(session_factory, "idle") == 0
+        assert await _count_chats(session_factory, "active") == 1
+        archive_path = tmp_path / SessionArchiver.archive_key_for("idle")
+        assert archive_path.exists()
+
+        with patch("src.crud.crud_history_session.session_archiver", archiver):
+            async with session_factory() as db:
+                session = await crud_history_session.get_by_id(db, id="idle")
+                assert await crud_history_session.rehydrate(db, session=session) == 3
+                chats = await crud_history_chat.get_by_session_id(db, session_id="idle")
+        assert session.archive_key is None
+        assert [chat.content for chat in chats] == ["m0", "m1", "m2"]
+        assert await _count_chats(session_factory, "idle") == 3
+        assert not archive_path.exists()
+
+    @pytest.mark.asyncio
+    async def test_read_without_rehydrating(self, session_factory, tmp_path):
+        archiver = SessionArchiver(LocalArchiveStore(str(tmp_path)))
+        await SessionArchiveJob(archiver, idle_days=7, pause=0).run_once(session_factory)
+
+        async with session_factory() as db:
+            session = (await db.execute(select(HistorySession).where(HistorySession.id == "idle"))).scalar_one()
+        assert [chat.content for chat in await archiver.read(session)] == ["m0", "m1", "m2"]
+        assert await _count_chats(session_factory, "idle") == 0
+
+    def test_store_rejects_keys_outside_root(self, tmp_path):
+        store = LocalArchiveStore(str(tmp_path))
+        with pytest.raises(Exception):
+            store._path("../escape")
+        assert store._path("ab/abc.jsonl.z") == os.path.join(str(tmp_path), "ab", "abc.jsonl.z")
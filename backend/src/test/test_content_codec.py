@@ -0,0 +1,123 @@
+"""
+聊天内容压缩存储的单元测试
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.content_codec import ContentCodec, content_codec
+from src.crud.crud_history_chat import HistoryChatCreate, crud_history_chat
+from src.jobs.content_backfill import ContentBackfillJob
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import HistorySession
+
+LONG_CONTENT = "魁地奇" * 30000  # 约 270KB，超过 MySQL TEXT 上限
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        db.add(HistorySession(id="s1", username="admin", session_name="test"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+class TestContentCodec:
+    """测试编解码"""
+
+    def test_short_content_stays_plain(self):
+        codec = ContentCodec(threshold=16)
+        assert codec.encode("hello") == ("hello", None, "")
+
+    def test_long_content_round_trip(self):
+        codec = ContentCodec(threshold=16, search_prefix=0)
+        content, blob, name = codec.encode(LONG_CONTENT)
+        assert content == "" and name == "zlib"
+        assert len(blob) < len(LONG_CONTENT.encode("utf-8")) // 10
+        assert codec.decode(content, blob, name) == LONG_CONTENT
+
+    def test_compressed_content_keeps_search_prefix(self):
+        codec = ContentCodec(threshold=16, search_prefix=10)
+        content, blob, name = codec.encode(LONG_CONTENT)
+        # 10 字节前缀不截断多字节字符（每个汉字 3 字节）
+        assert content == "魁地奇"
+        assert codec.decode(content, blob, name) == LONG_CONTENT
+
+    def test_unknown_codec_raises(self):
+        with pytest.raises(Exception):
+            ContentCodec().decode("", b"x", "lz4")
+
+
+class TestCompressedStorage:
+    """测试写入与读取时的透明压缩"""
+
+    @pytest.mark.asyncio
+    async def test_long_content_is_not_truncated(self, session_factory):
+        async with session_factory() as db:
+            chats = await crud_history_chat.create_turn(db, objs_in=[
+                HistoryChatCreate(session_id="s1", role=ChatRole.USER, content=LONG_CONTENT),
+                HistoryChatCreate(session_id="s1", role=ChatRole.SYSTEM, content="short"),
+            ])
+            # 写入后对象上仍是明文
+            assert chats[0].content == LONG_CONTENT
+
+            row = (await db.execute(text(
+                "SELECT content, content_codec, length(content_blob) FROM history_chat ORDER BY created_at"
+            ))).first()
+            # content 列只保留明文前缀，供全文检索命中
+            assert LONG_CONTENT.startswith(row[0]) and 0 < len(row[0].encode("utf-8")) <= 4096
+            assert row[1] == "zlib" and row[2] > 0
+
+        async with session_factory() as db:
+            loaded = await crud_history_chat.get_by_session_id(db, session_id="s1")
+            assert [chat.content for chat in loaded] == [LONG_CONTENT, "short"]
+
+    @pytest.mark.asyncio
+    async def test_backfill_compresses_existing_rows(self, session_factory):
+        async with session_factory() as db:
+            # 模拟压缩上线前以明文写入的行（Core INSERT 不经过映射事件）
+            await db.execute(insert(HistoryChat).values(
+                id="c1", session_id="s1", role=ChatRole.USER, content="a" * 10000,
+                content_codec="", created_at=HistoryChat().created_at, updated_at=HistoryChat().updated_at
+            ))
+            await db.commit()
+
+        job = ContentBackfillJob(ContentCodec(threshold=4096), batch_pause=0)
+        stats = await job.run_once(session_factory)
+        assert stats.rows_compressed == 1
+        assert stats.bytes_after < stats.bytes_before
+        assert (await job.run_once(session_factory)).rows_compressed == 0
+
+        async with session_factory() as db:
+            assert (await crud_history_chat.get_by_session_id(db, session_id="s1"))[0].content == "a" * 10000
+
+    @pytest.mark.asyncio
+    async def test_backfill_fills_prefix_of_compressed_rows(self, session_factory):
+        codec = ContentCodec(threshold=16, search_prefix=8)
+        async with session_factory() as db:
+            # 模拟保留前缀之前压缩写入、content 为空的行
+            _, blob, name = codec.encode("b" * 100)
+            await db.execute(insert(HistoryChat).values(
+                id="c1", session_id="s1", role=ChatRole.USER, content="", content_blob=blob,
+                content_codec=name, created_at=HistoryChat().created_at, updated_at=HistoryChat().updated_at
+            ))
+            await db.commit()
+
+        job = ContentBackfillJob(codec, batch_pause=0)
+        assert (await job.run_once(session_factory)).prefixes_filled == 1
+        assert (await job.run_once(session_factory)).prefixes_filled == 0
+        async with session_factory() as db:
+            assert (await db.execute(text("SELECT content FROM history_chat"))).scalar() == "b" * 8
+            assert (await crud_history_chat.get_by_session_id(db, session_id="s1"))[0].content == "b" * 100
+
+    def test_encode_row_for_core_insert(self):
+        row = content_codec.encode_row({"id": "c1", "content": LONG_CONTENT})
+        assert LONG_CONTENT.startswith(row["content"]) and row["content_codec"]
+        assert content_codec.encode_row({"id": "c2", "content": "hi"})["content_blob"] is None
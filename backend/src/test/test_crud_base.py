@@ -0,0 +1,122 @@
+"""
+CRUDBase 批量操作的单元测试
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.crud_history_chat import crud_history_chat
+from src.crud.crud_history_session import HistorySessionCreate, crud_history_session
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import HistorySession
+
+LONG_CONTENT = "魁地奇" * 30000
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        db.add(HistorySession(id="s1", username="admin", session_name="test"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+def _chats(count: int, prefix: str = "c"):
+    return [
+        HistoryChat(id=f"{prefix}{index:03d}", session_id="s1", role=ChatRole.USER, content=f"m{index}")
+        for index in range(count)
+    ]
+
+
+class TestBulkWrites:
+    """测试批量写入与更新"""
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_and_get_many(self, session_factory):
+        chats = _chats(7) + [HistoryChat(id="long", session_id="s1", role=ChatRole.SYSTEM, content=LONG_CONTENT)]
+        async with session_factory() as db:
+            assert await crud_history_chat.bulk_create(db, chats, chunk_size=3) == 8
+            await db.commit()
+
+        async with session_factory() as db:
+            # 批量写入同样压缩超长内容
+            codec = (await db.execute(text("SELECT content_codec FROM history_chat WHERE id = 'long'"))).scalar()
+            assert codec == "zlib"
+            found = await crud_history_chat.get_many(db, ["c005", "missing", "long", "c001"], chunk_size=2)
+            assert [chat.id for chat in found] == ["c005", "long", "c001"]
+            assert found[1].content == LONG_CONTENT
+
+    @pytest.mark.asyncio
+    async def test_bulk_update_by_primary_key(self, session_factory):
+        async with session_factory() as db:
+            await crud_history_chat.bulk_create(db, _chats(5))
+            await crud_history_chat.bulk_update(
+                db, [{"id": f"c{index:03d}", "content": f"edited{index}"} for index in range(0, 5, 2)], chunk_size=2
+            )
+            await db.commit()
+
+        async with session_factory() as db:
+            found = await crud_history_chat.get_many(db, [f"c{index:03d}" for index in range(5)])
+            assert [chat.content for chat in found] == ["edited0", "m1", "edited2", "m3", "edited4"]
+
+    @pytest.mark.asyncio
+    async def test_upsert(self, session_factory):
+        async with session_factory() as db:
+            await crud_history_chat.bulk_create(db, _chats(2))
+            changed = [HistoryChat(id="c000", session_id="s1", role=ChatRole.USER, content="new")]
+            # 未指定更新列时忽略已存在的行
+            assert await crud_history_chat.upsert(db, changed + _chats(3, "d")) == 3
+            assert await crud_history_chat.upsert(db, changed, update_fields=["content"]) == 1
+            await db.commit()
+
+        async with session_factory() as db:
+            found = await crud_history_chat.get_many(db, ["c000", "c001", "d002"])
+            assert [chat.content for chat in found] == ["new", "m1", "m2"]
+
+    @pytest.mark.asyncio
+    async def test_session_rows_reference_persona(self, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="n", system_prompt="p", voice_type="v"))
+        row = crud_history_session.to_row(session)
+        assert row["persona_id"] == session.persona_id
+        assert (row["system_prompt"], row["voice_type"]) == ("", "")
+
+
+class TestIterChunks:
+    """测试按主键分批遍历"""
+
+    @pytest.mark.asyncio
+    async def test_iterates_all_matching_rows(self, session_factory):
+        async with session_factory() as db:
+            await crud_history_chat.bulk_create(db, _chats(10))
+            await db.commit()
+
+        async with session_factory() as db:
+            batches = [
+                [row.id for row in batch]
+                async for batch in crud_history_chat.iter_chunks(
+                    db, HistoryChat.content != "m4", columns=[HistoryChat.id], chunk_size=3
+                )
+            ]
+        assert [len(batch) for batch in batches] == [3, 3, 3]
+        assert "c004" not in sum(batches, [])
+
+    @pytest.mark.asyncio
+    async def test_allows_commit_between_batches(self, session_factory):
+        async with session_factory() as db:
+            await crud_history_chat.bulk_create(db, _chats(4))
+            await db.commit()
+
+        seen = []
+        async with session_factory() as db:
+            async for batch in crud_history_chat.iter_chunks(db, chunk_size=2):
+                seen.extend(chat.id for chat in batch)
+                await crud_history_chat.bulk_update(db, [{"id": chat.id, "content": "x"} for chat in batch])
+                await db.commit()
+        assert seen == ["c000", "c001", "c002", "c003"]
@@ -54,7 +54,8 @@ class TestCreateTables:
         """测试成功创建表"""
         # 使用MagicMock来正确模拟异步上下文管理器
         mock_conn = MagicMock()
-        mock_conn.run_sync = AsyncMock()
+        # 第一次 run_sync 为检查现有表（空库），第二次为创建表
+        mock_conn.run_sync = AsyncMock(side_effect=[[], None])
         
         mock_context_manager = MagicMock()
         mock_context_manager.__aenter__ = AsyncMock(return_value=mock_conn)
@@ -63,12 +64,33 @@ class TestCreateTables:
         mock_engine = MagicMock()
         mock_engine.begin.return_value = mock_context_manager
         
-        with patch('src.api.deps.engine', mock_engine):
+        with patch('src.api.deps.engine', mock_engine), \
+                patch('src.api.deps.settings.DB_MIGRATIONS_ENABLED', False):
             await create_tables()
             
             # 验证调用
             mock_engine.begin.assert_called_once()
-            mock_conn.run_sync.assert_called_once_with(SQLModel.metadata.create_all)
+            assert mock_conn.run_sync.call_count == 2
+            mock_conn.run_sync.assert_called_with(SQLModel.metadata.create_all)
+    
+    @pytest.mark.asyncio
+    async def test_create_tables_skips_existing(self):
+        """测试表已存在时不重复创建"""
+        mock_conn = MagicMock()
+        mock_conn.run_sync = AsyncMock(return_value=list(SQLModel.metadata.tables.keys()))
+        
+        mock_context_manager = MagicMock()
+        mock_context_manager.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_context_manager.__aexit__ = AsyncMock(return_value=None)
+        
+        mock_engine = MagicMock()
+        mock_engine.begin.return_value = mock_context_manager
+        
+        with patch('src.api.deps.engine', mock_engine), \
+                patch('src.api.deps.settings.DB_MIGRATIONS_ENABLED', False):
+            await create_tables()
+            
+            mock_conn.run_sync.assert_called_once()
     
     @pytest.mark.asyncio
     async def test_create_tables_failure(self):
@@ -262,6 +284,26 @@ class TestHealthCheck:
                 assert result["connected"] is False
                 assert "pool_status" in result
     
+    @pytest.mark.asyncio
+    async def test_health_check_uses_pool_monitor(self):
+        """测试连接池后台检查运行时不额外执行查询"""
+        mock_engine = MagicMock()
+        mock_engine.pool.size.return_value = 10
+        mock_monitor = MagicMock()
+        mock_monitor.running = True
+        mock_monitor.connected = True
+        mock_monitor.status.return_value = {"waits": 3, "timeouts": 0}
+        mock_check = AsyncMock(return_value=False)
+        
+        with patch('src.api.deps.engine', mock_engine), \
+                patch('src.api.deps.pool_monitors', [mock_monitor]), \
+                patch('src.api.deps.check_db_connection', mock_check):
+            result = await health_check()
+            
+            assert result["status"] == "healthy"
+            assert result["pool_status"]["waits"] == 3
+            mock_check.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_health_check_exception(self):
         """测试健康检查异常"""
@@ -288,7 +330,7 @@ class TestIntegration:
         """测试完整工作流程"""
         # Mock所有依赖
         mock_conn = MagicMock()
-        mock_conn.run_sync = AsyncMock()
+        mock_conn.run_sync = AsyncMock(return_value=[])
         mock_conn.execute = AsyncMock()
         
         # 使用MagicMock来正确模拟异步上下文管理器
@@ -306,7 +348,8 @@ class TestIntegration:
         mock_session_context_manager.__aexit__ = AsyncMock(return_value=None)
         mock_session_factory = MagicMock(return_value=mock_session_context_manager)
         
-        with patch('src.api.deps.engine', mock_engine):
+        with patch('src.api.deps.engine', mock_engine), \
+                patch('src.api.deps.settings.DB_MIGRATIONS_ENABLED', False):
             with patch('src.api.deps.AsyncSessionLocal', mock_session_factory):
                 # 1. 测试创建表
                 await create_tables()
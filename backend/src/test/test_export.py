@@ -0,0 +1,114 @@
+"""
+聊天记录流式导出的单元测试
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.api.api_v1 import history_session
+from src.crud.archive import LocalArchiveStore, SessionArchiver
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'export.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    archiver = SessionArchiver(LocalArchiveStore(str(tmp_path / "archive")))
+    monkeypatch.setattr(history_session, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(history_session, "session_archiver", archiver)
+
+    started = datetime.now() - timedelta(days=1)
+    async with factory() as db:
+        for i, session_id in enumerate(["live", "archived", "empty"]):
+            db.add(HistorySession(
+                id=session_id, username="admin", session_name=session_id, created_at=started + timedelta(hours=i)
+            ))
+        db.add(HistorySession(id="other", username="guest", session_name="other"))
+        for session_id in ("live", "archived"):
+            for i in range(3):
+                created_at = started + timedelta(minutes=i)
+                db.add(HistoryChat(
+                    session_id=session_id, role=ChatRole.USER if i % 2 == 0 else ChatRole.SYSTEM,
+                    content=f"{session_id}-{i}", created_at=created_at, updated_at=created_at
+                ))
+        await db.commit()
+        # 归档后再写入一条新消息，导出时合并归档文件与数据库中的记录
+        session = await db.get(HistorySession, "archived")
+        await archiver.archive_session(db, session)
+        db.add(HistoryChat(session_id="archived", role=ChatRole.USER, content="archived-3"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def _collect(parts) -> str:
+    return "".join([part async for part in parts])
+
+
+class TestExportSessionChats:
+    """测试单个会话的导出"""
+
+    @pytest.mark.asyncio
+    async def test_ndjson_and_json(self, session_factory):
+        lines = (await _collect(history_session._export_session_chats("live", "ndjson"))).splitlines()
+        assert [json.loads(line)["content"] for line in lines] == ["live-0", "live-1", "live-2"]
+
+        body = json.loads(await _collect(history_session._export_session_chats("live", "json")))
+        assert body["session_id"] == "live"
+        assert [record["role"] for record in body["chat_records"]] == ["user", "system", "user"]
+
+    @pytest.mark.asyncio
+    async def test_empty_session_is_valid_json(self, session_factory):
+        body = json.loads(await _collect(history_session._export_session_chats("empty", "json")))
+        assert body == {"session_id": "empty", "chat_records": []}
+
+
+class TestExportUserHistory:
+    """测试用户全部会话的导出"""
+
+    @pytest.mark.asyncio
+    async def test_ndjson_pages_sessions_and_reads_archives(self, session_factory, monkeypatch):
+        # 每页一个会话，覆盖跨页的游标分页
+        monkeypatch.setattr(history_session, "EXPORT_SESSION_PAGE_SIZE", 1)
+        lines = [
+            json.loads(line)
+            for line in (await _collect(history_session._export_user_history("admin", "ndjson"))).splitlines()
+        ]
+
+        sessions = [line["data"]["id"] for line in lines if line["type"] == "session"]
+        assert sessions == ["empty", "archived", "live"]
+        chats = {}
+        current = None
+        for line in lines:
+            if line["type"] == "session":
+                current = line["data"]["id"]
+            else:
+                # 聊天记录紧跟在所属会话之后
+                assert line["data"]["session_id"] == current
+                chats.setdefault(current, []).append(line["data"]["content"])
+        assert chats == {
+            "archived": ["archived-0", "archived-1", "archived-2", "archived-3"],
+            "live": ["live-0", "live-1", "live-2"],
+        }
+
+    @pytest.mark.asyncio
+    async def test_json(self, session_factory, monkeypatch):
+        monkeypatch.setattr(history_session, "EXPORT_SESSION_PAGE_SIZE", 2)
+        body = json.loads(await _collect(history_session._export_user_history("admin", "json")))
+
+        assert body["username"] == "admin"
+        assert [item["session"]["id"] for item in body["sessions"]] == ["empty", "archived", "live"]
+        records = {item["session"]["id"]: item["chat_records"] for item in body["sessions"]}
+        assert records["empty"] == []
+        assert [record["content"] for record in records["archived"]] == [
+            "archived-0", "archived-1", "archived-2", "archived-3"
+        ]
+        assert records["live"][0]["session_id"] == "live"
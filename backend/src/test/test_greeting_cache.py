@@ -0,0 +1,112 @@
+"""
+角色开场白缓存的单元测试
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.model_server.greeting_cache import PersonaGreetingCache
+
+
+def _cache(**kwargs) -> PersonaGreetingCache:
+    options = {"ttl": 60, "max_entries": 2, "greeting_message": "你好", "greeting_patterns": ["你好", "hello"]}
+    options.update(kwargs)
+    return PersonaGreetingCache(**options)
+
+
+class TestGreetingMatching:
+    """测试问候语匹配"""
+
+    def test_ignores_case_and_punctuation(self):
+        cache = _cache()
+        assert cache.is_greeting("  Hello!! ")
+        assert cache.is_greeting("你好～")
+        assert not cache.is_greeting("你好，帮我写首诗")
+
+
+class TestGreetingEntries:
+    """测试缓存条目"""
+
+    def test_keyed_by_greeting(self):
+        cache = _cache()
+        cache.put("prompt", "voice", "你好呀")
+        # 预生成的回复只对应配置的问候语
+        assert cache.get("prompt", "voice", "你好！").reply == "你好呀"
+        assert cache.get("prompt", "voice", "hello") is None
+
+        cache.put("prompt", "voice", "Hi there", message="Hello")
+        assert cache.get("prompt", "voice", "hello").reply == "Hi there"
+        assert cache.get("prompt", "other", "hello") is None
+        assert cache.get("other", "voice", "hello") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = _cache()
+        cache.put("a", "v", "A")
+        cache.put("b", "v", "B")
+        cache.get("a", "v")
+        cache.put("c", "v", "C")
+        assert cache.get("b", "v") is None
+        assert cache.get("a", "v").reply == "A"
+        assert cache.get("c", "v").reply == "C"
+
+    def test_disabled(self):
+        cache = _cache(enabled=False)
+        cache.put("a", "v", "A")
+        assert cache.get("a", "v") is None
+
+
+class TestGreetingWarm:
+    """测试后台预生成"""
+
+    @pytest.mark.asyncio
+    async def test_deduplicates_tasks_and_skips_fresh_entries(self, monkeypatch):
+        cache = _cache()
+        calls = []
+
+        async def warm(system_prompt, voice_type, message=None):
+            calls.append((system_prompt, voice_type, message))
+            await asyncio.sleep(0.01)
+            return cache.put(system_prompt, voice_type, "reply", message=message)
+
+        monkeypatch.setattr(cache, "warm", warm)
+        cache.schedule_warm("prompt", "voice")
+        cache.schedule_warm("prompt", "voice")
+        await asyncio.gather(*cache._tasks.values())
+        assert calls == [("prompt", "voice", None)]
+        assert cache._tasks == {}
+
+        # 未过期的条目不再生成
+        cache.schedule_warm("prompt", "voice")
+        assert cache._tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_and_refreshed(self, monkeypatch):
+        cache = _cache()
+        refreshed = asyncio.Event()
+
+        async def warm(system_prompt, voice_type, message=None):
+            refreshed.set()
+            return cache.put(system_prompt, voice_type, "new", message=message)
+
+        monkeypatch.setattr(cache, "warm", warm)
+        entry = cache.put("prompt", "voice", "old", message="hello")
+        entry.created_at = time.time() - 120
+
+        assert cache.get("prompt", "voice", "hello").reply == "old"
+        await asyncio.wait_for(refreshed.wait(), 1)
+        await asyncio.gather(*cache._tasks.values())
+        assert cache.get("prompt", "voice", "hello").reply == "new"
+
+    @pytest.mark.asyncio
+    async def test_warm_failure_is_logged(self, monkeypatch):
+        cache = _cache()
+
+        async def warm(system_prompt, voice_type, message=None):
+            raise RuntimeError("model down")
+
+        monkeypatch.setattr(cache, "warm", warm)
+        cache.schedule_warm("prompt", "voice")
+        await asyncio.gather(*cache._tasks.values())
+        assert cache.get("prompt", "voice") is None
+        await cache.close()
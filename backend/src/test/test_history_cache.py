@@ -0,0 +1,53 @@
+"""
+history_cache.py 的单元测试
+"""
+from src.crud.history_cache import SessionHistoryCache
+
+
+class TestSessionHistoryCache:
+    """测试会话历史热缓存"""
+
+    def test_put_get_and_append(self):
+        cache = SessionHistoryCache(max_bytes=1 << 20)
+        cache.put("s1", "prompt", "voice", [("user", "你好")])
+        cache.append("s1", "system", "你好呀")
+        entry = cache.get("s1")
+        assert entry.system_prompt == "prompt"
+        assert entry.voice_type == "voice"
+        assert entry.messages == [("user", "你好"), ("system", "你好呀")]
+        assert cache.stats()["bytes"] == entry.nbytes
+
+    def test_append_to_missing_session_is_ignored(self):
+        cache = SessionHistoryCache(max_bytes=1 << 20)
+        cache.append("missing", "user", "hi")
+        assert cache.get("missing") is None
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = SessionHistoryCache(max_bytes=1 << 20)
+        size = cache.put("probe", "", "", [("user", "x" * 1000)]).nbytes
+        cache.clear()
+        cache.max_bytes = size * 2
+        cache.put("s1", "", "", [("user", "x" * 1000)])
+        cache.put("s2", "", "", [("user", "y" * 1000)])
+        cache.get("s1")
+        cache.put("s3", "", "", [("user", "z" * 1000)])
+        assert cache.get("s2") is None
+        assert cache.get("s1") is not None
+        assert cache.get("s3") is not None
+        assert cache.stats()["bytes"] <= cache.max_bytes
+
+    def test_update_session_and_invalidate(self):
+        cache = SessionHistoryCache(max_bytes=1 << 20)
+        cache.put("s1", "old", "voice", [("user", "hi")])
+        cache.update_session("s1", system_prompt="new")
+        assert cache.get("s1").system_prompt == "new"
+        assert cache.get("s1").messages == [("user", "hi")]
+        cache.invalidate("s1")
+        assert cache.get("s1") is None
+        assert cache.stats()["bytes"] == 0
+
+    def test_disabled_cache_does_not_store(self):
+        cache = SessionHistoryCache(max_bytes=1 << 20, enabled=False)
+        entry = cache.put("s1", "p", "v", [("user", "hi")])
+        assert entry.messages == [("user", "hi")]
+        assert cache.get("s1") is None
@@ -0,0 +1,210 @@
+"""
+会话与聊天记录 CRUD（按轮次写入、历史读取）的单元测试
+"""
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.crud_history_chat import HistoryChatCreate, crud_history_chat
+from src.crud.crud_history_session import HistorySessionCreate, crud_history_session
+from src.crud.persona import persona_catalog
+from src.model.base import get_current_time
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import DEFAULT_PROMPT, DEFAULT_VOICE_TYPE
+
+LONG_CONTENT = "魁地奇" * 30000  # 超过压缩阈值，以压缩形式存储
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    persona_catalog._cache.clear()
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def session_factory(engine):
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _capture_sql(engine):
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper())
+    )
+    event.listen(engine.sync_engine, "commit", lambda conn: statements.append("COMMIT"))
+    return statements
+
+
+def _turn(session_id: str, user: str = "你好", reply: str = "你好呀"):
+    started = get_current_time()
+    return [
+        HistoryChatCreate(session_id=session_id, role=ChatRole.USER, content=user, created_at=started),
+        HistoryChatCreate(
+            session_id=session_id, role=ChatRole.SYSTEM, content=reply, created_at=started + timedelta(milliseconds=1)
+        ),
+    ]
+
+
+class TestBuild:
+    """测试不访问数据库的对象构建"""
+
+    def test_session_defaults_and_persona(self):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        assert session.id
+        assert (session.system_prompt, session.voice_type) == (DEFAULT_PROMPT, DEFAULT_VOICE_TYPE)
+        assert session.persona_id
+        assert session.last_message_at == session.created_at
+
+    def test_chat_uses_given_timestamp(self):
+        created_at = get_current_time() - timedelta(seconds=5)
+        chat = crud_history_chat.build(
+            HistoryChatCreate(session_id="s1", role=ChatRole.USER, content="hi", created_at=created_at)
+        )
+        assert chat.id
+        assert chat.created_at == chat.updated_at == created_at
+
+
+class TestCreateTurn:
+    """测试一轮对话在一个事务中写入"""
+
+    @pytest.mark.asyncio
+    async def test_new_session_and_messages_in_one_commit(self, engine, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s", system_prompt="扮演哈利"))
+        statements = _capture_sql(engine)
+        async with session_factory() as db:
+            chats = await crud_history_chat.create_turn(
+                db, objs_in=_turn(session.id), session=session,
+                usage={"prompt_tokens": 12, "completion_tokens": 5}
+            )
+
+        # 写入后不再 refresh：没有 SELECT，只提交一次
+        assert "SELECT" not in statements
+        assert statements.count("COMMIT") == 1
+        assert [chat.role for chat in chats] == [ChatRole.USER, ChatRole.SYSTEM]
+
+        async with session_factory() as db:
+            stored = await crud_history_session.get_by_id(db, id=session.id)
+            messages = await crud_history_chat.get_messages_by_session_id(db, session_id=session.id)
+        assert messages == [("user", "你好"), ("system", "你好呀")]
+        assert stored.message_count == 2
+        assert (stored.prompt_tokens, stored.completion_tokens) == (12, 5)
+        assert stored.last_message_at == chats[-1].created_at
+
+    @pytest.mark.asyncio
+    async def test_failed_turn_writes_nothing(self, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        async with session_factory() as db:
+            with pytest.raises(Exception):
+                # 第二条消息缺少必填字段，整轮回滚
+                await crud_history_chat.create_turn(
+                    db, objs_in=[_turn(session.id)[0], HistoryChatCreate.model_construct(session_id=session.id)],
+                    session=session
+                )
+
+        async with session_factory() as db:
+            assert await crud_history_session.get_by_id(db, id=session.id) is None
+            assert await crud_history_chat.get_messages_by_session_id(db, session_id=session.id) == []
+
+
+class TestDeleteBySessionId:
+    """测试清空会话的聊天记录"""
+
+    @pytest.mark.asyncio
+    async def test_resets_session_counters(self, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        async with session_factory() as db:
+            await crud_history_chat.create_turn(
+                db, objs_in=_turn(session.id), session=session,
+                usage={"prompt_tokens": 12, "completion_tokens": 5}
+            )
+            assert await crud_history_chat.delete_by_session_id(db, session_id=session.id) == 2
+
+        async with session_factory() as db:
+            stored = await crud_history_session.get_by_id(db, id=session.id)
+            assert await crud_history_chat.count_by_session_id(db, session_id=session.id) == 0
+        assert (stored.message_count, stored.last_message_preview) == (0, "")
+        assert (stored.prompt_tokens, stored.completion_tokens) == (0, 0)
+        assert stored.last_message_at == stored.created_at
+
+
+class TestHistoryMessages:
+    """测试构建大模型请求时的 (role, content) 快速读取"""
+
+    @pytest.mark.asyncio
+    async def test_messages_match_orm_path(self, session_factory):
+        async with session_factory() as db:
+            await crud_history_chat.create_turn(db, objs_in=[
+                HistoryChatCreate(session_id="s1", role=ChatRole.USER, content=LONG_CONTENT),
+                HistoryChatCreate(session_id="s1", role=ChatRole.SYSTEM, content="short"),
+            ])
+
+        async with session_factory() as db:
+            messages = await crud_history_chat.get_messages_by_session_id(db, session_id="s1")
+            chats = await crud_history_chat.get_by_session_id(db, session_id="s1")
+        assert messages == [(chat.role.value, chat.content) for chat in chats]
+        assert messages == [("user", LONG_CONTENT), ("system", "short")]
+
+    @pytest.mark.asyncio
+    async def test_messages_include_pending_writes(self, session_factory, monkeypatch):
+        async with session_factory() as db:
+            stored = await crud_history_chat.create(
+                db, obj_in=HistoryChatCreate(session_id="s1", role=ChatRole.USER, content="u1")
+            )
+        # 模拟异步落库队列：一条已落库但尚未出队，一条尚未落库
+        pending = [stored, HistoryChat(session_id="s1", role=ChatRole.SYSTEM, content="a1")]
+        monkeypatch.setattr(
+            "src.crud.crud_history_chat.history_write_behind.pending_for_session", lambda session_id: pending
+        )
+
+        async with session_factory() as db:
+            messages = await crud_history_chat.get_messages_by_session_id(db, session_id="s1")
+        assert messages == [("user", "u1"), ("system", "a1")]
+
+
+class TestSearchSessions:
+    """测试按会话名称搜索"""
+
+    @pytest.mark.asyncio
+    async def test_matches_whole_keyword_only(self, session_factory):
+        async with session_factory() as db:
+            for name in ("魁地奇比赛", "魁地", "奇比赛"):
+                await crud_history_session.create(db, obj_in=HistorySessionCreate(session_name=name))
+            # “魁地”“奇比赛”与关键词共享部分分词，但不包含完整的关键词
+            sessions = await crud_history_session.search_sessions(db, keyword="魁地奇")
+        assert [session.session_name for session in sessions] == ["魁地奇比赛"]
+
+    @pytest.mark.asyncio
+    async def test_mysql_uses_phrase_match_with_substring_filter(self):
+        statements = []
+
+        class FakeResult:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return []
+
+        class FakeMySQLSession:
+            def get_bind(self):
+                return type("Bind", (), {"dialect": mysql.dialect()})()
+
+            async def execute(self, statement):
+                statements.append(statement)
+                return FakeResult()
+
+        await crud_history_session.search_sessions(FakeMySQLSession(), keyword='魁地"奇')
+        sql = str(statements[0].compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+        # 自然语言模式只要任一分词命中即匹配，改用短语查询并在候选行上按子串过滤
+        assert "AGAINST('\"魁地 奇\"' IN BOOLEAN MODE)" in sql
+        assert "NATURAL LANGUAGE" not in sql
+        assert "LIKE concat('%%', '魁地\"奇', '%%')" in sql
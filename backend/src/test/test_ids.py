@@ -0,0 +1,55 @@
+"""
+主键生成与存储的单元测试
+"""
+import time
+import uuid
+from unittest.mock import patch
+
+from sqlalchemy.dialects import mysql, sqlite
+
+from src.model.ids import IdType, UUID7Generator, new_id
+
+
+class TestUUID7:
+    """测试 UUIDv7 生成"""
+
+    def test_format_and_timestamp(self):
+        value = uuid.UUID(UUID7Generator()())
+        assert value.version == 7 and value.variant == uuid.RFC_4122
+        assert abs((value.int >> 80) - time.time_ns() // 1_000_000) < 1000
+
+    def test_monotonic_within_same_millisecond(self):
+        generator = UUID7Generator()
+        with patch("src.model.ids.time.time_ns", return_value=1_700_000_000_000_000_000):
+            ids = [generator() for _ in range(10000)]
+        assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+    def test_clock_going_backwards_stays_monotonic(self):
+        generator = UUID7Generator()
+        first = generator()
+        with patch("src.model.ids.time.time_ns", return_value=0):
+            assert generator() > first
+
+    def test_new_id_respects_format_setting(self):
+        with patch("src.model.ids.settings.DB_ID_FORMAT", "uuid4"):
+            assert uuid.UUID(new_id()).version == 4
+        assert uuid.UUID(new_id()).version == 7
+
+
+class TestIdType:
+    """测试主键列类型"""
+
+    def test_binary_storage_on_mysql(self):
+        dialect = mysql.dialect()
+        id_type = IdType(binary=True)
+        value = new_id()
+        stored = id_type.process_bind_param(value, dialect)
+        assert stored == uuid.UUID(value).bytes
+        assert id_type.process_result_value(stored, dialect) == value
+        assert id_type.process_bind_param("", dialect) == b""
+        assert str(id_type.compile(dialect=dialect)) == "BINARY(16)"
+
+    def test_string_storage_elsewhere(self):
+        value = new_id()
+        assert IdType(binary=True).process_bind_param(value, sqlite.dialect()) == value
+        assert str(IdType().compile(dialect=mysql.dialect())) == "VARCHAR(255)"
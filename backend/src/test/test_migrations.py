@@ -0,0 +1,82 @@
+"""
+migrations 模块的单元测试
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from src.migrations import MIGRATIONS, Migration, check_indexes, run_migrations
+from src.migrations.runner import get_indexes, get_applied_versions
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        # 模拟旧版本 init.sql 中的单列索引
+        await conn.execute(text("CREATE INDEX idx_session_id ON history_chat (session_id)"))
+        await conn.execute(text("CREATE INDEX idx_username ON history_session (username)"))
+    yield engine
+    await engine.dispose()
+
+
+class TestRunMigrations:
+    """测试迁移执行"""
+
+    @pytest.mark.asyncio
+    async def test_applies_pending_migrations_once(self, engine):
+        async with engine.connect() as conn:
+            executed = await run_migrations(conn, MIGRATIONS)
+            assert executed == [m.version for m in MIGRATIONS]
+            assert await run_migrations(conn, MIGRATIONS) == []
+
+            chat_indexes = await get_indexes(conn, "history_chat")
+            assert chat_indexes["idx_chat_session_created"] == ["session_id", "created_at"]
+            assert "idx_session_id" not in chat_indexes
+            session_indexes = await get_indexes(conn, "history_session")
+            assert session_indexes["idx_session_user_deleted_created"] == ["username", "is_deleted", "created_at"]
+            assert "idx_username" not in session_indexes
+
+    @pytest.mark.asyncio
+    async def test_failed_migration_is_retried(self, engine):
+        calls = []
+
+        async def broken(conn):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        migrations = [Migration(1, "ok", lambda conn: _noop()), Migration(2, "broken", broken)]
+        async with engine.connect() as conn:
+            with pytest.raises(RuntimeError):
+                await run_migrations(conn, migrations)
+            await conn.rollback()
+            assert await get_applied_versions(conn) == [1]
+            assert await run_migrations(conn, migrations) == [2]
+
+    @pytest.mark.asyncio
+    async def test_rejects_duplicate_versions(self, engine):
+        async with engine.connect() as conn:
+            with pytest.raises(Exception):
+                await run_migrations(conn, [Migration(1, "a", _noop), Migration(1, "b", _noop)])
+
+
+class TestCheckIndexes:
+    """测试索引检查"""
+
+    @pytest.mark.asyncio
+    async def test_reports_missing_indexes(self, engine):
+        async with engine.connect() as conn:
+            report = await check_indexes(conn)
+            assert "history_chat.idx_chat_session_created" in report.missing
+            assert report.unused_checked is False
+
+            await run_migrations(conn, MIGRATIONS)
+            assert (await check_indexes(conn)).missing == []
+
+
+async def _noop(conn=None):
+    return None
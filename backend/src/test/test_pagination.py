@@ -0,0 +1,36 @@
+"""
+pagination.py 的单元测试
+"""
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+
+from src.crud.pagination import after_cursor, decode_cursor, encode_cursor, next_cursor
+
+
+class TestCursorPagination:
+    """测试游标分页工具函数"""
+
+    def test_cursor_round_trip(self):
+        created_at = datetime(2025, 1, 2, 3, 4, 5, 678)
+        cursor = encode_cursor(created_at, "abc")
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == (created_at, "abc")
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_after_cursor_breaks_ties_by_id(self):
+        created_at = datetime(2025, 1, 1)
+        cursor = encode_cursor(created_at, "b")
+        same_time = lambda id: SimpleNamespace(created_at=created_at, id=id)
+        assert after_cursor(same_time("c"), cursor, descending=False)
+        assert not after_cursor(same_time("a"), cursor, descending=False)
+        assert after_cursor(same_time("a"), cursor, descending=True)
+        assert after_cursor(same_time("a"), None, descending=False)
+
+    def test_next_cursor_only_for_full_pages(self):
+        items = [SimpleNamespace(created_at=datetime(2025, 1, i), id=str(i)) for i in range(1, 4)]
+        assert next_cursor(items, 4) is None
+        assert decode_cursor(next_cursor(items, 3)) == (datetime(2025, 1, 3), "3")
@@ -0,0 +1,178 @@
+"""
+角色目录的单元测试
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.api.api_v1.history_session import get_history_chat_by_session_id
+from src.crud.history_cache import history_cache
+from src.crud.crud_history_session import HistorySessionCreate, HistorySessionUpdate, crud_history_session
+from src.crud.persona import PersonaCatalog, persona_catalog, persona_id_for, persona_name_for
+from src.migrations.versions import _add_persona_catalog
+from src.model.history_session import HistorySession
+from src.model.persona import Persona
+
+PROMPT = "扮演用户自定义的角色：Harry Potter。请用简短的语言回答。"
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    # 每个用例使用独立的数据库，清空进程内缓存
+    persona_catalog._cache.clear()
+    history_cache.clear()
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _raw_session_row(factory, session_id: str):
+    async with factory() as db:
+        result = await db.execute(
+            text("SELECT system_prompt, voice_type, persona_id FROM history_session WHERE id = :id"),
+            {"id": session_id}
+        )
+        return result.one()
+
+
+async def _persona_count(factory) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count()).select_from(Persona))).scalar()
+
+
+class TestPersonaHelpers:
+    """测试角色ID与名称"""
+
+    def test_persona_id_is_content_addressed(self):
+        assert persona_id_for(PROMPT, "voice_a") == persona_id_for(PROMPT, "voice_a")
+        assert persona_id_for(PROMPT, "voice_a") != persona_id_for(PROMPT, "voice_b")
+        assert persona_id_for(PROMPT, "voice_a") != persona_id_for(PROMPT.upper(), "voice_a")
+
+    def test_persona_name(self):
+        assert persona_name_for(PROMPT) == "Harry Potter"
+        assert persona_name_for("\n  第一行\n第二行") == "第一行"
+        assert len(persona_name_for("x" * 200)) == 50
+
+    def test_cache_evicts_least_recently_used(self):
+        catalog = PersonaCatalog(max_entries=2)
+        for index in range(3):
+            catalog.remember(Persona(id=str(index), name="", system_prompt="", voice_type=""))
+        assert catalog.get_cached("0") is None
+        assert catalog.stats()["cached"] == 2
+
+
+class TestPersonaCatalog:
+    """测试会话对角色的引用"""
+
+    @pytest.mark.asyncio
+    async def test_sessions_share_persona_row(self, session_factory):
+        async with session_factory() as db:
+            first = await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name="a", system_prompt=PROMPT, voice_type="v")
+            )
+        # 清空缓存，第二次创建需要再次写入（已存在时忽略）
+        persona_catalog._cache.clear()
+        async with session_factory() as db:
+            second = await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name="b", system_prompt=PROMPT, voice_type="v")
+            )
+
+        assert first.persona_id == second.persona_id
+        assert await _persona_count(session_factory) == 1
+        # 会话行中不再重复保存提示词，对象上仍是生效值
+        assert tuple(await _raw_session_row(session_factory, first.id)) == ("", "", first.persona_id)
+        assert first.system_prompt == PROMPT and first.voice_type == "v"
+
+    @pytest.mark.asyncio
+    async def test_reads_attach_effective_prompt(self, session_factory):
+        async with session_factory() as db:
+            created = await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name="a", system_prompt=PROMPT, voice_type="v")
+            )
+        persona_catalog._cache.clear()
+        history_cache.clear()
+
+        async with session_factory() as db:
+            session = await crud_history_session.get_by_id(db, id=created.id)
+            assert (session.system_prompt, session.voice_type) == (PROMPT, "v")
+        async with session_factory() as db:
+            conversation = await crud_history_session.get_conversation(db, session_id=created.id)
+            assert conversation.system_prompt == PROMPT
+        async with session_factory() as db:
+            summaries = await crud_history_session.summarize(
+                db, await crud_history_session.get_by_username(db, username="admin")
+            )
+            assert summaries[0].persona_name == "Harry Potter"
+
+    @pytest.mark.asyncio
+    async def test_opening_session_caches_effective_prompt(self, session_factory):
+        async with session_factory() as db:
+            created = await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name="a", system_prompt=PROMPT, voice_type="v")
+            )
+        persona_catalog._cache.clear()
+        history_cache.clear()
+
+        # 打开会话时预热的历史缓存使用角色的提示词与音色，而不是会话行中清空的列
+        async with session_factory() as db:
+            response = await get_history_chat_by_session_id(db=db, session_id=created.id, limit=None, cursor=None)
+        assert response.code == 200
+        cached = history_cache.get(created.id)
+        assert (cached.system_prompt, cached.voice_type) == (PROMPT, "v")
+        async with session_factory() as db:
+            conversation = await crud_history_session.get_conversation(db, session_id=created.id)
+        assert (conversation.system_prompt, conversation.voice_type) == (PROMPT, "v")
+
+    @pytest.mark.asyncio
+    async def test_update_switches_persona(self, session_factory):
+        async with session_factory() as db:
+            created = await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name="a", system_prompt=PROMPT, voice_type="v")
+            )
+        async with session_factory() as db:
+            session = await crud_history_session.get_by_id(db, id=created.id)
+            updated = await crud_history_session.update(
+                db, db_obj=session, obj_in=HistorySessionUpdate(voice_type="w")
+            )
+            assert (updated.system_prompt, updated.voice_type) == (PROMPT, "w")
+            assert updated.persona_id == persona_id_for(PROMPT, "w")
+        async with session_factory() as db:
+            renamed = await crud_history_session.update(
+                db, db_obj=await crud_history_session.get_by_id(db, id=created.id),
+                obj_in=HistorySessionUpdate(session_name="b")
+            )
+            assert renamed.system_prompt == PROMPT
+
+        assert await _persona_count(session_factory) == 2
+        assert tuple(await _raw_session_row(session_factory, created.id))[:2] == ("", "")
+
+
+class TestPersonaMigration:
+    """测试旧会话的角色回填"""
+
+    @pytest.mark.asyncio
+    async def test_backfills_legacy_sessions(self, session_factory):
+        async with session_factory() as db:
+            for index, prompt in enumerate([PROMPT, PROMPT, "另一个角色"]):
+                db.add(HistorySession(
+                    id=f"legacy-{index}", username="admin", session_name="s",
+                    is_deleted=False, system_prompt=prompt, voice_type="v"
+                ))
+            await db.commit()
+
+        # 与迁移执行器相同，在独立连接上执行（迁移内部分批提交）
+        async with session_factory.kw["bind"].connect() as conn:
+            await _add_persona_catalog(conn)
+
+        assert await _persona_count(session_factory) == 2
+        rows = [tuple(await _raw_session_row(session_factory, f"legacy-{i}")) for i in range(3)]
+        assert rows[0] == rows[1] == ("", "", persona_id_for(PROMPT, "v"))
+        assert rows[2] == ("", "", persona_id_for("另一个角色", "v"))
+
+        async with session_factory() as db:
+            session = await crud_history_session.get_by_id(db, id="legacy-2")
+            assert session.system_prompt == "另一个角色"
@@ -0,0 +1,158 @@
+"""
+连接池统计与后台检查的单元测试
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.crud.pool import InstrumentedPool, PoolMonitor
+
+
+def _create_engine(tmp_path, **kwargs):
+    return create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedPool, **kwargs
+    )
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = _create_engine(tmp_path, pool_size=3, max_overflow=2)
+    yield engine
+    await engine.dispose()
+
+
+async def _use_connections(engine, count: int) -> None:
+    """同时取用 count 个连接后全部归还"""
+    connections = [await engine.connect() for _ in range(count)]
+    for conn in connections:
+        await conn.execute(text("SELECT 1"))
+    for conn in connections:
+        await conn.close()
+
+
+class TestInstrumentedPool:
+    """测试连接池统计"""
+
+    @pytest.mark.asyncio
+    async def test_session_checks_out_lazily(self, engine):
+        factory = async_sessionmaker(engine, class_=AsyncSession)
+        async with factory() as db:
+            pass
+        assert engine.sync_engine.pool.stats.checkouts == 0
+
+        async with factory() as db:
+            await db.execute(text("SELECT 1"))
+        assert engine.sync_engine.pool.stats.checkouts == 1
+
+    @pytest.mark.asyncio
+    async def test_records_waits_and_timeouts(self, tmp_path):
+        engine = _create_engine(tmp_path, pool_size=1, max_overflow=0, pool_timeout=0.2)
+        try:
+            held = await engine.connect()
+
+            async def release_later():
+                await asyncio.sleep(0.05)
+                await held.close()
+
+            release = asyncio.create_task(release_later())
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            await release
+
+            held = await engine.connect()
+            with pytest.raises(PoolTimeoutError):
+                await engine.connect()
+            await held.close()
+
+            stats = engine.sync_engine.pool.stats.to_dict()
+            assert stats["waits"] == 1
+            assert stats["timeouts"] == 1
+            assert stats["max_wait_ms"] >= 40
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_stats_survive_dispose(self, engine):
+        await _use_connections(engine, 1)
+        await engine.dispose()
+        assert engine.sync_engine.pool.stats.checkouts == 1
+        assert engine.sync_engine.pool.max_overflow == 2
+
+
+class TestPoolMonitor:
+    """测试后台检查"""
+
+    @pytest.mark.asyncio
+    async def test_validates_idle_connections_in_background(self, engine):
+        monitor = PoolMonitor(engine, validate_idle=0, check_interval=60)
+        await _use_connections(engine, 3)
+        pool = engine.sync_engine.pool
+        checkouts = pool.stats.checkouts
+
+        await monitor.check()
+        assert pool.stats.validated == 3
+        assert monitor.connected is True
+        # 逐个取用后归还，不改变连接数，也不计入请求的取用统计
+        assert pool.checkedin() == 3
+        assert (pool.overflow(), pool.checkedout()) == (0, 0)
+        assert pool.stats.checkouts == checkouts
+
+        # 请求取用连接时不再检查
+        await _use_connections(engine, 3)
+        assert pool.stats.validated == 3
+
+    @pytest.mark.asyncio
+    async def test_keeps_last_idle_connection_for_requests(self, engine):
+        monitor = PoolMonitor(engine, validate_idle=0, check_interval=60)
+        await _use_connections(engine, 2)
+        held = await engine.connect()
+        await held.execute(text("SELECT 1"))
+
+        # 一个连接正在使用，剩余的最后一个空闲连接留给请求
+        await monitor.check()
+        pool = engine.sync_engine.pool
+        assert pool.stats.validated == 0
+        assert pool.checkedin() == 1
+        await held.close()
+
+    @pytest.mark.asyncio
+    async def test_invalidates_broken_connections(self, engine, monkeypatch):
+        monitor = PoolMonitor(engine, validate_idle=0, check_interval=60)
+        await _use_connections(engine, 2)
+
+        def broken_ping(dbapi_connection):
+            raise RuntimeError("gone away")
+
+        monkeypatch.setattr(engine.sync_engine.dialect, "do_ping", broken_ping)
+        await monitor.check()
+        monkeypatch.undo()
+
+        assert engine.sync_engine.pool.stats.invalidated == 2
+        # 失效的连接在下次取用时重新建立
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+
+    @pytest.mark.asyncio
+    async def test_stops_at_recently_used_connections(self, engine):
+        monitor = PoolMonitor(engine, validate_idle=60, check_interval=60)
+        await _use_connections(engine, 2)
+        await monitor.check()
+        assert engine.sync_engine.pool.stats.validated == 0
+        assert engine.sync_engine.pool.checkedin() == 2
+
+    @pytest.mark.asyncio
+    async def test_status_without_queries(self, engine):
+        monitor = PoolMonitor(engine, check_interval=60)
+        await monitor.start()
+        try:
+            assert monitor.running
+            status = monitor.status()
+            assert status["connected"] is True
+            assert status["max_connections"] == 5
+        finally:
+            await monitor.close()
+        assert not monitor.running
@@ -0,0 +1,102 @@
+"""
+已删除会话后台清理的单元测试
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.crud.crud_history_session import HistorySessionUpdate, crud_history_session
+from src.jobs.purge import SessionPurgeJob
+from src.model.history_chat import ChatRole, HistoryChat
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.now()
+    async with factory() as db:
+        # 40 天前删除，但之后被修改过（updated_at 较新），仍按删除时间清理
+        db.add(HistorySession(
+            id="expired", username="admin", session_name="expired", is_deleted=True,
+            deleted_at=now - timedelta(days=40), updated_at=now
+        ))
+        db.add(HistorySession(
+            id="recent", username="admin", session_name="recent", is_deleted=True,
+            deleted_at=now - timedelta(days=1)
+        ))
+        db.add(HistorySession(
+            id="live", username="admin", session_name="live", updated_at=now - timedelta(days=40)
+        ))
+        for session_id, count in (("expired", 5), ("recent", 1), ("live", 1)):
+            for i in range(count):
+                db.add(HistoryChat(session_id=session_id, role=ChatRole.USER, content=f"m{i}"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def _session_ids(factory):
+    async with factory() as db:
+        return set((await db.execute(select(HistorySession.id))).scalars().all())
+
+
+async def _count_chats(factory, session_id: str) -> int:
+    async with factory() as db:
+        result = await db.execute(select(func.count(HistoryChat.id)).where(HistoryChat.session_id == session_id))
+        return result.scalar()
+
+
+class TestSessionPurgeJob:
+    """测试清理任务"""
+
+    @pytest.mark.asyncio
+    async def test_purges_by_deleted_at_in_batches(self, session_factory):
+        job = SessionPurgeJob(retention_days=30, batch_size=2, batch_pause=0)
+        stats = await job.run_once(session_factory)
+
+        assert (stats.sessions_purged, stats.chats_purged) == (1, 5)
+        # 5 条聊天记录每批 2 条，共 3 批
+        assert stats.batches == 3
+        assert await _session_ids(session_factory) == {"recent", "live"}
+        assert await _count_chats(session_factory, "expired") == 0
+        assert await _count_chats(session_factory, "recent") == 1
+
+    @pytest.mark.asyncio
+    async def test_retention_override(self, session_factory):
+        job = SessionPurgeJob(retention_days=30, min_retention_days=1, batch_pause=0)
+        with pytest.raises(ValueError):
+            await job.run_once(session_factory, retention_days=0)
+        assert await _session_ids(session_factory) == {"expired", "recent", "live"}
+
+        # 删除时间略早于 1 天前的会话在最短保留期下被清理
+        stats = await job.run_once(session_factory, retention_days=1)
+        assert stats.sessions_purged == 2
+        assert await _session_ids(session_factory) == {"live"}
+
+
+class TestDeletedAt:
+    """测试软删除时间的记录"""
+
+    @pytest.mark.asyncio
+    async def test_soft_delete_and_update_stamp_deleted_at(self, session_factory):
+        async with session_factory() as db:
+            session = await crud_history_session.soft_delete(db, id="live")
+            assert session.deleted_at is not None
+
+            session = await crud_history_session.update(db, db_obj=session, obj_in=HistorySessionUpdate(is_deleted=False))
+            assert session.deleted_at is None
+
+            session = await crud_history_session.update(db, db_obj=session, obj_in={"is_deleted": True})
+            deleted_at = session.deleted_at
+            assert deleted_at is not None
+            # 修改已删除会话的其他字段不改变删除时间
+            session = await crud_history_session.update(db, db_obj=session, obj_in={"session_name": "x"})
+            assert session.deleted_at == deleted_at
@@ -0,0 +1,95 @@
+"""
+读写分离路由的单元测试
+"""
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.api.deps import RoutingSession
+from src.crud.routing import RecentWrites, ReplicaRouter, on_replica, session_key
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def databases(tmp_path):
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    for engine, name in ((primary, "primary"), (replica, "replica")):
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with AsyncSession(engine) as db:
+            db.add(HistorySession(id="s1", username="admin", session_name=name))
+            await db.commit()
+    yield primary, replica
+    await primary.dispose()
+    await replica.dispose()
+
+
+async def _session_name(factory, query) -> str:
+    async with factory() as db:
+        return (await db.execute(query)).scalar_one().session_name
+
+
+class TestRoutingSession:
+    """测试查询路由"""
+
+    @pytest.mark.asyncio
+    async def test_routes_marked_reads_to_healthy_replica(self, databases):
+        primary, replica = databases
+        router = ReplicaRouter([replica])
+        factory = async_sessionmaker(primary, class_=AsyncSession, sync_session_class=RoutingSession)
+        query = select(HistorySession).where(HistorySession.id == "s1")
+
+        with patch("src.api.deps.replica_router", router), \
+                patch("src.crud.routing.recent_writes", RecentWrites(60)) as writes:
+            # 首次检查前没有可用副本
+            assert await _session_name(factory, on_replica(query)) == "primary"
+            await router.check()
+            assert await _session_name(factory, on_replica(query)) == "replica"
+            assert await _session_name(factory, query) == "primary"
+
+            writes.mark(session_key("s1"))
+            assert await _session_name(factory, on_replica(query, session_key("s1"))) == "primary"
+
+    @pytest.mark.asyncio
+    async def test_reads_after_write_stay_on_primary(self, databases):
+        primary, replica = databases
+        router = ReplicaRouter([replica])
+        await router.check()
+        factory = async_sessionmaker(primary, class_=AsyncSession, sync_session_class=RoutingSession)
+
+        with patch("src.api.deps.replica_router", router):
+            async with factory() as db:
+                db.add(HistorySession(id="s2", username="admin", session_name="new"))
+                await db.commit()
+                result = await db.execute(on_replica(select(HistorySession).where(HistorySession.id == "s2")))
+                assert result.scalar_one().session_name == "new"
+
+
+class TestReplicaRouter:
+    """测试副本延迟检查"""
+
+    @pytest.mark.asyncio
+    async def test_lagging_or_broken_replica_is_skipped(self, databases):
+        _, replica = databases
+        router = ReplicaRouter([replica], max_lag=1.0)
+
+        async def lagging(engine):
+            return 5.0
+
+        with patch.object(router, "_replica_lag", lagging):
+            await router.check()
+        assert router.choose() is None
+        assert router.status() == [{"replica": 0, "lag_seconds": 5.0, "healthy": False}]
+
+        async def broken(engine):
+            raise ConnectionError("down")
+
+        with patch.object(router, "_replica_lag", broken):
+            await router.check()
+        assert router.choose() is None
+
+        await router.check()
+        assert router.choose() is replica
@@ -0,0 +1,100 @@
+"""
+search.py 的单元测试
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.search import NgramSearchIndex, make_snippet
+from src.model.history_chat import HistoryChat, ChatRole
+from src.model.history_session import HistorySession
+
+
+class TestNgramSearchIndex:
+    """测试进程内全文检索回退索引"""
+
+    def _index(self) -> NgramSearchIndex:
+        index = NgramSearchIndex()
+        index.ready = True
+        index.add_session("s1", "admin", "魁地奇比赛")
+        index.add_session("s2", "admin", "天气")
+        index.add_session("s3", "other", "魁地奇")
+        return index
+
+    def _chat(self, session_id: str, content: str, day: int = 1) -> HistoryChat:
+        return HistoryChat(
+            session_id=session_id,
+            role=ChatRole.USER,
+            content=content,
+            created_at=datetime(2025, 1, day)
+        )
+
+    def test_ranks_and_filters_by_user(self):
+        index = self._index()
+        chat = self._chat("s2", "今天想聊聊魁地奇")
+        index.add_chat(chat)
+        index.add_chat(self._chat("s3", "魁地奇"))
+
+        hits = index.search("魁地奇", "admin", 0, 10, 80)
+        assert [(hit.session_id, hit.chat_id) for hit in hits] == [("s1", None), ("s2", chat.id)]
+        assert hits[0].score > hits[1].score
+
+    def test_remove_session_and_chats(self):
+        index = self._index()
+        index.add_chat(self._chat("s2", "魁地奇"))
+        index.remove_chats("s2")
+        assert [hit.session_id for hit in index.search("魁地奇", "admin", 0, 10, 80)] == ["s1"]
+        index.remove_session("s1")
+        assert index.search("魁地奇", "admin", 0, 10, 80) == []
+
+    def test_updates_are_ignored_until_built(self):
+        index = NgramSearchIndex()
+        index.add_session("s1", "admin", "魁地奇")
+        assert index.search("魁地奇", None, 0, 10, 80) == []
+
+    def test_evicts_oldest_chats_over_limit(self):
+        index = self._index()
+        index.max_documents = 2
+        chats = [self._chat("s2", f"魁地奇{i}", day=i + 1) for i in range(3)]
+        for chat in chats:
+            index.add_chat(chat)
+
+        # 最早的聊天记录被淘汰，会话名称不受上限影响
+        hits = index.search("魁地奇", "admin", 0, 10, 80)
+        assert {hit.chat_id for hit in hits} == {None, chats[1].id, chats[2].id}
+        assert index.evicted == 1
+        index.remove_chats("s2")
+        assert len(index._chat_keys) == 0
+
+
+@pytest.mark.asyncio
+async def test_build_loads_most_recent_chats():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with AsyncSession(engine) as db:
+            db.add(HistorySession(id="s1", username="admin", session_name="会话"))
+            for day in range(1, 6):
+                db.add(HistoryChat(
+                    session_id="s1", role=ChatRole.USER, content=f"魁地奇第{day}天", created_at=datetime(2025, 1, day)
+                ))
+            await db.commit()
+
+            index = NgramSearchIndex(max_documents=3)
+            await index.build(db)
+        assert sorted(hit.snippet for hit in index.search("魁地奇", None, 0, 10, 80)) == [
+            "魁地奇第3天", "魁地奇第4天", "魁地奇第5天"
+        ]
+    finally:
+        await engine.dispose()
+
+
+def test_make_snippet_centers_keyword():
+    content = "前" * 100 + "魁地奇" + "后" * 100
+    snippet = make_snippet(content, "魁地奇", 30)
+    assert "魁地奇" in snippet
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert make_snippet("短内容", "内容", 30) == "短内容"
@@ -0,0 +1,117 @@
+"""
+会话计数字段的单元测试
+"""
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.crud.crud_history_chat import HistoryChatCreate, crud_history_chat
+from src.crud.crud_history_session import HistorySessionCreate, crud_history_session
+from src.crud.pagination import next_cursor
+from src.crud.session_counters import PREVIEW_CHARS, make_preview
+from src.jobs.reconcile import SessionCounterReconcileJob
+from src.model.history_chat import ChatRole
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _get_session(factory, session_id: str) -> HistorySession:
+    async with factory() as db:
+        result = await db.execute(select(HistorySession).where(HistorySession.id == session_id))
+        return result.scalar_one()
+
+
+async def _create_session(factory, name: str) -> HistorySession:
+    async with factory() as db:
+        return await crud_history_session.create(db, obj_in=HistorySessionCreate(session_name=name))
+
+
+class TestSessionCounters:
+    """测试消息写入时的计数维护"""
+
+    def test_make_preview(self):
+        assert make_preview("  你好\n  世界 ") == "你好 世界"
+        preview = make_preview("a" * 500)
+        assert len(preview) == PREVIEW_CHARS and preview.endswith("…")
+
+    @pytest.mark.asyncio
+    async def test_create_turn_updates_counters(self, session_factory):
+        session = await _create_session(session_factory, "s")
+        started = session.created_at
+        async with session_factory() as db:
+            await crud_history_chat.create_turn(db, objs_in=[
+                HistoryChatCreate(session_id=session.id, role=ChatRole.USER, content="hi"),
+                HistoryChatCreate(session_id=session.id, role=ChatRole.SYSTEM, content="hello there"),
+            ], usage={"prompt_tokens": 12, "completion_tokens": 5})
+
+        stored = await _get_session(session_factory, session.id)
+        assert stored.message_count == 2
+        assert stored.last_message_preview == "hello there"
+        assert stored.last_message_at > started
+        assert (stored.prompt_tokens, stored.completion_tokens) == (12, 5)
+        async with session_factory() as db:
+            assert await crud_history_chat.count_by_session_id(db, session_id=session.id) == 2
+
+    @pytest.mark.asyncio
+    async def test_older_message_does_not_override_preview(self, session_factory):
+        session = await _create_session(session_factory, "s")
+        async with session_factory() as db:
+            await crud_history_chat.create(db, obj_in=HistoryChatCreate(
+                session_id=session.id, role=ChatRole.USER, content="latest"
+            ))
+            await crud_history_chat.create(db, obj_in=HistoryChatCreate(
+                session_id=session.id, role=ChatRole.USER, content="late arrival",
+                created_at=session.created_at - timedelta(minutes=1)
+            ))
+        stored = await _get_session(session_factory, session.id)
+        assert (stored.message_count, stored.last_message_preview) == (2, "latest")
+
+    @pytest.mark.asyncio
+    async def test_list_by_recent_activity(self, session_factory):
+        first = await _create_session(session_factory, "first")
+        second = await _create_session(session_factory, "second")
+        async with session_factory() as db:
+            await crud_history_chat.create(db, obj_in=HistoryChatCreate(
+                session_id=first.id, role=ChatRole.USER, content="bump"
+            ))
+            by_created = await crud_history_session.get_multi(db, page_size=10)
+            by_active = await crud_history_session.get_multi(db, page_size=1, sort="active")
+            assert [s.id for s in by_created] == [second.id, first.id]
+            assert [s.id for s in by_active] == [first.id]
+
+            cursor = next_cursor(by_active, 1, "last_message_at")
+            page = await crud_history_session.get_multi(db, page_size=1, sort="active", cursor=cursor)
+            assert [s.id for s in page] == [second.id]
+
+
+class TestReconcile:
+    """测试计数字段对账"""
+
+    @pytest.mark.asyncio
+    async def test_reconcile_fixes_drift(self, session_factory):
+        session = await _create_session(session_factory, "s")
+        async with session_factory() as db:
+            await crud_history_chat.create(db, obj_in=HistoryChatCreate(
+                session_id=session.id, role=ChatRole.USER, content="only message"
+            ))
+            await db.execute(update(HistorySession).values(message_count=7, last_message_preview=""))
+            await db.commit()
+
+        job = SessionCounterReconcileJob(batch_pause=0)
+        stats = await job.run_once(session_factory)
+        assert (stats.sessions_checked, stats.sessions_fixed) == (1, 1)
+        stored = await _get_session(session_factory, session.id)
+        assert (stored.message_count, stored.last_message_preview) == (1, "only message")
+        assert (await job.run_once(session_factory)).sessions_fixed == 0
@@ -0,0 +1,104 @@
+"""
+会话列表字段投影（稀疏字段集）的单元测试
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.crud_history_session import (
+    SUMMARY_FIELDS,
+    HistorySessionCreate,
+    crud_history_session,
+    parse_summary_fields,
+)
+from src.crud.pagination import next_cursor
+from src.crud.persona import persona_catalog
+
+PROMPT = "扮演用户自定义的角色：Harry Potter。" + "很长的提示词。" * 200
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    persona_catalog._cache.clear()
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def session_factory(engine):
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        for index in range(3):
+            await crud_history_session.create(
+                db, obj_in=HistorySessionCreate(session_name=f"s{index}", system_prompt=PROMPT, voice_type="v")
+            )
+    return factory
+
+
+def _capture_sql(engine):
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    return statements
+
+
+class TestParseSummaryFields:
+    """测试 fields 参数解析"""
+
+    def test_defaults_to_all_fields(self):
+        assert parse_summary_fields(None) == list(SUMMARY_FIELDS)
+
+    def test_always_includes_id(self):
+        assert parse_summary_fields("session_name, last_message_at,session_name") == [
+            "id", "session_name", "last_message_at"
+        ]
+
+    def test_rejects_unknown_fields(self):
+        with pytest.raises(ValueError):
+            parse_summary_fields("id,system_prompt")
+
+
+class TestProjectedQueries:
+    """测试列表查询只读取所需的列"""
+
+    @pytest.mark.asyncio
+    async def test_list_skips_prompt_column(self, engine, session_factory):
+        statements = _capture_sql(engine)
+        async with session_factory() as db:
+            rows = await crud_history_session.get_multi(db, fields=list(SUMMARY_FIELDS))
+            summaries = await crud_history_session.summarize(db, rows, SUMMARY_FIELDS)
+
+        assert [summary.session_name for summary in summaries] == ["s2", "s1", "s0"]
+        assert all(summary.persona_name == "Harry Potter" for summary in summaries)
+        assert not any("system_prompt" in statement for statement in statements if "history_session" in statement)
+
+    @pytest.mark.asyncio
+    async def test_sparse_fieldset(self, session_factory):
+        fields = parse_summary_fields("session_name")
+        async with session_factory() as db:
+            rows = await crud_history_session.get_multi(db, page_size=2, sort="active", fields=fields)
+            summaries = await crud_history_session.summarize(db, rows, fields)
+            # 游标所需的 id 与排序字段总会查询，翻页结果与完整查询一致
+            cursor = next_cursor(rows, 2, "last_message_at")
+            rest = await crud_history_session.get_multi(db, page_size=2, sort="active", cursor=cursor, fields=fields)
+
+        assert summaries[0].model_dump(exclude_unset=True).keys() == {"id", "session_name"}
+        assert len(rest) == 1
+
+    @pytest.mark.asyncio
+    async def test_search_with_fields(self, session_factory):
+        fields = parse_summary_fields("session_name,persona_name")
+        async with session_factory() as db:
+            rows = await crud_history_session.search_sessions(db, keyword="s1", fields=fields)
+            summaries = await crud_history_session.summarize(db, rows, fields)
+
+        assert [summary.model_dump(exclude_unset=True) for summary in summaries] == [
+            {"id": rows[0].id, "session_name": "s1", "persona_name": "Harry Potter"}
+        ]
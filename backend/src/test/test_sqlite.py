@@ -0,0 +1,145 @@
+"""
+嵌入式 SQLite 后端的单元测试
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import SQLModel
+
+from src.config import Settings
+from src.crud.pool import PoolMonitor
+from src.crud.sqlite import (
+    SerializedWriteSession,
+    SQLiteWriteQueue,
+    create_sqlite_engine,
+    is_memory_url,
+    is_sqlite_url,
+)
+from src.model.history_session import HistorySession
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'persona_talk.db'}"
+    engine = create_sqlite_engine(url, pool_size=4)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield url, engine
+    await engine.dispose()
+
+
+class TestSQLiteUrl:
+    """测试连接URL"""
+
+    def test_database_url_from_path(self):
+        settings = Settings(DATABASE_URL="", SQLITE_PATH="/data/persona_talk.db")
+        assert settings.get_database_url() == "sqlite+aiosqlite:////data/persona_talk.db"
+        assert is_sqlite_url(settings.get_database_url())
+
+    def test_database_url_prefers_explicit_url(self):
+        settings = Settings(DATABASE_URL="mysql+aiomysql://u:p@h/db", SQLITE_PATH="/data/persona_talk.db")
+        assert not is_sqlite_url(settings.get_database_url())
+
+    def test_memory_url(self):
+        assert is_memory_url("sqlite+aiosqlite:///:memory:")
+        assert not is_memory_url("sqlite+aiosqlite:///data.db")
+
+
+class TestSQLiteEngine:
+    """测试连接上的 PRAGMA"""
+
+    @pytest.mark.asyncio
+    async def test_wal_and_pragmas(self, database):
+        _, engine = database
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            # NORMAL = 1
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+
+    @pytest.mark.asyncio
+    async def test_read_only_engine_rejects_writes(self, database):
+        url, _ = database
+        reader = create_sqlite_engine(url, read_only=True, pool_size=1)
+        try:
+            async with reader.connect() as conn:
+                assert (await conn.execute(text("SELECT COUNT(*) FROM history_session"))).scalar() == 0
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("DELETE FROM history_session"))
+        finally:
+            await reader.dispose()
+
+    @pytest.mark.asyncio
+    async def test_pool_monitor_tracks_sqlite(self, database):
+        _, engine = database
+        monitor = PoolMonitor(engine, validate_idle=0, check_interval=60)
+        await monitor.start()
+        try:
+            # 首次检查探测数据库，之后健康检查直接读取状态
+            assert monitor.connected is True
+            assert monitor.status()["max_connections"] == 4
+        finally:
+            await monitor.close()
+
+
+class TestSerializedWriteSession:
+    """测试写入排队"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_are_serialized(self, database):
+        _, engine = database
+        queue = SQLiteWriteQueue(timeout=5)
+        session_class = type("QueuedSession", (SerializedWriteSession,), {"_write_queue": queue})
+        factory = async_sessionmaker(engine, class_=session_class, expire_on_commit=False)
+
+        async def write(index: int) -> None:
+            async with factory() as db:
+                db.add(HistorySession(username="admin", session_name=f"s{index}"))
+                await db.flush()
+                # 持有写锁期间让出事件循环，其他会话的写入需要排队
+                await asyncio.sleep(0.01)
+                await db.commit()
+
+        await asyncio.gather(*(write(index) for index in range(8)))
+
+        async with factory() as db:
+            assert (await db.execute(text("SELECT COUNT(*) FROM history_session"))).scalar() == 8
+        stats = queue.stats()
+        assert stats["writes"] == 8
+        assert stats["waiting"] is False
+        assert stats["max_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_reads_do_not_take_write_lock(self, database):
+        _, engine = database
+        queue = SQLiteWriteQueue(timeout=5)
+        session_class = type("QueuedSession", (SerializedWriteSession,), {"_write_queue": queue})
+        factory = async_sessionmaker(engine, class_=session_class, expire_on_commit=False)
+
+        async with factory() as db:
+            await db.execute(text("SELECT 1"))
+            await db.commit()
+        assert queue.stats()["writes"] == 0
+
+    @pytest.mark.asyncio
+    async def test_released_on_rollback(self, database):
+        _, engine = database
+        queue = SQLiteWriteQueue(timeout=0.5)
+        session_class = type("QueuedSession", (SerializedWriteSession,), {"_write_queue": queue})
+        factory = async_sessionmaker(engine, class_=session_class, expire_on_commit=False)
+
+        async with factory() as db:
+            db.add(HistorySession(username="admin", session_name="s"))
+            await db.flush()
+            assert queue.stats()["waiting"] is True
+            await db.rollback()
+        assert queue.stats()["waiting"] is False
+
+        async with factory() as db:
+            await db.execute(text("DELETE FROM history_session"))
+            await db.commit()
+        assert queue.stats()["writes"] == 2
@@ -0,0 +1,403 @@
+"""
+tts_service.py 及音频拼接模块的单元测试
+"""
+import asyncio
+import base64
+import json
+import struct
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import HTTPException
+
+from src.api.api_v1 import chat
+
+from src.model_server.audio_concat import concat_audio, concat_mp3, concat_wav, concat_ogg, _ogg_crc
+from src.model_server.tts_service import (
+    CircuitBreaker,
+    SpeakableTextNormalizer,
+    TTSError,
+    TTSModelService,
+    TTSRequest,
+    TTSResponse,
+    split_text_for_tts,
+)
+
+# MPEG-1 Layer III, 128kbps, 44100Hz, 无填充, 立体声：帧长 417 字节
+MP3_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_LENGTH = 417
+
+
+def _mp3_frame(fill: int) -> bytes:
+    return MP3_HEADER + bytes([fill]) * (MP3_FRAME_LENGTH - 4)
+
+
+def _xing_frame() -> bytes:
+    frame = bytearray(_mp3_frame(0))
+    frame[36:40] = b"Info"
+    return bytes(frame)
+
+
+def _id3v2_tag() -> bytes:
+    return b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+
+
+def _wav(samples: bytes) -> bytes:
+    fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    body += b"data" + struct.pack("<I", len(samples)) + samples
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _ogg_page(serial: int, payload: bytes) -> bytes:
+    header = bytearray(b"OggS\x00\x02" + b"\x00" * 8 + struct.pack("<I", serial))
+    header += struct.pack("<I", 0) + b"\x00\x00\x00\x00" + bytes([1, len(payload)])
+    page = bytearray(header + payload)
+    page[22:26] = struct.pack("<I", _ogg_crc(bytes(page)))
+    return bytes(page)
+
+
+class TestSplitTextForTTS:
+    """测试长文本切分"""
+
+    def test_short_text_not_split(self):
+        assert split_text_for_tts("你好。", 10) == ["你好。"]
+
+    def test_blank_text(self):
+        assert split_text_for_tts("   ", 10) == []
+
+    def test_split_at_sentence_boundaries(self):
+        text = "第一句话。第二句话！第三句话？"
+        chunks = split_text_for_tts(text, 10)
+        assert "".join(chunks) == text
+        assert chunks == ["第一句话。第二句话！", "第三句话？"]
+
+    def test_english_sentences(self):
+        text = "Hello there. How are you? Fine."
+        chunks = split_text_for_tts(text, 15)
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 15 for chunk in chunks)
+
+    def test_long_sentence_falls_back_to_clauses_and_hard_cut(self):
+        text = "啊" * 25 + "，" + "哦" * 5 + "。"
+        chunks = split_text_for_tts(text, 10)
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 10 for chunk in chunks)
+
+
+class TestSpeakableTextNormalizer:
+    """测试可朗读文本规范化"""
+
+    def setup_method(self):
+        self.normalizer = SpeakableTextNormalizer(
+            ["reasoning", "stage_directions", "markdown", "emoji", "numbers", "whitespace"]
+        )
+
+    def test_strips_non_speakable_content(self):
+        text = "<think>先想一想</think>*挥动魔杖* **你好**😀（微笑）\n\n## 标题\n- [链接](http://x.com)"
+        result = self.normalizer.normalize(text)
+        assert result.text == "你好\n标题\n链接"
+        assert result.original_chars == len(text)
+        assert result.saved_chars == len(text) - len(result.text)
+
+    def test_unclosed_reasoning(self):
+        assert self.normalizer.normalize("答案</think>").text == ""
+        assert self.normalizer.normalize("你好<think>还在想").text == "你好"
+
+    def test_expands_chinese_numbers_and_units(self):
+        text = "2024年气温-3.5℃，完成85%，共10005人，价格¥1,200，10:30出发，电话13812345678"
+        assert self.normalizer.normalize(text).text == (
+            "二零二四年气温负三点五摄氏度，完成百分之八十五，共一万零五人，"
+            "价格一千二百元，十点三十分出发，电话一三八一二三四五六七八"
+        )
+
+    def test_expands_english_numbers_and_units(self):
+        text = "It is 12km away, costs $3.50 and starts at 3:05."
+        assert self.normalizer.normalize(text).text == (
+            "It is twelve kilometers away, costs three dollars and fifty cents "
+            "and starts at three oh five."
+        )
+
+    def test_digits_glued_to_letters_are_kept_whole(self):
+        assert self.normalizer.normalize("Meet at 10am").text == "Meet at 10am"
+        assert self.normalizer.normalize("会议在10am开始，共3人").text == "会议在10am开始，共三人"
+        assert self.normalizer.normalize("v2 and 1,2,3").text == "v2 and one,two,three"
+
+    def test_currency_amounts(self):
+        assert self.normalizer.normalize("$1 or $0.01").text == "one dollar or one cent"
+        assert self.normalizer.normalize("价格¥3.05，折后¥0.50，约$3.50").text == "价格三元零五分，折后五角，约三点五美元"
+
+    def test_asterisks_between_letters_are_not_stage_directions(self):
+        assert self.normalizer.normalize("x=a*b*c").text == "x=a*b*c"
+        assert self.normalizer.normalize("*挥动魔杖*好的 **重点** 未闭合**").text == "好的 重点 未闭合"
+
+    def test_unknown_step(self):
+        with pytest.raises(ValueError):
+            SpeakableTextNormalizer(["markdown", "unknown"])
+
+    def test_normalize_disabled(self):
+        service = TTSModelService(api_key="", base_url="http://tts", normalize_enabled=False)
+        result = service.normalize_text("**你好**")
+        assert result.text == "**你好**"
+        assert result.saved_chars == 0
+
+
+class TestConcatAudio:
+    """测试音频拼接"""
+
+    def test_concat_mp3_strips_tags_and_info_frames(self):
+        part1 = _id3v2_tag() + _xing_frame() + _mp3_frame(1) + _mp3_frame(2)
+        part2 = _id3v2_tag() + _xing_frame() + _mp3_frame(3) + b"TAG" + b"\x00" * 125
+        result = concat_mp3([part1, part2])
+        assert result == _mp3_frame(1) + _mp3_frame(2) + _mp3_frame(3)
+
+    def test_concat_mp3_drops_truncated_trailing_frame(self):
+        part = _mp3_frame(1) + _mp3_frame(2)[:100]
+        assert concat_mp3([part, _mp3_frame(3)]) == _mp3_frame(1) + _mp3_frame(3)
+
+    def test_concat_wav_rewrites_header(self):
+        result = concat_wav([_wav(b"\x01\x00" * 4), _wav(b"\x02\x00" * 2)])
+        assert result == _wav(b"\x01\x00" * 4 + b"\x02\x00" * 2)
+
+    def test_concat_wav_rejects_mismatched_format(self):
+        other = bytearray(_wav(b"\x00\x00"))
+        other[24:28] = struct.pack("<I", 8000)
+        with pytest.raises(ValueError):
+            concat_wav([_wav(b"\x00\x00"), bytes(other)])
+
+    def test_concat_ogg_assigns_unique_serials(self):
+        result = concat_ogg([_ogg_page(7, b"a"), _ogg_page(7, b"b")])
+        first, second = result[:29], result[29:]
+        assert struct.unpack("<I", first[14:18])[0] == 7
+        assert struct.unpack("<I", second[14:18])[0] == 8
+        page = bytearray(second)
+        crc = struct.unpack("<I", page[22:26])[0]
+        page[22:26] = b"\x00\x00\x00\x00"
+        assert crc == _ogg_crc(bytes(page))
+
+    def test_concat_pcm_and_single_part(self):
+        assert concat_audio([b"ab", b"cd"], "pcm") == b"abcd"
+        assert concat_audio([b"raw"], "unknown") == b"raw"
+
+    def test_unsupported_encoding(self):
+        with pytest.raises(ValueError):
+            concat_audio([b"a", b"b"], "flac")
+
+
+class TestChunkedTextToSpeech:
+    """测试长文本分段并发合成"""
+
+    @pytest.mark.asyncio
+    async def test_long_text_is_chunked_and_joined_in_order(self):
+        service = TTSModelService(api_key="", base_url="http://tts", chunk_max_chars=6)
+        frames = {"一二三四。": 1, "五六七八。": 2}
+
+        async def fake_synthesize(request: TTSRequest) -> TTSResponse:
+            fill = frames[request.request.text]
+            return TTSResponse(
+                reqid=f"r{fill}",
+                operation="query",
+                sequence=-1,
+                data=base64.b64encode(_xing_frame() + _mp3_frame(fill)).decode(),
+                addition={"duration": "100"},
+            )
+
+        service._synthesize = AsyncMock(side_effect=fake_synthesize)
+        request = TTSRequest.create_simple(text="一二三四。五六七八。", voice_type="v")
+        response = await service.text_to_speech(request)
+
+        assert service._synthesize.await_count == 2
+        assert base64.b64decode(response.data) == _mp3_frame(1) + _mp3_frame(2)
+        assert response.addition == {"chunks": "2", "duration": "200"}
+
+    @pytest.mark.asyncio
+    async def test_long_text_mode_disabled(self):
+        service = TTSModelService(api_key="", base_url="http://tts", chunk_max_chars=2)
+        service._synthesize = AsyncMock(return_value=TTSResponse(
+            reqid="r", operation="query", sequence=-1, data=""
+        ))
+        request = TTSRequest.create_simple(text="一二三四。", voice_type="v")
+        await service.text_to_speech(request, long_text=False)
+        service._synthesize.assert_awaited_once_with(request)
+
+
+class TestTTSResilience:
+    """测试TTS超时、重试、熔断与备用音色"""
+
+    def _service(self, **kwargs) -> TTSModelService:
+        return TTSModelService(api_key="", base_url="http://tts", retry_base_delay=0, **kwargs)
+
+    def _ok(self) -> TTSResponse:
+        return TTSResponse(reqid="r", operation="query", sequence=-1, data="", addition={})
+
+    @pytest.mark.asyncio
+    async def test_retries_retryable_failures(self):
+        service = self._service(max_retries=2)
+        service._post_tts = AsyncMock(side_effect=[
+            TTSError("timeout", reason="timeout", retryable=True),
+            self._ok(),
+        ])
+        await service.text_to_speech(TTSRequest.create_simple(text="你好", voice_type="v"))
+        assert service._post_tts.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_invalid_request(self):
+        service = self._service(max_retries=2)
+        service._post_tts = AsyncMock(side_effect=TTSError("bad", reason="invalid_request"))
+        with pytest.raises(TTSError) as exc_info:
+            await service.text_to_speech(TTSRequest.create_simple(text="你好", voice_type="v"))
+        assert exc_info.value.reason == "invalid_request"
+        assert service._post_tts.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_opens_after_failures(self):
+        service = self._service(max_retries=0, circuit_failure_threshold=2, circuit_reset_timeout=60)
+        service._post_tts = AsyncMock(side_effect=TTSError("down", reason="provider_error", retryable=True))
+        request = TTSRequest.create_simple(text="你好", voice_type="v")
+        for _ in range(2):
+            with pytest.raises(TTSError):
+                await service.text_to_speech(request)
+        with pytest.raises(TTSError) as exc_info:
+            await service.text_to_speech(request)
+        assert exc_info.value.reason == "circuit_open"
+        assert service._post_tts.await_count == 2
+
+    def test_circuit_half_open_allows_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_cancelled_half_open_trial_releases_slot(self):
+        service = self._service(max_retries=0, circuit_failure_threshold=1, circuit_reset_timeout=0)
+        service.circuit_breaker.record_failure()
+        started = asyncio.Event()
+
+        async def hang(request: TTSRequest) -> TTSResponse:
+            started.set()
+            await asyncio.sleep(10)
+            return self._ok()
+
+        service._post_tts = AsyncMock(side_effect=hang)
+        request = TTSRequest.create_simple(text="你好", voice_type="v")
+        trial = asyncio.create_task(service.text_to_speech(request))
+        await started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        # 试探请求被取消后，下一个请求可以重新试探并恢复
+        service._post_tts = AsyncMock(return_value=self._ok())
+        await service.text_to_speech(request)
+        assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_fallback_voice(self):
+        service = self._service(fallback_voice_type="backup")
+
+        async def post(request: TTSRequest) -> TTSResponse:
+            if request.audio.voice_type != "backup":
+                raise TTSError("unknown voice", reason="invalid_request")
+            return self._ok()
+
+        service._post_tts = AsyncMock(side_effect=post)
+        response = await service.text_to_speech(TTSRequest.create_simple(text="你好", voice_type="v"))
+        assert response.addition["fallback_voice_type"] == "backup"
+
+    @pytest.mark.asyncio
+    async def test_no_fallback_voice_on_provider_error(self):
+        service = self._service(fallback_voice_type="backup", max_retries=0)
+        service._post_tts = AsyncMock(side_effect=TTSError("down", reason="provider_error", retryable=True))
+        with pytest.raises(TTSError) as exc_info:
+            await service.text_to_speech(TTSRequest.create_simple(text="你好", voice_type="v"))
+        assert exc_info.value.reason == "provider_error"
+        assert service._post_tts.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_chunk_cancels_siblings(self):
+        service = self._service(max_retries=0, chunk_max_chars=3, chunk_concurrency=4)
+        cancelled = []
+
+        async def post(request: TTSRequest) -> TTSResponse:
+            if request.request.text.startswith("一"):
+                raise TTSError("bad", reason="invalid_request")
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(request.request.text)
+                raise
+            return self._ok()
+
+        service._post_tts = AsyncMock(side_effect=post)
+        with pytest.raises(TTSError):
+            await service.text_to_speech(TTSRequest.create_simple(text="一二。三四。五六。", voice_type="v"))
+        assert sorted(cancelled) == ["三四。", "五六。"]
+
+    @pytest.mark.asyncio
+    async def test_total_timeout(self):
+        service = self._service(total_timeout=0.05)
+
+        async def slow(request: TTSRequest) -> TTSResponse:
+            await asyncio.sleep(1)
+            return self._ok()
+
+        service._post_tts = AsyncMock(side_effect=slow)
+        with pytest.raises(TTSError) as exc_info:
+            await service.text_to_speech(TTSRequest.create_simple(text="你好", voice_type="v"))
+        assert exc_info.value.reason == "timeout"
+
+
+class TestTextToSpeechBatch:
+    """测试批量TTS接口"""
+
+    async def _lines(self, response) -> list:
+        body = "".join([chunk async for chunk in response.body_iterator])
+        return [json.loads(line) for line in body.splitlines()]
+
+    @pytest.mark.asyncio
+    async def test_duplicates_synthesized_once_within_concurrency(self, monkeypatch):
+        running = []
+        calls = []
+
+        async def synthesize(item):
+            calls.append(item.text)
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            return chat.ApiResponse(code=chat.ResponseCode.SUCCESS, message="ok", data={"text": item.text})
+
+        peak = []
+        monkeypatch.setattr(chat, "_synthesize_tts_item", synthesize)
+        request = chat.TTSBatchRequestModel(
+            items=[chat.TTSRequestModel(text=text) for text in ["a", "b", "a", "c", "d"]],
+            max_concurrency=2
+        )
+        lines = await self._lines(await chat.text_to_speech_batch(request))
+
+        assert sorted(calls) == ["a", "b", "c", "d"]
+        assert max(peak) == 2
+        assert sorted(line["index"] for line in lines) == [0, 1, 2, 3, 4]
+        assert {line["index"]: line["data"]["text"] for line in lines}[2] == "a"
+
+    @pytest.mark.asyncio
+    async def test_item_errors_are_ndjson_lines(self, monkeypatch):
+        async def synthesize(item):
+            return chat.ApiResponse(code=chat.ResponseCode.SERVICE_ERROR, message="失败", data={"reason": "timeout"})
+
+        monkeypatch.setattr(chat, "_synthesize_tts_item", synthesize)
+        request = chat.TTSBatchRequestModel(items=[chat.TTSRequestModel(text="a")])
+        response = await chat.text_to_speech_batch(request)
+        assert response.media_type == "application/x-ndjson"
+        [line] = await self._lines(response)
+        assert (line["index"], line["code"], line["data"]) == (0, 502, {"reason": "timeout"})
+
+    @pytest.mark.asyncio
+    async def test_rejects_too_many_items(self, monkeypatch):
+        monkeypatch.setattr(chat.settings, "TTS_BATCH_MAX_ITEMS", 2)
+        request = chat.TTSBatchRequestModel(items=[chat.TTSRequestModel(text=str(i)) for i in range(3)])
+        with pytest.raises(HTTPException) as exc_info:
+            await chat.text_to_speech_batch(request)
+        assert exc_info.value.status_code == 400
@@ -0,0 +1,128 @@
+"""
+turn_writer.py 的单元测试
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.crud_history_chat import HistoryChatCreate, crud_history_chat
+from src.crud.crud_history_session import HistorySessionCreate, crud_history_session
+from src.crud.persona import persona_catalog
+from src.crud.turn_writer import TurnWriter
+from src.model.base import get_current_time
+from src.model.history_chat import ChatRole
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'turns.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    persona_catalog._cache.clear()
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def writer(session_factory):
+    writer = TurnWriter()
+    writer.start(session_factory)
+    yield writer
+    await writer.close()
+
+
+def _chat(session_id: str, role: ChatRole, content: str) -> HistoryChatCreate:
+    return HistoryChatCreate(session_id=session_id, role=role, content=content, created_at=get_current_time())
+
+
+async def _messages(session_factory, session_id: str):
+    async with session_factory() as db:
+        return await crud_history_chat.get_messages_by_session_id(db, session_id=session_id)
+
+
+class TestTurnWriter:
+    """测试对话轮次的后台落库"""
+
+    @pytest.mark.asyncio
+    async def test_writes_run_in_submit_order_per_session(self, monkeypatch):
+        writer = TurnWriter()
+        order = []
+
+        async def write(objs_in, session=None, usage=None):
+            # 先提交的写入更慢，同一会话中仍按提交顺序完成
+            await asyncio.sleep(0.03 if objs_in[0].content == "u1" else 0)
+            order.append(objs_in[0].content)
+            return []
+
+        monkeypatch.setattr(writer, "_write", write)
+        user_task = writer.submit_user_message(_chat("s1", ChatRole.USER, "u1"))
+        writer.submit_reply(user_task, _chat("s1", ChatRole.USER, "u1"), _chat("s1", ChatRole.SYSTEM, "a1"))
+        # 其他会话的写入不需要等待
+        writer.submit_user_message(_chat("s2", ChatRole.USER, "other"))
+
+        await writer.wait("s1")
+        assert order == ["other", "u1", "a1"]
+        await writer.wait_all()
+        assert writer._tails == {}
+
+    @pytest.mark.asyncio
+    async def test_reply_rewrites_failed_user_message(self, writer, session_factory, monkeypatch):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        create_turn = crud_history_chat.create_turn
+        calls = []
+
+        async def flaky_create_turn(db, **kwargs):
+            calls.append(len(kwargs["objs_in"]))
+            if len(calls) == 1:
+                raise RuntimeError("db down")
+            return await create_turn(db, **kwargs)
+
+        monkeypatch.setattr(crud_history_chat, "create_turn", flaky_create_turn)
+        user_chat = _chat(session.id, ChatRole.USER, "你好")
+        user_task = writer.submit_user_message(user_chat, session=session)
+        writer.submit_reply(user_task, user_chat, _chat(session.id, ChatRole.SYSTEM, "你好呀"), session=session)
+        await writer.wait(session.id)
+
+        # 用户消息写入失败，与回复（及新会话）一起补写
+        assert isinstance(user_task.exception(), RuntimeError)
+        assert calls == [1, 2]
+        assert await _messages(session_factory, session.id) == [("user", "你好"), ("system", "你好呀")]
+
+    @pytest.mark.asyncio
+    async def test_discard_removes_new_session(self, writer, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        user_task = writer.submit_user_message(_chat(session.id, ChatRole.USER, "你好"), session=session)
+        writer.discard(user_task, session.id, session=session)
+        await writer.wait(session.id)
+
+        async with session_factory() as db:
+            assert await crud_history_session.get_by_id(db, id=session.id) is None
+        assert await _messages(session_factory, session.id) == []
+
+    @pytest.mark.asyncio
+    async def test_discard_restores_existing_session_counters(self, writer, session_factory):
+        session = crud_history_session.build(HistorySessionCreate(session_name="s"))
+        first = _chat(session.id, ChatRole.USER, "第一轮")
+        user_task = writer.submit_user_message(first, session=session)
+        writer.submit_reply(user_task, first, _chat(session.id, ChatRole.SYSTEM, "回复"), session=session)
+
+        # 第二轮大模型调用失败，撤销已写入的用户消息
+        user_task = writer.submit_user_message(_chat(session.id, ChatRole.USER, "第二轮"))
+        writer.discard(user_task, session.id)
+        await writer.wait(session.id)
+
+        assert await _messages(session_factory, session.id) == [("user", "第一轮"), ("system", "回复")]
+        async with session_factory() as db:
+            stored = await crud_history_session.get_by_id(db, id=session.id)
+        assert stored.message_count == 2
+        assert stored.last_message_preview == "回复"
+
+    @pytest.mark.asyncio
+    async def test_write_requires_start(self):
+        writer = TurnWriter()
+        task = writer.submit_user_message(_chat("s1", ChatRole.USER, "u1"))
+        await writer.wait("s1")
+        assert task.exception() is not None
@@ -0,0 +1,184 @@
+"""
+write_behind.py 的单元测试
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from src.crud.write_behind import HistoryWriteBehind, _to_record
+from src.model.history_chat import HistoryChat, ChatRole
+from src.model.history_session import HistorySession
+
+
+class TestHistoryWriteBehind:
+    """测试聊天记录异步落库"""
+
+    def _writer(self, tmp_path) -> HistoryWriteBehind:
+        return HistoryWriteBehind(
+            enabled=True,
+            journal_path=str(tmp_path / "journal.jsonl"),
+            flush_interval=0.01,
+            retry_delay=0.01
+        )
+
+    @pytest.mark.asyncio
+    async def test_enqueue_is_readable_until_flushed(self, tmp_path):
+        writer = self._writer(tmp_path)
+        release = asyncio.Event()
+        inserted = []
+
+        async def insert_batch(records):
+            await release.wait()
+            inserted.extend(record["content"] for record in records)
+
+        writer._insert_batch = AsyncMock(side_effect=insert_batch)
+        await writer.start(session_factory=None)
+        await writer.enqueue([
+            HistoryChat(session_id="s1", role=ChatRole.USER, content="u1"),
+            HistoryChat(session_id="s1", role=ChatRole.SYSTEM, content="a1"),
+        ])
+
+        assert [chat.content for chat in writer.pending_for_session("s1")] == ["u1", "a1"]
+        assert writer.pending_for_session("s2") == []
+        assert len(writer._read_journal()) == 2
+
+        release.set()
+        await writer.close()
+        assert inserted == ["u1", "a1"]
+        assert writer.pending_count() == 0
+        assert writer._read_journal() == []
+
+    @pytest.mark.asyncio
+    async def test_journal_shrinks_while_queue_is_busy(self, tmp_path):
+        writer = self._writer(tmp_path)
+        writer.batch_size = 1
+        journal_sizes = []
+
+        async def insert_batch(records):
+            journal_sizes.append(len(writer._read_journal()))
+
+        writer._insert_batch = AsyncMock(side_effect=insert_batch)
+        await writer.start(session_factory=None)
+        # 队列在前两批写入后仍不为空，每批写入后日志只保留剩余的消息
+        await writer.enqueue([
+            HistoryChat(session_id="s1", role=ChatRole.USER, content=f"u{i}") for i in range(3)
+        ])
+        await writer.close()
+        assert journal_sizes == [3, 2, 1]
+        assert writer._read_journal() == []
+
+    @pytest.mark.asyncio
+    async def test_replays_journal_and_retries(self, tmp_path):
+        writer = self._writer(tmp_path)
+        chat = HistoryChat(session_id="s1", role=ChatRole.USER, content="u1")
+        writer._append_journal([{
+            "id": chat.id,
+            "session_id": chat.session_id,
+            "role": chat.role.value,
+            "content": chat.content,
+            "created_at": chat.created_at.isoformat(),
+            "updated_at": chat.updated_at.isoformat(),
+        }])
+        with open(writer.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"id": "trunc')
+
+        writer._insert_batch = AsyncMock(side_effect=[Exception("db down"), None])
+        await writer.start(session_factory=None)
+        assert writer.pending_for_session("s1")[0].id == chat.id
+        await writer.close()
+
+        assert writer._insert_batch.await_count == 2
+        assert writer._read_journal() == []
+
+    @pytest.mark.asyncio
+    async def test_enqueue_requires_start(self, tmp_path):
+        writer = self._writer(tmp_path)
+        with pytest.raises(Exception):
+            await writer.enqueue([HistoryChat(session_id="s1", role=ChatRole.USER, content="u1")])
+
+    @pytest.mark.asyncio
+    async def test_dead_letters_rows_after_max_retries(self, tmp_path):
+        writer = self._writer(tmp_path)
+        writer.max_retries = 2
+        writer.dead_letter_path = str(tmp_path / "dead.jsonl")
+        good = HistoryChat(session_id="s1", role=ChatRole.USER, content="ok")
+        bad = HistoryChat(session_id="s1", role=ChatRole.SYSTEM, content="bad")
+
+        writer._insert_batch = AsyncMock(side_effect=Exception("data too long"))
+        writer._insert_each = AsyncMock(side_effect=lambda records: [r for r in records if r["content"] == "bad"])
+        await writer.start(session_factory=None)
+        await writer.enqueue([good, bad])
+        await writer.close()
+
+        # 重试次数有上限，之后逐行写入，失败的行移入死信文件，队列不再阻塞
+        assert writer._insert_batch.await_count == 3
+        assert writer._insert_each.await_count == 1
+        assert writer.pending_count() == 0
+        assert writer._read_journal() == []
+        with open(writer.dead_letter_path, encoding="utf-8") as f:
+            assert [json.loads(line)["id"] for line in f] == [bad.id]
+
+    @pytest.mark.asyncio
+    async def test_discard_session_drops_queued_and_journaled(self, tmp_path):
+        writer = self._writer(tmp_path)
+        started = asyncio.Event()
+        release = asyncio.Event()
+        inserted = []
+
+        async def insert_batch(records):
+            started.set()
+            await release.wait()
+            inserted.extend(record["content"] for record in records)
+
+        writer._insert_batch = AsyncMock(side_effect=insert_batch)
+        await writer.start(session_factory=None)
+        await writer.enqueue([HistoryChat(session_id="s1", role=ChatRole.USER, content="in-flight")])
+        await started.wait()
+        await writer.enqueue([
+            HistoryChat(session_id="s1", role=ChatRole.USER, content="queued"),
+            HistoryChat(session_id="s2", role=ChatRole.USER, content="kept"),
+        ])
+
+        discard = asyncio.create_task(writer.discard_session("s1"))
+        await asyncio.sleep(0.02)
+        # 正在写入的批次包含该会话，等待其完成后才返回
+        assert not discard.done()
+        assert [record["content"] for record in writer._read_journal()] == ["kept"]
+        assert writer.pending_for_session("s1") == []
+
+        release.set()
+        assert await discard == 1
+        await writer.close()
+        assert inserted == ["in-flight", "kept"]
+
+    @pytest.mark.asyncio
+    async def test_insert_batch_skips_replayed_rows(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chats.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.create_all)
+            factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            flushed = HistoryChat(session_id="s1", role=ChatRole.USER, content="u1")
+            long_reply = HistoryChat(session_id="s1", role=ChatRole.SYSTEM, content="魁地奇" * 5000)
+            async with factory() as db:
+                db.add(HistorySession(id="s1", username="admin", session_name="s"))
+                db.add(flushed)
+                await db.commit()
+
+            writer = self._writer(tmp_path)
+            await writer.start(session_factory=factory)
+            # 重放的批次中包含已落库的消息：主键冲突后逐行写入，已存在的行不重复计数
+            assert await writer._insert_batch([_to_record(flushed), _to_record(long_reply)]) == []
+            await writer.close()
+
+            async with factory() as db:
+                session = await db.get(HistorySession, "s1")
+                assert session.message_count == 1
+                stored = await db.get(HistoryChat, long_reply.id)
+                assert stored.content_codec
+                assert stored.content == long_reply.content
+        finally:
+            await engine.dispose()
@@ -4,29 +4,72 @@ use personatalk;
 -- personatalk.history_session definition
 drop table if exists `history_chat`;  -- 先删除子表
 drop table if exists `history_session`;
+drop table if exists `persona`;
+drop table if exists `schema_migrations`;
 CREATE TABLE `history_session` (
   `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  `id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,  -- 按时间递增的 UUIDv7；DB_ID_BINARY=true 时启动后转换为 BINARY(16)
   `username` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
   `session_name` text COLLATE utf8mb4_unicode_ci NOT NULL,
   `is_deleted` tinyint(1) NOT NULL DEFAULT 0,
-  `system_prompt` TEXT COLLATE utf8mb4_unicode_ci NOT NULL,  -- 改为 TEXT
-  `voice_type` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `deleted_at` datetime NULL,  -- 软删除时间，清理任务据此判断是否超过保留期
+  `system_prompt` TEXT COLLATE utf8mb4_unicode_ci NOT NULL,  -- 改为 TEXT；引用了角色时为空
+  `voice_type` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,  -- 引用了角色时为空
+  `persona_id` varchar(255) COLLATE utf8mb4_unicode_ci NULL,  -- 引用的角色（persona.id），生效的提示词与音色保存在角色中
+  `archive_key` varchar(255) COLLATE utf8mb4_unicode_ci NULL,  -- 聊天记录归档文件的键，为空表示未归档
+  `message_count` int NOT NULL DEFAULT 0,  -- 消息数（冗余字段，与消息写入同一事务维护）
+  `last_message_at` datetime NULL,  -- 最后一条消息的时间，没有消息时为创建时间
+  `last_message_preview` varchar(200) COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '',  -- 最后一条消息的预览
+  `prompt_tokens` bigint NOT NULL DEFAULT 0,  -- 累计输入 token 数
+  `completion_tokens` bigint NOT NULL DEFAULT 0,  -- 累计输出 token 数
   PRIMARY KEY (`id`),
-  INDEX `idx_username` (`username`),  -- 添加索引
-  INDEX `idx_is_deleted` (`is_deleted`)
+  INDEX `idx_session_user_deleted_created` (`username`, `is_deleted`, `created_at`),  -- 按用户分页查询会话
+  INDEX `idx_session_deleted_at` (`is_deleted`, `deleted_at`),  -- 清理已软删除的会话
+  INDEX `idx_session_user_deleted_active` (`username`, `is_deleted`, `last_message_at`),  -- 按最近活跃排序的会话列表
+  FULLTEXT INDEX `ft_session_name` (`session_name`) WITH PARSER ngram  -- 会话名称全文检索（支持中文）
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- personatalk.history_chat definition
 CREATE TABLE `history_chat` (
   `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  `id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,  -- 同 history_session.id
   `session_id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
   `role` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
   `content` TEXT COLLATE utf8mb4_unicode_ci NOT NULL,  -- 改为 TEXT
+  `content_blob` MEDIUMBLOB NULL,  -- 超长内容压缩后存放于此，此时 content 只保留明文前缀供全文检索
+  `content_codec` varchar(8) COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT '',  -- 内容编码：空为明文，zlib/zstd 为压缩
   PRIMARY KEY (`id`),
-  INDEX `idx_session_id` (`session_id`),  -- 添加索引
+  INDEX `idx_chat_session_created` (`session_id`, `created_at`),  -- 按会话加载历史记录
+  FULLTEXT INDEX `ft_chat_content` (`content`) WITH PARSER ngram,  -- 聊天内容全文检索（支持中文）
   FOREIGN KEY (`session_id`) REFERENCES `history_session`(`id`) ON DELETE CASCADE  -- 添加外键
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- personatalk.persona definition
+CREATE TABLE `persona` (
+  `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `id` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,  -- 由提示词与音色计算的 UUIDv5，相同内容只保存一份
+  `name` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,  -- 从提示词中提取的角色名称
+  `system_prompt` TEXT COLLATE utf8mb4_unicode_ci NOT NULL,
+  `voice_type` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- personatalk.schema_migrations definition（上面的表结构已包含以下迁移）
+CREATE TABLE `schema_migrations` (
+  `version` int NOT NULL,
+  `description` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `applied_at` datetime NOT NULL,
+  PRIMARY KEY (`version`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO `schema_migrations` (`version`, `description`, `applied_at`) VALUES
+  (1, '添加 history_chat 与 history_session 的复合索引', NOW()),
+  (2, '删除被复合索引覆盖的单列索引', NOW()),
+  (3, '添加全文检索索引', NOW()),
+  (4, '添加聊天内容压缩存储列', NOW()),
+  (5, '添加会话归档键列', NOW()),
+  (6, '添加会话计数字段与最近活跃索引', NOW()),
+  (7, '创建角色表并回填会话的角色引用', NOW());